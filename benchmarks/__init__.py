@@ -0,0 +1 @@
+"""Offline benchmark suite: fake chat model, stub upstream APIs and a load generator."""
@@ -0,0 +1,193 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from kadena_common.kadena_client import validate_request
+
+# Defaults for models built through KADENA_CHAT_MODEL_FACTORY=benchmarks.fake_llm:chat_model
+LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "50"))
+JITTER_MS = float(os.getenv("FAKE_LLM_JITTER_MS", "0"))
+SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+
+ACCOUNT = "k:" + "a" * 64
+
+# Agent code that passes kadena-trader's static validator
+AGENT_CODE = """async function baselineFunction() {
+  try {
+    console.log("Retrieving keys from KMS...");
+    const keyPair = await getKeys();
+    console.log("Keys retrieved successfully");
+
+    const balances = await getBalances("k:" + keyPair.publicKey);
+    console.log(balances);
+
+    console.log("Creating transaction...");
+
+    const transaction = await swap({
+      tokenInAddress: "coin",
+      tokenOutAddress: "arkade.token",
+      amountIn: "1",
+      account: "k:" + keyPair.publicKey,
+      chainId: "2",
+    });
+
+    console.log("Transaction created:", transaction);
+
+    console.log("Signing transaction...");
+    const signature = await signTransaction(transaction, keyPair);
+    console.log("Transaction signed successfully");
+
+    console.log("Submitting transaction...");
+    const result = await submitTransaction({
+      ...transaction,
+      signature,
+    });
+    console.log("Transaction submitted successfully:", result);
+
+    return result;
+  } catch (error) {
+    console.error("Error in baseline function:", error);
+    throw error;
+  }
+}"""
+
+# Keyword -> kadena_transaction call, checked in order against the user's query
+TRANSACTION_DECISIONS = [
+    ("quote", {"endpoint": "quote", "tokenInAddress": "coin", "tokenOutAddress": "arkade.token",
+               "amountIn": "10", "chainId": "2"}),
+    ("swap", {"endpoint": "swap", "tokenInAddress": "coin", "tokenOutAddress": "arkade.token",
+              "amountIn": "10", "account": ACCOUNT, "chainId": "2"}),
+    ("transfer", {"endpoint": "transfer", "tokenAddress": "coin", "sender": ACCOUNT,
+                  "receiver": "k:" + "b" * 64, "amount": "1", "chainId": "2"}),
+    ("collection", {"endpoint": "nft/collection", "account": ACCOUNT, "guard": {"keys": ["a" * 64], "pred": "keys-all"},
+                    "name": "Bench Collection", "chainId": "2"}),
+    ("nft", {"endpoint": "nft/launch", "account": ACCOUNT, "guard": {"keys": ["a" * 64], "pred": "keys-all"},
+             "mintTo": ACCOUNT, "uri": "ipfs://bench", "collectionId": "collection:bench", "chainId": "2"}),
+]
+# Keep the canned calls valid for the real API, so benchmarks exercise the success paths
+for _, _arguments in TRANSACTION_DECISIONS:
+    validate_request(_arguments["endpoint"], {k: v for k, v in _arguments.items() if k != "endpoint"})
+
+GREETING_PATTERN = re.compile(r"^\s*(hi|hello|hey|gm|thanks|thank you)\b", re.IGNORECASE)
+
+
+def _query(messages: List[BaseMessage]) -> str:
+    """The user's latest query (the last human message)."""
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            return message.content if isinstance(message.content, str) else str(message.content)
+    return ""
+
+
+def _tool_call(name: str, arguments: Dict[str, Any]) -> AIMessage:
+    return AIMessage(content="", additional_kwargs={"tool_calls": [{
+        "id": "call_bench",
+        "type": "function",
+        "function": {"name": name, "arguments": json.dumps(arguments)},
+    }]})
+
+
+def decide(messages: List[BaseMessage], **kwargs: Any) -> AIMessage:
+    """
+    Canned response for a model call, chosen from the call's shape.
+
+    - Forced function calls (structured output in kadena-trader) get a valid
+      GeneratedAgent, CodePatch or PromptEvaluation.
+    - Calls offering functions (the kadena-ai routing agent) get a greeting, a
+      kadena_transaction call picked by keyword, or a kadena_analysis call.
+    - Anything else (gpt-4.1 post-processing) gets a short text answer.
+    """
+    tool_choice = kwargs.get("tool_choice")
+    if isinstance(tool_choice, dict):
+        name = tool_choice["function"]["name"]
+        if name == "GeneratedAgent":
+            return _tool_call(name, {"code": AGENT_CODE, "interval": "rate(5 minutes)"})
+        if name == "CodePatch":
+            return _tool_call(name, {"edits": [{"search": 'amountIn: "1"', "replace": 'amountIn: "2"'}],
+                                     "interval": "rate(5 minutes)"})
+        if name == "PromptEvaluation":
+            return _tool_call(name, {"rating": 8, "justification": "Clear token, amount and schedule.",
+                                     "questions": []})
+        return _tool_call(name, {})
+
+    query = _query(messages)
+    if kwargs.get("functions"):
+        if GREETING_PATTERN.match(query):
+            return AIMessage(content="Hello! How can I help you with Kadena today?")
+        lowered = query.lower()
+        for keyword, arguments in TRANSACTION_DECISIONS:
+            if keyword in lowered:
+                return AIMessage(content="", additional_kwargs={"function_call": {
+                    "name": "kadena_transaction", "arguments": json.dumps(arguments),
+                }})
+        return AIMessage(content="", additional_kwargs={"function_call": {
+            "name": "kadena_analysis",
+            "arguments": json.dumps({"query": query, "systemPrompt": "You are K-Agent."}),
+        }})
+
+    return AIMessage(content="Here is the processed answer for your Kadena request.")
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for ChatOpenAI.
+
+    Sleeps for `latency_ms` (plus seeded jitter) per call and answers with
+    `decide()`, reporting fixed token usage so metrics and cost accounting run
+    the same code paths as with OpenAI.
+    """
+    model: str = "fake"
+    latency_ms: float = LATENCY_MS
+    jitter_ms: float = JITTER_MS
+    seed: int = SEED
+    prompt_tokens: int = 500
+    completion_tokens: int = 100
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        # Not pydantic fields; bypass field validation
+        object.__setattr__(self, "_random", random.Random(self.seed))
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _delay(self) -> float:
+        if not self.jitter_ms:
+            return self.latency_ms / 1000
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self._delay())
+        usage = {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+        }
+        return ChatResult(generations=[ChatGeneration(message=decide(messages, **kwargs))],
+                          llm_output={"token_usage": usage})
+
+    def _combine_llm_outputs(self, llm_outputs: List[Optional[dict]]) -> dict:
+        usage: Dict[str, int] = {}
+        for output in llm_outputs:
+            for key, value in ((output or {}).get("token_usage") or {}).items():
+                usage[key] = usage.get(key, 0) + value
+        return {"token_usage": usage}
+
+
+def chat_model(model: str, **kwargs: Any) -> FakeChatModel:
+    """Chat model factory for KADENA_CHAT_MODEL_FACTORY."""
+    return FakeChatModel(model=model, **kwargs)
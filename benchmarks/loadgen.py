@@ -0,0 +1,82 @@
+import asyncio
+import math
+import time
+from typing import Any, Dict, List, Sequence
+
+import httpx
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+async def run_level(url: str, payloads: List[Dict[str, Any]], concurrency: int,
+                    requests: int, timeout: float = 60.0) -> Dict[str, Any]:
+    """
+    Send `requests` POSTs to `url` from `concurrency` closed-loop workers.
+
+    Each worker sends its next request as soon as the previous one completes;
+    payloads are used round-robin in request order.
+
+    Returns:
+        Dict with the concurrency, request and error counts, req/s and latency
+        percentiles in milliseconds
+    """
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    next_index = 0
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+
+        async def worker():
+            nonlocal next_index
+            while next_index < requests:
+                payload = payloads[next_index % len(payloads)]
+                next_index += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.post(url, json=payload)
+                    if response.status_code >= 400:
+                        key = str(response.status_code)
+                        errors[key] = errors.get(key, 0) + 1
+                        continue
+                except httpx.HTTPError as e:
+                    key = type(e).__name__
+                    errors[key] = errors.get(key, 0) + 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+    }
+
+
+def format_table(target: str, results: List[Dict[str, Any]]) -> str:
+    lines = [
+        f"{target}",
+        f"{'concurrency':>11} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}",
+    ]
+    for r in results:
+        lines.append(
+            f"{r['concurrency']:>11} {r['requests_per_second']:>9} {r['p50_ms']:>9} "
+            f"{r['p95_ms']:>9} {r['p99_ms']:>9} {sum(r['errors'].values()):>7}"
+        )
+    return "\n".join(lines)
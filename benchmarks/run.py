@@ -0,0 +1,150 @@
+"""
+Offline throughput benchmark for kadena-ai and kadena-trader.
+
+Starts the stub Kadena/analysis API and the services under uvicorn with the
+fake chat model, then drives each target endpoint at several concurrency
+levels. Nothing leaves the machine.
+
+Usage (from the repository root):
+    python -m benchmarks.run --targets query,code,prompt --concurrency 1,4,16 --requests 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+import httpx
+
+from benchmarks.loadgen import format_table, run_level
+from benchmarks.scenarios import TARGETS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 60.0, interval: float = 0.2) -> None:
+    deadline = time.monotonic() + timeout
+    # One client for all polls; building one per poll costs enough CPU to slow the server's startup
+    with httpx.Client(timeout=1.0) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server for {url} exited with code {process.returncode}")
+            try:
+                if client.get(url).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(interval)
+    raise RuntimeError(f"Server for {url} did not become ready within {timeout}s")
+
+
+@contextmanager
+def serve(app: str, cwd: str, env: Dict[str, str], ready_path: str, workers: int = 1,
+          poll_interval: float = 0.2) -> Iterator[str]:
+    """Run `app` under uvicorn on a free local port and yield its base URL."""
+    port = _free_port()
+    command = [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning"]
+    process = subprocess.Popen(command, cwd=cwd, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_ready(base_url + ready_path, process, interval=poll_interval)
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def benchmark_env(llm_latency_ms: float, llm_jitter_ms: float = 0.0, api_latency_ms: float = 0.0) -> Dict[str, str]:
+    """Environment for the services and the stub: fake model, no rate limits, logs to stderr only."""
+    return {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])),
+        "OPENAI_API_KEY": "benchmark",
+        "API_KEY": "benchmark",
+        "KADENA_CHAT_MODEL_FACTORY": "benchmarks.fake_llm:chat_model",
+        "FAKE_LLM_LATENCY_MS": str(llm_latency_ms),
+        "FAKE_LLM_JITTER_MS": str(llm_jitter_ms),
+        "STUB_API_LATENCY_MS": str(api_latency_ms),
+        "LOG_FILE": "",
+        # Every request comes from one address; per-caller limits would reject most of them
+        "RATE_LIMIT": "0",
+    }
+
+
+def use_stub(env: Dict[str, str], stub_url: str) -> None:
+    """Point the services' Kadena, analysis and OpenAI health-check URLs at the stub."""
+    env["KADENA_API_BASE_URL"] = stub_url
+    env["ANALYSIS_API_URL"] = stub_url + "/analyze"
+    # Health monitors probe OpenAI's model listing; keep that local too
+    env["OPENAI_BASE_URL"] = stub_url + "/v1"
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark /query, /code and /prompt against local stubs")
+    parser.add_argument("--targets", default="query,code,prompt", help="Comma-separated: query, code, prompt")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed requests sent before each target")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="Fake model latency per call")
+    parser.add_argument("--llm-jitter-ms", type=float, default=0.0, help="Uniform +/- jitter on model latency")
+    parser.add_argument("--api-latency-ms", type=float, default=20.0, help="Stub API latency per request")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers per service")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = [t for t in targets if t not in TARGETS]
+    if unknown:
+        parser.error(f"Unknown targets {unknown}; choose from {sorted(TARGETS)}")
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    env = benchmark_env(args.llm_latency_ms, args.llm_jitter_ms, args.api_latency_ms)
+
+    results: Dict[str, List[Dict]] = {}
+    with serve("benchmarks.stub_api:app", ROOT, env, "/") as stub_url:
+        use_stub(env, stub_url)
+        for service in sorted({TARGETS[t][0] for t in targets}):
+            with serve("api:app", os.path.join(ROOT, service), env, "/metrics", args.workers) as base_url:
+                for target in targets:
+                    target_service, path, payloads = TARGETS[target]
+                    if target_service != service:
+                        continue
+                    url = base_url + path
+                    asyncio.run(run_level(url, payloads, 1, args.warmup))
+                    results[target] = [asyncio.run(run_level(url, payloads, c, args.requests)) for c in levels]
+                    print(format_table(f"{target} ({service} {path})", results[target]))
+                    print()
+
+    report = {
+        "settings": {
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_jitter_ms": args.llm_jitter_ms,
+            "api_latency_ms": args.api_latency_ms,
+            "requests": args.requests,
+            "workers": args.workers,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+from typing import Any, Dict, List
+
+from benchmarks.fake_llm import AGENT_CODE
+
+# Request bodies per benchmark target, sent round-robin by the load generator.
+# The fake model routes /query by keyword, so these cover every agent path.
+QUERY_PAYLOADS: List[Dict[str, Any]] = [
+    {"query": "Get me a quote for 10 KDA to arkade.token", "history": []},
+    {"query": "Swap 10 KDA for arkade.token", "history": []},
+    {"query": "Transfer 1 KDA to my friend", "history": []},
+    {"query": "Launch an NFT in my collection", "history": []},
+    {"query": "Create an NFT collection called Bench", "history": []},
+    {"query": "What is Kadena's consensus mechanism?", "history": []},
+    {"query": "Hello", "history": []},
+    {"query": "What was the last quote again?", "history": [
+        "Human: Get me a quote for 10 KDA to arkade.token",
+        "AI: {'amountOut': '25.000000000000', 'priceImpact': '0.10'}",
+    ]},
+]
+
+CODE_PAYLOADS: List[Dict[str, Any]] = [
+    {"prompt": "Swap 1 KDA for arkade.token every 5 minutes"},
+    {"prompt": "Buy arkade.token with 2 KDA every day at noon"},
+    {"prompt": "Swap 2 KDA instead of 1", "previous_code": AGENT_CODE, "previous_interval": "rate(5 minutes)"},
+]
+
+PROMPT_PAYLOADS: List[Dict[str, Any]] = [
+    {"prompt": "Swap 1 KDA for arkade.token every 5 minutes", "history": []},
+    {"prompt": "Make me money", "history": []},
+]
+
+TARGETS = {
+    "query": ("kadena-ai", "/query", QUERY_PAYLOADS),
+    "code": ("kadena-trader", "/code", CODE_PAYLOADS),
+    "prompt": ("kadena-trader", "/prompt", PROMPT_PAYLOADS),
+}
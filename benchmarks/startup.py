@@ -0,0 +1,145 @@
+"""
+Cold-start benchmark for kadena-ai and kadena-trader.
+
+For each target, in fresh processes and against the fake model and the stub
+API, measures:
+
+- import: seconds to import the service's `api` module (`python -X importtime`)
+- ready: seconds from launching uvicorn until /health/live answers, which
+  includes the startup warmup
+- first: latency of the first request after the service is ready
+- steady: median latency of the same request repeated afterwards
+
+With --profile-imports, also prints where the import time goes, per
+top-level package.
+
+Usage (from the repository root):
+    python -m benchmarks.startup --targets query,code --runs 3 --output startup.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+from benchmarks.run import ROOT, benchmark_env, serve, use_stub
+from benchmarks.scenarios import TARGETS
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def measure_import(service: str, env: Dict[str, str]) -> Tuple[float, Dict[str, float]]:
+    """
+    Import the service's api module in a fresh interpreter.
+
+    Returns:
+        Seconds to import it, and seconds of import time per top-level package
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import api"],
+        cwd=os.path.join(ROOT, service), env=env, capture_output=True, text=True,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"Importing {service}'s api failed:\n{process.stderr[-2000:]}")
+    total, packages = 0.0, defaultdict(float)
+    for line in process.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        own_us, cumulative_us, _, module = match.groups()
+        packages[module.split(".")[0]] += int(own_us) / 1e6
+        if module == "api":
+            total = int(cumulative_us) / 1e6
+    return total, dict(packages)
+
+
+def measure_start(service: str, path: str, payload: Dict[str, Any], env: Dict[str, str],
+                  requests: int) -> Dict[str, float]:
+    """Start the service, then time its first request and `requests` more of the same."""
+    started = time.perf_counter()
+    with serve("api:app", os.path.join(ROOT, service), env, "/health/live", poll_interval=0.02) as base_url:
+        ready = time.perf_counter() - started
+        latencies = []
+        with httpx.Client(base_url=base_url, timeout=60.0) as client:
+            for _ in range(requests + 1):
+                request_started = time.perf_counter()
+                response = client.post(path, json=payload)
+                latencies.append(time.perf_counter() - request_started)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{service} {path} answered {response.status_code}: {response.text}")
+    return {
+        "ready_seconds": ready,
+        "first_ms": latencies[0] * 1000,
+        "steady_ms": statistics.median(latencies[1:]) * 1000 if requests else 0.0,
+    }
+
+
+def format_table(results: Dict[str, Dict[str, Any]]) -> str:
+    lines = [f"{'target':<10}{'service':<16}{'import s':>10}{'ready s':>10}{'first ms':>10}{'steady ms':>11}"]
+    for target, r in results.items():
+        lines.append(
+            f"{target:<10}{r['service']:<16}{r['import_seconds']:>10.2f}{r['ready_seconds']:>10.2f}"
+            f"{r['first_ms']:>10.1f}{r['steady_ms']:>11.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure import, startup and first-request time of the services")
+    parser.add_argument("--targets", default="query,code", help="Comma-separated: query, code, prompt")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh starts per target; medians are reported")
+    parser.add_argument("--requests", type=int, default=5, help="Requests after the first, for the steady latency")
+    parser.add_argument("--profile-imports", type=int, default=0, metavar="N",
+                        help="Print the N top-level packages taking the most import time")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = [t for t in targets if t not in TARGETS]
+    if unknown:
+        parser.error(f"Unknown targets {unknown}; choose from {sorted(TARGETS)}")
+
+    # No model or API latency: only the services' own work is measured
+    env = benchmark_env(llm_latency_ms=0.0)
+    results: Dict[str, Dict[str, Any]] = {}
+    with serve("benchmarks.stub_api:app", ROOT, env, "/") as stub_url:
+        use_stub(env, stub_url)
+        for target in targets:
+            service, path, payloads = TARGETS[target]
+            runs, packages = [], {}
+            for _ in range(args.runs):
+                import_seconds, packages = measure_import(service, env)
+                runs.append({"import_seconds": import_seconds,
+                             **measure_start(service, path, payloads[0], env, args.requests)})
+            results[target] = {
+                "service": service,
+                **{field: statistics.median(run[field] for run in runs) for field in runs[0]},
+                "runs": runs,
+            }
+            if args.profile_imports:
+                results[target]["import_packages"] = dict(
+                    sorted(packages.items(), key=lambda item: -item[1])[:args.profile_imports]
+                )
+
+    print(format_table(results))
+    if args.profile_imports:
+        for target, r in results.items():
+            print(f"\nImport time of {r['service']} by package (last run):")
+            for package, seconds in r["import_packages"].items():
+                print(f"  {package:<28}{seconds:>8.3f}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"settings": {"runs": args.runs, "requests": args.requests}, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from kadena_common.kadena_client import InvalidRequest, validate_request
+
+# Simulated upstream latency per request
+LATENCY_MS = float(os.getenv("STUB_API_LATENCY_MS", "20"))
+
+app = FastAPI(
+    title="Kadena API stub",
+    description="Local stand-in for the Kadena transaction API and the analysis API, for benchmarks",
+)
+
+
+async def _body(request: Request, endpoint: str = None) -> Dict[str, Any]:
+    """The request body, checked like the real API checks it when `endpoint` is given."""
+    await asyncio.sleep(LATENCY_MS / 1000)
+    body = await request.json()
+    if endpoint is not None:
+        validate_request(endpoint, body)
+    return body
+
+
+@app.exception_handler(InvalidRequest)
+async def invalid_request(request: Request, exc: InvalidRequest):
+    return JSONResponse(status_code=400, content={"error": str(exc)})
+
+
+def _transaction(body: Dict[str, Any]) -> Dict[str, Any]:
+    cmd = json.dumps(body, sort_keys=True)
+    return {"cmd": cmd, "hash": hashlib.sha256(cmd.encode()).hexdigest(), "sigs": [None]}
+
+
+@app.post("/quote")
+async def quote(request: Request):
+    body = await _body(request, "quote")
+    if "amountIn" in body:
+        return {"amountOut": f"{float(body['amountIn']) * 2.5:.12f}", "priceImpact": "0.10"}
+    return {"amountIn": f"{float(body.get('amountOut', 0)) / 2.5:.12f}", "priceImpact": "0.10"}
+
+
+@app.post("/transfer")
+async def transfer(request: Request):
+    return {"transaction": _transaction(await _body(request, "transfer"))}
+
+
+@app.post("/swap")
+async def swap(request: Request):
+    body = await _body(request, "swap")
+    amount = body.get("amountIn") or body.get("amountOut")
+    return {
+        "transaction": _transaction(body),
+        "quote": {"expectedIn": amount, "expectedOut": amount, "slippage": "0.005", "priceImpact": "0.10"},
+    }
+
+
+@app.post("/nft/launch")
+async def nft_launch(request: Request):
+    body = await _body(request, "nft/launch")
+    return {"transaction": _transaction(body), "tokenId": "t:" + hashlib.sha256(body.get("uri", "").encode()).hexdigest()[:43]}
+
+
+@app.post("/nft/collection")
+async def nft_collection(request: Request):
+    body = await _body(request, "nft/collection")
+    return {"transaction": _transaction(body), "collectionId": "collection:" + hashlib.sha256(body.get("name", "").encode()).hexdigest()[:43]}
+
+
+@app.post("/analyze")
+async def analyze(request: Request):
+    body = await _body(request)
+    return {"response": f"Canned analysis for: {body.get('query', '')}"}
+
+
+@app.get("/")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/v1/models")
+async def models():
+    """OpenAI model listing, probed by the services' health monitors."""
+    return {"object": "list", "data": [{"id": "o4-mini", "object": "model"}, {"id": "gpt-4.1", "object": "model"}]}
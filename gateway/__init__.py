@@ -0,0 +1,12 @@
+"""
+Unified gateway: kadena-ai and kadena-trader served by one process.
+
+`gateway.app` is the ASGI app; `python -m gateway` runs it with uvicorn,
+optionally with several workers.
+"""
+
+# Service directory -> the path prefix it is mounted at
+MOUNTS = {
+    "kadena-ai": "/ai",
+    "kadena-trader": "/trader",
+}
@@ -0,0 +1,40 @@
+"""
+Run the gateway with uvicorn.
+
+Usage (from the repository root):
+    python -m gateway --port 8000 --workers 4
+
+Each worker is a full copy of the gateway, with its own model clients,
+connection pools, answer cache and idempotency store. With several workers,
+state that must hold for the whole host is moved out of process memory
+before they start: rate limits and usage go to one SQLite file (unless
+RATE_LIMIT_BACKEND is set), and each worker logs to its own file (unless
+LOG_FILE is set), since a rotating log file can't be shared.
+"""
+import argparse
+import os
+import sys
+import tempfile
+from typing import List
+
+import uvicorn
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve kadena-ai and kadena-trader from one process per worker")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    args = parser.parse_args(argv)
+
+    if args.workers > 1:
+        os.environ.setdefault(
+            "RATE_LIMIT_BACKEND", "sqlite:" + os.path.join(tempfile.gettempdir(), "kadena_gateway_quota.db")
+        )
+        os.environ.setdefault("LOG_FILE", "kadena_gateway.{pid}.log")
+    uvicorn.run("gateway.app:app", host=args.host, port=args.port, workers=args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+One ASGI app serving the Kadena AI agent and the trader.
+
+The agent is mounted at /ai and the trader at /trader, each with all of its
+routes and middleware, so `POST /ai/query` and `POST /trader/code` behave as
+`POST /query` and `POST /code` on the separate services. Admission control
+and idempotency stay per service. Everything kadena_common keeps per process
+is shared:
+- model clients and their connection pools
+- the HTTP session, circuit breakers and retry budgets
+- the token registry and the Kadena API request models
+- rate limits and usage, through one quota backend
+- request profiles
+- the metrics registry
+
+Logs from both services go to one LOG_FILE (default kadena_gateway.log).
+
+Usage (from the repository root):
+    uvicorn gateway.app:app --port 8000
+    python -m gateway --workers 4
+"""
+import datetime
+import importlib.util
+import os
+import sys
+from contextlib import asynccontextmanager
+from types import ModuleType
+from typing import Dict, Set
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from kadena_common.logs import setup_logging
+
+# Configure logging before the services import; only the first call takes effect
+setup_logging("kadena-gateway", log_file=os.getenv("LOG_FILE", "kadena_gateway.log"))
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
+
+from kadena_common import metrics
+from gateway import MOUNTS
+
+
+def _shared_module_names() -> Set[str]:
+    """Modules (other than api) that more than one service defines; they would shadow each other."""
+    names = [
+        {name[:-3] for name in os.listdir(os.path.join(ROOT, service)) if name.endswith(".py")} - {"api"}
+        for service in MOUNTS
+    ]
+    return set.intersection(*names)
+
+
+def load_service(service: str) -> ModuleType:
+    """
+    Import a service's api module.
+
+    Every service's entrypoint is called `api`, so each is loaded under its
+    own name (e.g. kadena_ai_api). The service's directory goes on sys.path
+    for its other modules (agent, coder, ...).
+    """
+    directory = os.path.join(ROOT, service)
+    if directory not in sys.path:
+        sys.path.append(directory)
+    name = service.replace("-", "_") + "_api"
+    spec = importlib.util.spec_from_file_location(name, os.path.join(directory, "api.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+shared = _shared_module_names()
+if shared:
+    raise RuntimeError(f"Services define modules with the same names {sorted(shared)}; rename them to share a process")
+
+SERVICES: Dict[str, ModuleType] = {service: load_service(service) for service in MOUNTS}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Mounted apps get no lifespan events of their own; run their startup handlers
+    # (health monitors, warmup) and shutdown handlers with the gateway's
+    for service in SERVICES.values():
+        await service.app.router.startup()
+    try:
+        yield
+    finally:
+        for service in SERVICES.values():
+            await service.app.router.shutdown()
+
+
+app = FastAPI(
+    title="Kadena Gateway",
+    description="Kadena AI agent (/ai) and trader (/trader) APIs in one process",
+    version="1.0.0",
+    lifespan=lifespan,
+)
+
+
+def _ready() -> bool:
+    return all(service.health_monitor.ready for service in SERVICES.values())
+
+
+@app.get("/", summary="Health check endpoint")
+async def health_check():
+    """Readiness and upstream health of every mounted service, from their background checks"""
+    return {
+        "status": "ok" if _ready() else "degraded",
+        "services": {
+            service: {
+                "path": MOUNTS[service],
+                "ready": module.health_monitor.ready,
+                "dependencies": module.health_monitor.snapshot(),
+            }
+            for service, module in SERVICES.items()
+        },
+        "timestamp": datetime.datetime.utcnow().isoformat(),
+    }
+
+
+@app.get("/health/live", summary="Liveness probe")
+async def liveness():
+    """The process is up and serving requests"""
+    return {"status": "ok"}
+
+
+@app.get("/health/ready", summary="Readiness probe")
+async def readiness():
+    """Whether every mounted service is ready"""
+    body = {"status": "ready" if _ready() else "not ready",
+            "services": {service: module.health_monitor.ready for service, module in SERVICES.items()}}
+    return JSONResponse(body, status_code=200 if _ready() else 503)
+
+
+@app.get("/metrics", summary="Prometheus metrics", include_in_schema=False)
+async def get_metrics():
+    """Export the metrics of both services (one registry) in the Prometheus text format"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+for service, prefix in MOUNTS.items():
+    app.mount(prefix, SERVICES[service].app)
@@ -0,0 +1,51 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Run in a fresh interpreter: the gateway configures logging and loads both services at import
+SCRIPT = """
+import json, sys
+sys.path.insert(0, sys.argv[1])
+from fastapi.testclient import TestClient
+from gateway.app import app
+
+with TestClient(app) as client:
+    backtest = client.post("/trader/backtest", json={"prices": "prices.csv", "strategies": [{"buy_amount": 1}]})
+    invalid = client.post("/ai/query", json={})
+    print(json.dumps({
+        "live": client.get("/health/live").status_code,
+        "services": sorted(client.get("/").json()["services"]),
+        "ai": client.get("/ai/health/live").status_code,
+        "trader": client.get("/trader/health/live").status_code,
+        "backtest": [backtest.status_code, backtest.json().get("bars")],
+        "invalid_query": invalid.status_code,
+        "request_id": "x-request-id" in invalid.headers,
+        "unknown": client.get("/other").status_code,
+        "metrics": client.get("/metrics").text,
+    }))
+"""
+
+
+def test_serves_both_services(tmp_path):
+    (tmp_path / "prices.csv").write_text("close\n1.0\n1.1\n0.9\n")
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "test")
+    env.setdefault("API_KEY", "test")
+    env.update(BACKTEST_DATA_DIR=str(tmp_path), LOG_FILE="", LOG_LEVEL="WARNING", HEALTH_CHECK_TIMEOUT_SECONDS="0.1")
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT, ROOT],
+        cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    metrics = report.pop("metrics")
+    assert report == {
+        "live": 200, "services": ["kadena-ai", "kadena-trader"], "ai": 200, "trader": 200,
+        "backtest": [200, 3], "invalid_query": 422, "request_id": True, "unknown": 404,
+    }
+    # Both services report into one registry, labelled with their mount prefix
+    assert 'endpoint="/trader/backtest",method="POST",status="200"' in metrics
+    assert 'endpoint="/ai/query",method="POST",status="422"' in metrics
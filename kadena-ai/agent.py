@@ -1,16 +1,87 @@
-import requests
-from typing import Dict, List, Any, Optional, Literal
-from langchain.agents import Tool, AgentExecutor, create_openai_functions_agent
-from langchain.schema import SystemMessage, HumanMessage
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+import json
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Any, Optional, Literal, Tuple, Union
+# langchain_core only: the `langchain.agents` package costs about a second of import time
 from langchain_core.agents import AgentFinish, AgentActionMessageLog
-from langchain.tools import BaseTool
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_function
+
+from kadena_common import deadline
+from kadena_common.kadena_client import UNAVAILABLE_MESSAGE, KadenaClient
+from kadena_common.metrics import span
+from kadena_common.models import DEADLINE_MODEL_OPTIONS, MODEL_TIMEOUT, chat_model, track_model_usage
+from kadena_common.semantic_cache import SemanticCache
 
 from config import (
-    API_KEY, MODEL_NAME, GPT4_MODEL, API_DOCS, TOKENS,
+    API_KEY, API_DOCS, TOKENS,
     KADENA_API_BASE_URL, ANALYSIS_API_URL, MAX_HISTORY_LENGTH
 )
+import router
+
+logger = logging.getLogger(__name__)
+
+KADENA = KadenaClient(KADENA_API_BASE_URL, API_KEY, ANALYSIS_API_URL)
+
+# Formatted Analysis API answers to general knowledge questions, shared between users
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "1") not in ("0", "false", "False")
+ANSWER_CACHE = SemanticCache(
+    "analysis",
+    capacity=int(os.getenv("SEMANTIC_CACHE_SIZE", "1000")),
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.8")),
+    ttl=float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "21600")),
+)
+
+# Receives progress events of the current turn (the WebSocket chat streams them to the client)
+current_progress: ContextVar[Optional[Callable[[Dict[str, Any]], None]]] = ContextVar("current_progress", default=None)
+
+
+def _progress(event: str, **data: Any) -> None:
+    listener = current_progress.get()
+    if listener is not None:
+        listener({"type": event, **data})
+
+
+def _complete(model, prompt_value, stage: str) -> str:
+    """
+    Run a formatting model and return its reply.
+
+    With a progress listener, the reply is streamed to it as "delta" events.
+    """
+    timeout = deadline.timeout(MODEL_TIMEOUT, stage=stage)
+    if current_progress.get() is None:
+        return model.invoke(prompt_value, timeout=timeout).content
+    parts = []
+    for chunk in model.stream(prompt_value, timeout=timeout):
+        parts.append(chunk.content)
+        _progress("delta", text=chunk.content)
+    return "".join(parts)
+
+def _parse_function_call(message: AIMessage) -> Union[AgentFinish, AgentActionMessageLog]:
+    """
+    Turn the routing model's reply into a tool call or a final answer.
+
+    Same result as LangChain's OpenAIFunctionsAgentOutputParser.
+    """
+    function_call = message.additional_kwargs.get("function_call")
+    if not function_call:
+        return AgentFinish(return_values={"output": message.content}, log=str(message.content))
+    try:
+        arguments = function_call["arguments"].strip()
+        tool_input = json.loads(arguments, strict=False) if arguments else {}
+    except json.JSONDecodeError:
+        raise OutputParserException(f"Could not parse tool input: {function_call} because the `arguments` is not valid JSON.")
+    return AgentActionMessageLog(
+        tool=function_call["name"],
+        tool_input=tool_input,
+        log=f"\nInvoking: `{function_call['name']}` with `{tool_input}`\n",
+        message_log=[message],
+    )
 
 class KadenaTransactionTool(BaseTool):
     name: str = "kadena_transaction"
@@ -70,71 +141,8 @@ class KadenaTransactionTool(BaseTool):
         """
         Generate an unsigned transaction by calling the Kadena API.
         """
-        # Validate endpoint
-        valid_endpoints = {'quote', 'transfer', 'swap', 'nft/launch', 'nft/collection'}
-        if endpoint not in valid_endpoints:
-            return {"error": f"Invalid endpoint. Must be one of: {valid_endpoints}"}
-        
-        # Validate required parameters based on endpoint
-        required_params = {
-            'quote': ['tokenInAddress', 'tokenOutAddress', 'chainId'],
-            'transfer': ['tokenAddress', 'sender', 'receiver', 'amount', 'chainId'],
-            'swap': ['tokenInAddress', 'tokenOutAddress', 'account', 'chainId'],
-            'nft/launch': ['account', 'guard', 'mintTo', 'uri', 'collectionId', 'chainId'],
-            'nft/collection': ['account', 'guard', 'name', 'chainId']
-        }
-        
-        # Special validation for swap endpoint
-        if endpoint == 'swap':
-            if 'amountIn' in body and 'amountOut' in body:
-                return {"error": "Cannot specify both amountIn and amountOut for swap"}
-            if 'amountIn' not in body and 'amountOut' not in body:
-                return {"error": "Must specify either amountIn or amountOut for swap"}
-            
-        # Special validation for quote endpoint
-        if endpoint == 'quote':
-            if 'amountIn' in body and 'amountOut' in body:
-                return {"error": "Cannot specify both amountIn and amountOut for quote"}
-            if 'amountIn' not in body and 'amountOut' not in body:
-                return {"error": "Must specify either amountIn or amountOut for quote"}
-        
-        # Check required parameters
-        missing_params = [param for param in required_params[endpoint] 
-                         if param not in body]
-        if missing_params:
-            return {"error": f"Missing required parameters: {missing_params}"}
-        
-        # Validate chainId
-        if int(body.get('chainId')) > 19 or int(body.get('chainId')) < 0:
-            return {"error": "Invalid chainId. Must be between 0 and 19"}
-        
-        # Make API request
-        try:
-            response = requests.post(
-                f"{KADENA_API_BASE_URL}/{endpoint}",
-                json=body,
-                headers={'Content-Type': 'application/json', 'x-api-key': API_KEY}
-            )
-            
-            # Handle specific error cases
-            if response.status_code == 400:
-                error_data = response.json()
-                return {"error": f"Bad Request: {error_data.get('error', 'Unknown error')}"}
-            elif response.status_code == 500:
-                error_data = response.json()
-                return {"error": f"Server Error: {error_data.get('error', 'Unknown error')}"}
-                
-            response.raise_for_status()
-            return response.json()
-            
-        except requests.exceptions.RequestException as e:
-            if hasattr(e, 'response') and e.response is not None:
-                try:
-                    error_data = e.response.json()
-                    return {"error": f"API Error: {error_data.get('error', str(e))}"}
-                except ValueError:
-                    return {"error": f"API request failed: {str(e)}"}
-            return {"error": f"API request failed: {str(e)}"}
+        with span("tool", tool=f"{self.name}/{endpoint}"):
+            return KADENA.transaction(endpoint, body)
     
     async def _arun(self, endpoint: Literal["transfer", "swap", "nft/launch", "nft/collection", "quote"], body: Dict[str, Any]) -> Dict[str, Any]:
         """Async version of the tool."""
@@ -154,58 +162,24 @@ class KadenaAnalysisTool(BaseTool):
         """
         Send a query to the analysis endpoint and get K-Agent's response.
         """
-        try:
-            response = requests.post(
-                ANALYSIS_API_URL,
-                json={
-                    'query': query,
-                    'systemPrompt': systemPrompt               
-                },
-                headers={'Content-Type': 'application/json'}
-            )
-            
-            # Handle specific error cases
-            if response.status_code == 400:
-                error_data = response.json()
-                return {"error": f"Bad Request: {error_data.get('error', 'Unknown error')}"}
-            elif response.status_code == 500:
-                error_data = response.json()
-                return {"error": f"Server Error: {error_data.get('error', 'Unknown error')}"}
-                
-            response.raise_for_status()
-            return response.json()
-            
-        except requests.exceptions.RequestException as e:
-            if hasattr(e, 'response') and e.response is not None:
-                try:
-                    error_data = e.response.json()
-                    return {"error": f"API Error: {error_data.get('error', str(e))}"}
-                except ValueError:
-                    return {"error": f"API request failed: {str(e)}"}
-            return {"error": f"API request failed: {str(e)}"}
+        with span("tool", tool=self.name):
+            return KADENA.analyze(query, systemPrompt)
     
     async def _arun(self, query: str, systemPrompt: str) -> Dict[str, Any]:
         """Async version of the tool."""
         return self._run(query, systemPrompt)
 
-def run_kadena_agent_with_context(query: str, history: List[str] = None) -> Dict[str, Any]:
+# Function definitions offered to the routing model; converting the tools takes over 100ms the first time
+TOOL_FUNCTIONS = [convert_to_openai_function(tool) for tool in (KadenaTransactionTool(), KadenaAnalysisTool())]
+
+def _run_agent(query: str, history: List[str], plan: router.RoutePlan) -> Tuple[Any, List[Any], bool]:
     """
-    Run the Kadena agent with history and tool calling.
+    Let the routing model pick a tool for the query and post-process the tool's output.
+
+    Returns:
+        The reply, the agent's intermediate steps, and whether the reply is a
+        fully formatted Analysis API answer (the only kind worth caching)
     """
-    # Initialize history if not provided
-    if history is None:
-        history = []
-    
-    # Limit history to last 5 conversations (10 messages - 5 pairs of Q&A)
-    if len(history) > MAX_HISTORY_LENGTH:
-        history = history[-MAX_HISTORY_LENGTH:]
-    
-    # Create tools
-    tools = [
-        KadenaTransactionTool(),
-        KadenaAnalysisTool()
-    ]
-    
     # Format history for the prompt
     formatted_history = "\n".join(history) if history else "No previous conversation"
     
@@ -259,17 +233,18 @@ def run_kadena_agent_with_context(query: str, history: List[str] = None) -> Dict
         ("human", "{input}")
     ])
     
-    # Create the agent
-    agent = create_openai_functions_agent(
-        llm=ChatOpenAI(model=MODEL_NAME),
-        tools=tools,
-        prompt=prompt
+    # Create the agent: one function-calling model call, decoded into a tool call or an answer
+    llm = chat_model(plan.model, **DEADLINE_MODEL_OPTIONS).bind(
+        functions=TOOL_FUNCTIONS,
+        timeout=deadline.timeout(MODEL_TIMEOUT, stage="route"),
+        **plan.call_options(),
     )
+    agent = prompt | llm | _parse_function_call
     
     # Initialize agent input with required fields
     agent_input = {
         "input": query,
-        "intermediate_steps": [],  # Initialize empty intermediate steps
+        "agent_scratchpad": [],  # The agent makes a single step, so there are no earlier steps
         "API_DOCS": API_DOCS,
         "TOKENS": TOKENS,
         "history": history,  # Pass history directly
@@ -277,39 +252,51 @@ def run_kadena_agent_with_context(query: str, history: List[str] = None) -> Dict
     }
     
     # Process the query with the agent
-    response = agent.invoke(agent_input)
+    with span("route", model=plan.model):
+        response = agent.invoke(agent_input)
 
     result = response
+    formatted_analysis = False
 
     if isinstance(response, AgentFinish):
         result = response.return_values['output']
     elif isinstance(response, AgentActionMessageLog):
         tool_input = response.tool_input
         tool = response.tool
-        print("Using " + tool)
+        logger.info(f"Using {tool}")
+        _progress("status", stage="tool", tool=tool, input=tool_input)
         if tool == 'kadena_analysis':
             tool_output = KadenaAnalysisTool()._run(query=tool_input['query'], systemPrompt=tool_input['systemPrompt'])
             
-            gpt4_model = ChatOpenAI(model=GPT4_MODEL)
-            processing_prompt = ChatPromptTemplate.from_messages([
-                ("system", """
-                Given raw data from the Kadena API, process it and return a response to show to the user.
+            if isinstance(tool_output, dict) and tool_output.get('unavailable'):
+                result = UNAVAILABLE_MESSAGE
+            elif not deadline.can_afford("format_analysis"):
+                result = tool_output.get('response') or tool_output.get('error') if isinstance(tool_output, dict) else str(tool_output)
+            else:
+                gpt4_model = chat_model(plan.format_model, **DEADLINE_MODEL_OPTIONS)
+                processing_prompt = ChatPromptTemplate.from_messages([
+                    ("system", """
+                    Given raw data from the Kadena API, process it and return a response to show to the user.
                  
-                If there is an error, do your best to answer the user's query. If you cannot answer the user's query, then ask them to try again later.
-                """),
-                ("human", "{raw_data}")
-            ])
+                    If there is an error, do your best to answer the user's query. If you cannot answer the user's query, then ask them to try again later.
+                    """),
+                    ("human", "{raw_data}")
+                ])
             
-            processed_output = gpt4_model.invoke(
-                processing_prompt.format(raw_data=tool_output)
-            )
-            result = processed_output.content
+                _progress("status", stage="format_analysis")
+                with span("format_analysis", model=plan.format_model):
+                    result = _complete(gpt4_model, processing_prompt.format(raw_data=tool_output), "format_analysis")
+                formatted_analysis = 'error' not in tool_output if isinstance(tool_output, dict) else True
         elif tool == 'kadena_transaction':
             tool_output = KadenaTransactionTool()._run(endpoint=tool_input['endpoint'], body={k:v for k,v in tool_input.items() if k != 'endpoint'})
 
             # Check for error in transaction output
-            if isinstance(tool_output, dict) and 'error' in tool_output:
-                gpt4_model = ChatOpenAI(model=GPT4_MODEL)
+            if isinstance(tool_output, dict) and tool_output.get('unavailable'):
+                result = UNAVAILABLE_MESSAGE
+            elif isinstance(tool_output, dict) and 'error' in tool_output and not deadline.can_afford("explain_error"):
+                result = tool_output['error']
+            elif isinstance(tool_output, dict) and 'error' in tool_output:
+                gpt4_model = chat_model(plan.format_model, **DEADLINE_MODEL_OPTIONS)
                 error_prompt = ChatPromptTemplate.from_messages([
                     ("system", """
                     You are a helpful assistant explaining Kadena transaction errors to users.
@@ -329,14 +316,13 @@ def run_kadena_agent_with_context(query: str, history: List[str] = None) -> Dict
                     """)
                 ])
                 
-                error_explanation = gpt4_model.invoke(
-                    error_prompt.format(
+                _progress("status", stage="explain_error")
+                with span("explain_error", model=plan.format_model):
+                    result = _complete(gpt4_model, error_prompt.format(
                         error=tool_output.get('error', 'Unknown error'),
                         details=tool_output.get('details', 'No additional details available'),
                         query=query
-                    )
-                )
-                result = error_explanation.content
+                    ), "explain_error")
             else:
                 if tool_input['endpoint'] == 'quote':
                     result ={ **tool_output , 
@@ -344,6 +330,52 @@ def run_kadena_agent_with_context(query: str, history: List[str] = None) -> Dict
                 else:
                     result = tool_output
 
+    intermediate_steps = response.intermediate_steps if hasattr(response, 'intermediate_steps') else []
+    return result, intermediate_steps, formatted_analysis
+
+
+def run_kadena_agent_with_context(query: str, history: List[str] = None) -> Dict[str, Any]:
+    """
+    Run the Kadena agent with history and tool calling.
+
+    The turn is first classified by intent (see router.py): greetings and
+    balance lookups are answered without a model, and the remaining intents
+    use the model and reasoning effort their route plan names. General
+    knowledge questions are answered from the semantic answer cache when a
+    similar question was answered recently.
+
+    Model and API calls are bounded by the current request deadline (see
+    kadena_common.deadline); when too little budget is left, the formatting
+    and error explanations are skipped and the raw tool output is returned
+    instead.
+    """
+    # Initialize history if not provided
+    if history is None:
+        history = []
+    
+    # Limit history to last 5 conversations (10 messages - 5 pairs of Q&A)
+    if len(history) > MAX_HISTORY_LENGTH:
+        history = history[-MAX_HISTORY_LENGTH:]
+
+    intent = router.classify(query)
+    plan = router.plan_for(intent)
+    logger.info(f"Routing {intent} turn to {plan.model or 'no model'}")
+    _progress("status", stage="route", intent=intent)
+    started = time.perf_counter()
+    cache_key = router.cache_key(intent, query, history) if SEMANTIC_CACHE_ENABLED else None
+    with track_model_usage() as usage:
+        result = router.answer_directly(intent, query)
+        if result is None and cache_key:
+            result = ANSWER_CACHE.get(cache_key)
+        intermediate_steps = []
+        if result is None:
+            result, intermediate_steps, formatted_analysis = _run_agent(
+                query, history, plan if plan.model else router.FALLBACK_PLAN
+            )
+            if cache_key and formatted_analysis:
+                ANSWER_CACHE.put(cache_key, result)
+    router.REPORT.record(intent, time.perf_counter() - started, usage)
+
     # Add new conversation to history
     history.extend([
         "Human: "+query,
@@ -356,6 +388,6 @@ def run_kadena_agent_with_context(query: str, history: List[str] = None) -> Dict
     
     return {
         "response": result,
-        "intermediate_steps": response.intermediate_steps if hasattr(response, 'intermediate_steps') else [],
+        "intermediate_steps": intermediate_steps,
         "history": history
     } 
\ No newline at end of file
@@ -0,0 +1,128 @@
+"""
+Batch evaluation of agent turns.
+
+Runs many (query, history) items through `run_kadena_agent_with_context`
+with bounded concurrency and yields each result as soon as it finishes, so
+QA and analytics jobs can replay thousands of queries in one request. Items
+share the process's model clients, HTTP sessions and answer cache; identical
+items in a batch run once. Each item that runs is a turn of its own for
+rate limits, admission and usage (see turns.TurnGate); items wait for the
+caller's rate limit and an admission slot until the batch deadline, so a
+batch larger than the caller's burst is paced rather than refused.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import openai
+
+from kadena_common import quota
+from kadena_common.deadline import DeadlineExceeded, deadline_scope
+
+from agent import run_kadena_agent_with_context
+from turns import TurnGate
+import router
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+# Agent turns run on the shared thread pool; keep batches from taking all of it from /query
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+# Items still waiting for the caller's rate limit or an admission slot this long after the batch started are refused
+BATCH_DEADLINE_SECONDS = float(os.getenv("BATCH_DEADLINE_SECONDS", "3600"))
+
+
+async def run_batch(items: List[Dict[str, Any]], concurrency: int = BATCH_CONCURRENCY,
+                    timeout_seconds: Optional[float] = None, gate: Optional[TurnGate] = None,
+                    caller: str = "", deadline_seconds: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run agent turns concurrently and yield their results in completion order.
+
+    Args:
+        items: Dicts with "query", optional "history" and optional "id"
+        concurrency: Turns running at once (at most BATCH_MAX_CONCURRENCY)
+        timeout_seconds: Time budget per turn; defaults to REQUEST_DEADLINE_SECONDS
+        gate: Charges each turn to the caller's rate limit, admission slot and
+            usage; None runs every item unchecked
+        caller: Caller id the turns are charged to (see kadena_common.quota)
+        deadline_seconds: How long items may wait for the gate, from the start
+            of the batch; defaults to BATCH_DEADLINE_SECONDS
+
+    Yields:
+        One dict per item: its index and id, status ("ok" or "error"), the
+        response and history (or error), the routed intent, seconds spent
+        queued and running, and the item's model and upstream API usage.
+        Items the gate still refuses at the deadline have status "error"
+        with the refusal's status_code and retry_after, and don't run.
+    """
+    slots = asyncio.Semaphore(max(1, min(concurrency, BATCH_MAX_CONCURRENCY)))
+    # Identical items share one run
+    runs: Dict[str, asyncio.Task] = {}
+    started = time.perf_counter()
+    wait_until = time.monotonic() + (deadline_seconds or BATCH_DEADLINE_SECONDS)
+
+    async def run_item(item: Dict[str, Any]) -> Dict[str, Any]:
+        async with slots:
+            if gate is not None:
+                refused = await gate.admit(caller, wait_until)
+                if refused is not None:
+                    return {"status": "error", "error": refused["detail"], "status_code": refused["status"],
+                            "retry_after": refused["retry_after"],
+                            "queued_seconds": round(time.perf_counter() - started, 3), "seconds": 0.0, "usage": {}}
+            queued = time.perf_counter() - started
+            usage = quota.Usage()
+            token = quota.current_usage.set(usage)
+            run_started = time.perf_counter()
+            failed = False
+            try:
+                with deadline_scope(timeout_seconds):
+                    result = await asyncio.to_thread(
+                        run_kadena_agent_with_context, item["query"], list(item.get("history") or [])
+                    )
+                outcome = {"status": "ok", "response": result["response"], "history": result["history"]}
+            except (DeadlineExceeded, openai.APITimeoutError) as e:
+                outcome = {"status": "error", "error": f"Timed out: {str(e)}"}
+            except Exception as e:
+                failed = True
+                logger.error(f"Error processing batch item: {str(e)}")
+                outcome = {"status": "error", "error": str(e)}
+            finally:
+                quota.current_usage.reset(token)
+                if gate is not None:
+                    await gate.finish(caller, run_started, failed, usage)
+            return {
+                **outcome,
+                "queued_seconds": round(queued, 3),
+                "seconds": round(time.perf_counter() - run_started, 3),
+                "usage": {field: count for field, count in usage.counts.items() if field not in ("requests", "rejected")},
+            }
+
+    async def finish(index: int, item: Dict[str, Any], run: asyncio.Task, duplicate: bool) -> Dict[str, Any]:
+        result = await run
+        return {
+            "index": index,
+            "id": item.get("id"),
+            "intent": router.classify(item["query"]),
+            **result,
+            **({"duplicate": True} if duplicate else {}),
+        }
+
+    pending = set()
+    for index, item in enumerate(items):
+        key = json.dumps([item["query"], item.get("history") or []])
+        duplicate = key in runs
+        if not duplicate:
+            runs[key] = asyncio.create_task(run_item(item))
+        pending.add(asyncio.create_task(finish(index, item, runs[key], duplicate)))
+
+    try:
+        for next_done in asyncio.as_completed(pending):
+            yield await next_done
+    finally:
+        # The client went away or the batch failed; don't start the remaining turns
+        for task in [*pending, *runs.values()]:
+            task.cancel()
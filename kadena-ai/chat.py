@@ -0,0 +1,425 @@
+"""
+WebSocket chat sessions.
+
+One connection carries a whole conversation: the server keeps the history
+and the account context (account, public key, guard, chainId, balances) for
+the connection's lifetime, so clients send only the new message. Turns
+stream their progress (routing, tool calls, formatted reply deltas) as they
+happen, and after a quote the server keeps pushing refreshed quotes until
+the client moves on. Sessions watching the same quote share one refresh.
+
+Idle connections hold no thread and no model client: just the session state
+and two small tasks. Outgoing events go through a bounded queue; a turn that
+produces events faster than the client reads them waits, and a client that
+stops reading for CHAT_SEND_TIMEOUT_SECONDS is disconnected. Connections
+without messages or a running turn for CHAT_IDLE_TIMEOUT_SECONDS are closed.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set
+
+from fastapi import WebSocket
+from fastapi.encoders import jsonable_encoder
+from starlette.websockets import WebSocketDisconnect
+import openai
+
+from kadena_common import metrics
+from kadena_common.admission import RouteLimiter
+from kadena_common.deadline import MAX_DEADLINE, DeadlineExceeded, deadline_scope
+from kadena_common.quota import Backend, RateLimit, Usage, caller_id, current_usage
+
+from agent import KADENA, current_progress, run_kadena_agent_with_context
+from config import MAX_HISTORY_LENGTH
+from turns import TurnGate
+import router
+
+logger = logging.getLogger(__name__)
+
+CHAT_MAX_CONNECTIONS = int(os.getenv("CHAT_MAX_CONNECTIONS", "5000"))
+CHAT_IDLE_TIMEOUT = float(os.getenv("CHAT_IDLE_TIMEOUT_SECONDS", "300"))
+CHAT_SEND_QUEUE_SIZE = int(os.getenv("CHAT_SEND_QUEUE_SIZE", "64"))
+CHAT_SEND_TIMEOUT = float(os.getenv("CHAT_SEND_TIMEOUT_SECONDS", "10"))
+CHAT_MAX_MESSAGE_BYTES = int(os.getenv("CHAT_MAX_MESSAGE_BYTES", "65536"))
+CHAT_QUOTE_REFRESH_SECONDS = float(os.getenv("CHAT_QUOTE_REFRESH_SECONDS", "15"))
+# How long a quote keeps being refreshed without the client asking again
+CHAT_QUOTE_WATCH_SECONDS = float(os.getenv("CHAT_QUOTE_WATCH_SECONDS", "300"))
+
+# Close codes (RFC 6455)
+NORMAL_CLOSURE = 1000
+POLICY_VIOLATION = 1008
+TRY_AGAIN_LATER = 1013
+
+CHAT_CONNECTIONS = metrics.gauge(
+    "kadena_chat_connections",
+    "Open WebSocket chat connections",
+)
+CHAT_DISCONNECTS = metrics.counter(
+    "kadena_chat_disconnects_total",
+    "Closed WebSocket chat connections by reason (client, idle, slow_consumer, busy)",
+    ("reason",),
+)
+CHAT_PUSHES_DROPPED = metrics.counter(
+    "kadena_chat_pushes_dropped_total",
+    "Server-pushed updates dropped because the client's send queue was full",
+)
+
+
+class SlowConsumer(Exception):
+    """The client stopped reading events."""
+
+
+class ChatSession:
+    """
+    State of one chat connection.
+
+    Args:
+        websocket: The accepted connection
+        caller: Caller id for rate limits and usage (see kadena_common.quota)
+        quotes: Shared quote refreshes
+    """
+
+    def __init__(self, websocket: WebSocket, caller: str, quotes: "QuoteWatcher"):
+        self.id = uuid.uuid4().hex[:12]
+        self.websocket = websocket
+        self.caller = caller
+        self.quotes = quotes
+        self.history: List[str] = []
+        self.context: Optional[Dict[str, Any]] = None
+        self.turn: Optional[asyncio.Task] = None
+        self.reader: Optional[asyncio.Task] = None
+        self.abort_reason: Optional[str] = None
+        self.quote_watch: Optional[str] = None
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=CHAT_SEND_QUEUE_SIZE)
+        self.loop = asyncio.get_running_loop()
+        self.closed = False
+
+    @property
+    def busy(self) -> bool:
+        return self.turn is not None and not self.turn.done()
+
+    async def send(self, event: Dict[str, Any]) -> None:
+        """Queue an event, waiting while the queue is full."""
+        try:
+            await asyncio.wait_for(self.outbox.put(event), timeout=CHAT_SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise SlowConsumer()
+
+    def push(self, event: Dict[str, Any]) -> None:
+        """Queue an unsolicited update, dropping it if the client is behind."""
+        try:
+            self.outbox.put_nowait(event)
+        except asyncio.QueueFull:
+            CHAT_PUSHES_DROPPED.inc()
+
+    def send_from_thread(self, event: Dict[str, Any]) -> None:
+        """Progress listener for the agent thread: queue an event, blocking while the queue is full."""
+        if self.closed:
+            raise SlowConsumer()
+        future = asyncio.run_coroutine_threadsafe(self.send(event), self.loop)
+        try:
+            future.result(timeout=CHAT_SEND_TIMEOUT + 1)
+        except Exception:
+            future.cancel()
+            raise SlowConsumer()
+
+    def query_with_context(self, message: str) -> str:
+        """The message in the format the agent expects, with the account context appended as the chat app does."""
+        if router.CONTEXT_MARKER in message:
+            # Sent with its own context, as over HTTP; remember it for the next turns
+            _, context = router.split_context(message)
+            if context is not None:
+                self.context = context
+            return message
+        if self.context is None:
+            return message
+        return f"{message}\n{router.CONTEXT_MARKER} {json.dumps(self.context)}"
+
+    def watch_quote(self, body: Dict[str, Any]) -> None:
+        self.unwatch_quote()
+        self.quote_watch = self.quotes.watch(self, body)
+
+    def unwatch_quote(self) -> None:
+        if self.quote_watch is not None:
+            self.quotes.unwatch(self, self.quote_watch)
+            self.quote_watch = None
+
+    def abort(self, reason: str) -> None:
+        """End the connection from a turn or another task."""
+        self.abort_reason = reason
+        if self.reader is not None:
+            self.reader.cancel()
+
+    def close(self) -> None:
+        self.closed = True
+        self.unwatch_quote()
+        if self.busy:
+            self.turn.cancel()
+
+
+class QuoteWatcher:
+    """
+    Quote refreshes shared by the chat sessions watching them.
+
+    Sessions watching the same quote request share one loop that fetches the
+    quote every CHAT_QUOTE_REFRESH_SECONDS and pushes it to each of them when
+    it changes, so refreshes cost one upstream call per distinct quote rather
+    than per connection. A session stops receiving updates after
+    CHAT_QUOTE_WATCH_SECONDS, and a loop stops with its last session.
+    """
+
+    def __init__(self):
+        # Watched request -> {session: when its watch ends}
+        self.watches: Dict[str, Dict[ChatSession, float]] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+
+    def watch(self, session: ChatSession, body: Dict[str, Any]) -> str:
+        """Push refreshes of the quote for `body` to `session`; returns the key to unwatch it with."""
+        key = json.dumps(body, sort_keys=True)
+        self.watches.setdefault(key, {})[session] = time.monotonic() + CHAT_QUOTE_WATCH_SECONDS
+        if key not in self.tasks:
+            self.tasks[key] = asyncio.create_task(self._refresh(key, body))
+        return key
+
+    def unwatch(self, session: ChatSession, key: str) -> None:
+        subscribers = self.watches.get(key)
+        if subscribers is None:
+            return
+        subscribers.pop(session, None)
+        if not subscribers:
+            del self.watches[key]
+            self.tasks.pop(key).cancel()
+
+    async def _refresh(self, key: str, body: Dict[str, Any]) -> None:
+        subscribers = self.watches[key]
+        last = None
+        try:
+            while subscribers:
+                await asyncio.sleep(CHAT_QUOTE_REFRESH_SECONDS)
+                now = time.monotonic()
+                for session in [session for session, stop_at in subscribers.items() if stop_at <= now]:
+                    del subscribers[session]
+                if not subscribers:
+                    break
+                quote = await KADENA.aquote(body)
+                if not isinstance(quote, dict) or "error" in quote or quote == last:
+                    continue
+                last = quote
+                event = {"type": "quote", "quote": quote, "text": "Quote in terms of " + body["tokenOutAddress"]}
+                for session in list(subscribers):
+                    session.push(event)
+        finally:
+            if self.tasks.get(key) is asyncio.current_task():
+                del self.tasks[key]
+                del self.watches[key]
+
+
+class ChatServer:
+    """
+    Serves WebSocket chat connections for one app.
+
+    Turns share the app's admission limiter and "query" rate limit with
+    POST /query, so a chat turn costs the caller the same as an HTTP query.
+
+    Args:
+        limiter: Admission limiter of /query, or None without admission control
+        backend: Rate limit and usage backend
+        limit: Rate limit charged per turn
+    """
+
+    def __init__(self, limiter: Optional[RouteLimiter], backend: Backend, limit: RateLimit):
+        self.gate = TurnGate(limiter, backend, limit)
+        self.quotes = QuoteWatcher()
+        self.connections = 0
+        # Cancelled turns waiting for their agent thread before giving back their slot
+        self.draining: Set[asyncio.Task] = set()
+
+    async def serve(self, websocket: WebSocket) -> None:
+        await websocket.accept()
+        if self.connections >= CHAT_MAX_CONNECTIONS:
+            CHAT_DISCONNECTS.inc(reason="busy")
+            await websocket.close(code=TRY_AGAIN_LATER, reason="Too many connections")
+            return
+
+        session = ChatSession(websocket, caller_id(websocket.scope), self.quotes)
+        self.connections += 1
+        CHAT_CONNECTIONS.set(self.connections)
+        writer = asyncio.create_task(self._write(session))
+        session.reader = asyncio.create_task(self._read(session))
+        try:
+            reason = await session.reader
+        except WebSocketDisconnect:
+            reason = "client"
+        except SlowConsumer:
+            reason = "slow_consumer"
+        except asyncio.CancelledError:
+            if session.abort_reason is None:
+                raise
+            reason = session.abort_reason
+        finally:
+            session.close()
+            writer.cancel()
+            self.connections -= 1
+            CHAT_CONNECTIONS.set(self.connections)
+            CHAT_DISCONNECTS.inc(reason=reason)
+            logger.info(f"Chat session {session.id} closed ({reason})")
+
+        if reason == "idle":
+            await _close(websocket, NORMAL_CLOSURE, "Idle timeout")
+        elif reason == "slow_consumer":
+            await _close(websocket, POLICY_VIOLATION, "Client is not reading messages")
+
+    async def _write(self, session: ChatSession) -> None:
+        try:
+            while True:
+                event = await session.outbox.get()
+                await session.websocket.send_text(json.dumps(jsonable_encoder(event)))
+        except (WebSocketDisconnect, RuntimeError):
+            session.closed = True
+
+    async def _read(self, session: ChatSession) -> str:
+        """Handle client messages until the client leaves or the connection goes idle."""
+        await session.send({"type": "ready", "session": session.id})
+        while True:
+            try:
+                text = await asyncio.wait_for(session.websocket.receive_text(), timeout=CHAT_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                if session.busy:
+                    continue
+                return "idle"
+            if session.closed:
+                return "client"
+            if len(text) > CHAT_MAX_MESSAGE_BYTES:
+                await session.send({"type": "error", "status": 413, "detail": "Message too large"})
+                continue
+            try:
+                message = json.loads(text)
+                kind = message["type"]
+            except (ValueError, TypeError, KeyError):
+                await session.send({"type": "error", "status": 400, "detail": "Messages must be JSON objects with a type"})
+                continue
+            await self._handle(session, kind, message)
+
+    async def _handle(self, session: ChatSession, kind: str, message: Dict[str, Any]) -> None:
+        if kind == "query":
+            if session.busy:
+                await session.send({"type": "error", "id": message.get("id"), "status": 409,
+                                    "detail": "A query is already running on this connection"})
+                return
+            if not isinstance(message.get("query"), str) or not message["query"].strip():
+                await session.send({"type": "error", "id": message.get("id"), "status": 400, "detail": "query is required"})
+                return
+            session.unwatch_quote()
+            session.turn = asyncio.create_task(self._turn(session, message))
+        elif kind == "context":
+            session.context = {k: v for k, v in message.items() if k != "type"}
+            await session.send({"type": "context", "context": session.context})
+        elif kind == "unwatch":
+            session.unwatch_quote()
+        elif kind == "reset":
+            session.history = []
+            session.unwatch_quote()
+            await session.send({"type": "reset"})
+        elif kind == "ping":
+            await session.send({"type": "pong"})
+        else:
+            await session.send({"type": "error", "status": 400, "detail": f"Unknown message type: {kind}"})
+
+    async def _turn(self, session: ChatSession, message: Dict[str, Any]) -> None:
+        try:
+            quote_body = await self._run_turn(session, message)
+        except SlowConsumer:
+            session.abort("slow_consumer")
+            return
+        # Started outside the turn, so refreshes aren't counted in the turn's usage
+        if quote_body:
+            session.watch_quote(quote_body)
+
+    async def _run_turn(self, session: ChatSession, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Run one turn, streaming its events; the quote request to keep refreshing, if the turn was a quote."""
+        turn_id = message.get("id")
+        refused = await self.gate.admit(session.caller)
+        if refused is not None:
+            await session.send({"type": "error", "id": turn_id, **refused})
+            return None
+
+        query = session.query_with_context(message["query"])
+        quote_body: Dict[str, Any] = {}
+
+        def on_progress(event: Dict[str, Any]) -> None:
+            if event.get("stage") == "tool" and (event.get("input") or {}).get("endpoint") == "quote":
+                quote_body.update({k: v for k, v in event["input"].items() if k != "endpoint"})
+            session.send_from_thread({**event, "id": turn_id})
+
+        usage = Usage()
+        usage_token = current_usage.set(usage)
+        progress_token = current_progress.set(on_progress)
+        started = time.perf_counter()
+        failed = False
+        watch = None
+        work = None
+        try:
+            with deadline_scope(_timeout(message.get("timeout_seconds"))):
+                work = asyncio.ensure_future(asyncio.to_thread(run_kadena_agent_with_context, query, list(session.history)))
+                # Shielded so a cancelled turn can keep its admission slot until the thread returns
+                result = await asyncio.shield(work)
+            session.history = result["history"][-MAX_HISTORY_LENGTH:]
+            await session.send({
+                "type": "result", "id": turn_id,
+                "response": result["response"], "intermediate_steps": result["intermediate_steps"],
+                "seconds": round(time.perf_counter() - started, 3),
+            })
+            response = result["response"]
+            if quote_body.get("tokenOutAddress") and isinstance(response, dict) and "error" not in response:
+                watch = quote_body
+        except SlowConsumer:
+            raise
+        except (DeadlineExceeded, openai.APITimeoutError) as e:
+            logger.warning(f"Chat turn ran out of time: {str(e)}")
+            await session.send({"type": "error", "id": turn_id, "status": 504,
+                                "detail": "The query took too long to process. Please try again."})
+        except Exception as e:
+            failed = True
+            logger.error(f"Error processing chat turn: {str(e)}")
+            await session.send({"type": "error", "id": turn_id, "status": 500, "detail": str(e)})
+        finally:
+            current_progress.reset(progress_token)
+            current_usage.reset(usage_token)
+            if work is not None and not work.done():
+                # Cancelled with the connection; the thread stops at its next progress event
+                task = asyncio.create_task(self._finish_when_done(work, session.caller, started, usage))
+                self.draining.add(task)
+                task.add_done_callback(self.draining.discard)
+            else:
+                await self.gate.finish(session.caller, started, failed, usage)
+        return watch
+
+    async def _finish_when_done(self, work: asyncio.Future, caller: str, started: float, usage: Usage) -> None:
+        failed = False
+        try:
+            await work
+        except SlowConsumer:
+            pass
+        except Exception:
+            failed = True
+        await self.gate.finish(caller, started, failed, usage)
+
+
+def _timeout(value: Any) -> Optional[float]:
+    """A client-requested time budget, clamped to REQUEST_MAX_DEADLINE_SECONDS; None for the default."""
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return None
+    return min(seconds, MAX_DEADLINE) if seconds > 0 else None
+
+
+async def _close(websocket: WebSocket, code: int, reason: str) -> None:
+    try:
+        await websocket.close(code=code, reason=reason)
+    except RuntimeError:
+        # Already closed by the client
+        pass
@@ -0,0 +1,111 @@
+"""
+Send queries to /query/batch and save the results.
+
+Reads items from a JSONL file (or stdin): one JSON object per line with
+"query" and optional "history" and "id"; a line that is a plain JSON string
+is taken as the query. Results are written as NDJSON in completion order,
+and a summary (errors, p50/p95 per item, model calls, tokens) is printed
+at the end. Large inputs are sent in chunks of --chunk-size items.
+
+Usage:
+    python query_batch.py queries.jsonl --url http://localhost:8000 --concurrency 8 --output results.ndjson
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Any, Dict, Iterator, List, TextIO
+
+import requests
+
+
+def read_items(stream: TextIO) -> List[Dict[str, Any]]:
+    items = []
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        item = json.loads(line)
+        if isinstance(item, str):
+            item = {"query": item}
+        if not isinstance(item, dict) or not isinstance(item.get("query"), str):
+            raise ValueError(f"Line {number}: expected a JSON string or an object with a query")
+        items.append(item)
+    return items
+
+
+def stream_batch(url: str, items: List[Dict[str, Any]], concurrency: int, timeout_seconds: float,
+                 api_key: str = None, deadline_seconds: float = None) -> Iterator[Dict[str, Any]]:
+    """Post one batch and yield its results as they arrive."""
+    body = {"items": items, "concurrency": concurrency}
+    if timeout_seconds:
+        body["timeout_seconds"] = timeout_seconds
+    if deadline_seconds:
+        body["deadline_seconds"] = deadline_seconds
+    headers = {"x-api-key": api_key} if api_key else {}
+    with requests.post(url.rstrip("/") + "/query/batch", json=body, headers=headers, stream=True,
+                       timeout=(10, None)) as response:
+        if response.status_code != 200:
+            raise RuntimeError(f"Batch rejected with {response.status_code}: {response.text}")
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run many queries through the Kadena AI agent's /query/batch")
+    parser.add_argument("input", nargs="?", help="JSONL file of items (default: stdin)")
+    parser.add_argument("--url", default="http://localhost:8000", help="Base URL of the kadena-ai service")
+    parser.add_argument("--concurrency", type=int, default=4, help="Items processed at once by the server")
+    parser.add_argument("--timeout-seconds", type=float, help="Time budget per item")
+    parser.add_argument("--deadline-seconds", type=float,
+                        help="How long items may wait for the caller's rate limit before they are refused")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Items per /query/batch request")
+    parser.add_argument("--api-key", help="Sent as x-api-key; usage is accounted to it if it is one of CALLER_API_KEYS")
+    parser.add_argument("--output", help="Write NDJSON results to this file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.input:
+        with open(args.input) as f:
+            items = read_items(f)
+    else:
+        items = read_items(sys.stdin)
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    seconds, errors, usage = [], 0, {}
+    started = time.perf_counter()
+    try:
+        for offset in range(0, len(items), args.chunk_size):
+            chunk = items[offset:offset + args.chunk_size]
+            for result in stream_batch(args.url, chunk, args.concurrency, args.timeout_seconds, args.api_key,
+                                       args.deadline_seconds):
+                result["index"] += offset
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+                seconds.append(result["seconds"])
+                errors += result["status"] != "ok"
+                if not result.get("duplicate"):
+                    for field, count in result.get("usage", {}).items():
+                        usage[field] = usage.get(field, 0) + count
+    finally:
+        if args.output:
+            output.close()
+
+    print(
+        f"{len(seconds)} items in {time.perf_counter() - started:.1f}s, {errors} errors, "
+        f"p50 {_percentile(seconds, 50):.2f}s, p95 {_percentile(seconds, 95):.2f}s, "
+        + ", ".join(f"{field} {count}" for field, count in usage.items()),
+        file=sys.stderr,
+    )
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+Intent routing for agent turns.
+
+Each turn is classified with cheap phrase rules before any model is called.
+Greetings and questions about the caller's own balances are answered without
+a model; quotes and open knowledge questions go to a fast non-reasoning model;
+transactions and strategy questions keep the reasoning model, with reasoning
+effort set per intent. Latency and estimated cost are reported per intent.
+"""
+import collections
+import json
+import os
+import re
+import threading
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from kadena_common import metrics
+from kadena_common.models import ModelUsage
+
+from config import GPT4_MODEL, MODEL_NAME
+
+# Set MODEL_ROUTING=0 to send every turn to MODEL_NAME and format with GPT4_MODEL, as before
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "1") not in ("0", "false", "False")
+FAST_MODEL = os.getenv("ROUTER_FAST_MODEL", "gpt-4.1-mini")
+
+GREETING = "greeting"
+BALANCE = "balance"
+QUOTE = "quote"
+TRANSACTION = "transaction"
+KNOWLEDGE = "knowledge"
+STRATEGY = "strategy"
+INTENTS = (GREETING, BALANCE, QUOTE, TRANSACTION, KNOWLEDGE, STRATEGY)
+
+# The chat app appends the user's account, guard, chainId and balances to each query
+CONTEXT_MARKER = "User Details:"
+
+_GREETING = re.compile(
+    r"^\W*(hi+|hello|hey+|yo|gm|good (morning|afternoon|evening)|thanks?( you)?|thx|ty|sup|what'?s up)"
+    r"(\s+(there|agent\s*k|k|all|everyone|friend|mate|again|so much))?\W*$",
+    re.IGNORECASE,
+)
+# Requests to act, not questions about the words: "swap 10 KDA for zUSD" but not "what is a swap?",
+# "send 1 KDA to k:..." but not "send me info on chainweb"
+_TRANSACTION = re.compile(
+    # A transaction verb with something to move
+    r"\b(swap|transfer|send|pay|buy|sell|trade|exchange)\s+"
+    r"(\d|(all|some|half|my)\b|[kw]:|[\w.-]+\s+(to|for|into|from|with)\b)"
+    r"|\b(buy|sell)\s+[\w.-]+\W*$"
+    # Asking for one
+    r"|\b(i want to|i'?d like to|i need to|help me|can you|could you|please)\s+"
+    r"(swap|transfer|send(?! me\b)|pay|buy|sell|trade|exchange|mint)\b"
+    # Mints and launches
+    r"|\b(mint|launch|create|deploy)\s+(a |an |my |the |\d+ )?(nft|collection|token)s?\b",
+    re.IGNORECASE,
+)
+_STRATEGY = re.compile(
+    r"\b(strateg\w*|should i|invest\w*|dca|hedge|yield|farm\w*|stak\w*|portfolio|allocat\w*|predict\w*|long[- ]term|risk)\b",
+    re.IGNORECASE,
+)
+# First-person balance questions only: they are answered from the caller's own balances
+_BALANCE = re.compile(
+    r"\bmy ([\w.-]+ )?balances?\b|\bhow (much|many) [\w.-]+ (do|have) i (have|hold|own|got)\b"
+    r"|\bwhat (tokens |coins )?do i (own|hold|have)\W*$|\b(show|list|check)( me)? my (holdings|tokens|wallet)\b",
+    re.IGNORECASE,
+)
+# A k:/w:/r: account or a public key; a message naming one is about that account
+_ACCOUNT = re.compile(r"\b[kwr]:[\w.-]+|\b[0-9a-f]{64}\b", re.IGNORECASE)
+_QUOTE = re.compile(r"\b(price|worth|value|quote|rate|how much is|cost of|convert)\b", re.IGNORECASE)
+
+
+class RoutePlan:
+    """
+    How a turn is served.
+
+    Args:
+        model: Model choosing the tool, or None to answer without a model
+        reasoning_effort: Reasoning effort for reasoning models, or None for the model default
+        format_model: Model turning tool output (analysis text, errors) into the reply
+    """
+
+    def __init__(self, model: Optional[str], reasoning_effort: Optional[str] = None,
+                 format_model: str = GPT4_MODEL):
+        self.model = model
+        self.reasoning_effort = reasoning_effort
+        self.format_model = format_model
+
+    def call_options(self) -> Dict[str, Any]:
+        """Per-call options for the routing model."""
+        if self.reasoning_effort is None:
+            return {}
+        # The pinned openai client predates the reasoning_effort argument
+        return {"extra_body": {"reasoning_effort": self.reasoning_effort}}
+
+
+PLANS: Dict[str, RoutePlan] = {
+    GREETING: RoutePlan(None),
+    BALANCE: RoutePlan(None),
+    QUOTE: RoutePlan(FAST_MODEL, format_model=FAST_MODEL),
+    KNOWLEDGE: RoutePlan(FAST_MODEL, format_model=FAST_MODEL),
+    TRANSACTION: RoutePlan(MODEL_NAME, reasoning_effort="low"),
+    STRATEGY: RoutePlan(MODEL_NAME, reasoning_effort="medium"),
+}
+DEFAULT_PLAN = RoutePlan(MODEL_NAME)
+# For model-free intents that can't be answered directly, e.g. a balance lookup without balances
+FALLBACK_PLAN = RoutePlan(FAST_MODEL, format_model=FAST_MODEL)
+
+
+def split_context(query: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """Separate the user's message from the account context the chat app appends."""
+    message, marker, context = query.partition(CONTEXT_MARKER)
+    if not marker:
+        return query.strip(), None
+    try:
+        return message.strip(), json.loads(context)
+    except ValueError:
+        return message.strip(), None
+
+
+def classify(query: str) -> str:
+    """The intent of a turn, from the user's message only."""
+    message, _ = split_context(query)
+    if _GREETING.match(message):
+        return GREETING
+    if _TRANSACTION.search(message):
+        return TRANSACTION
+    if _STRATEGY.search(message):
+        return STRATEGY
+    if _BALANCE.search(message) and not _ACCOUNT.search(message):
+        return BALANCE
+    if _QUOTE.search(message):
+        return QUOTE
+    return KNOWLEDGE
+
+
+# Personal or account-specific wording; such answers must never be shared between users
+_PERSONAL = re.compile(r"\b(i|me|my|mine|i'?m|i'?ve|our|us)\b", re.IGNORECASE)
+# Words that only make sense with the earlier conversation ("how does it work?")
+_REFERENCE = re.compile(r"\b(it|its|that|this|they|them|those|these|he|she|one)\b", re.IGNORECASE)
+
+
+def cache_key(intent: str, query: str, history: Optional[List[str]]) -> Optional[str]:
+    """
+    The text to look a turn up by in the shared answer cache, or None if its answer mustn't be shared.
+
+    Only general knowledge questions qualify: not personal, not about an
+    account, and not a follow-up that depends on the conversation so far.
+    """
+    if intent != KNOWLEDGE:
+        return None
+    message, _ = split_context(query)
+    if _PERSONAL.search(message) or _ACCOUNT.search(message) or (history and _REFERENCE.search(message)):
+        return None
+    return message
+
+
+def plan_for(intent: str) -> RoutePlan:
+    return PLANS[intent] if MODEL_ROUTING else DEFAULT_PLAN
+
+
+def models() -> List[str]:
+    """Every model a turn may call, for creating their clients at startup."""
+    plans = [*PLANS.values(), FALLBACK_PLAN] if MODEL_ROUTING else [DEFAULT_PLAN]
+    return list(dict.fromkeys(model for plan in plans for model in (plan.model, plan.format_model) if model))
+
+
+GREETING_REPLY = (
+    "Hello! I'm Agent K. I can answer questions about Kadena, check your balances, get token quotes, "
+    "and prepare transfers, swaps and NFT transactions for you to sign. What would you like to do?"
+)
+
+
+def answer_directly(intent: str, query: str) -> Optional[str]:
+    """
+    Answer a turn without a model, if its intent allows it.
+
+    Returns:
+        The reply, or None if the turn needs the agent (e.g. a balance lookup
+        without balances in the account context)
+    """
+    if not MODEL_ROUTING:
+        return None
+    if intent == GREETING:
+        return GREETING_REPLY
+    if intent == BALANCE:
+        message, context = split_context(query)
+        balances = (context or {}).get("balances")
+        if not isinstance(balances, list):
+            return None
+        return _format_balances(message, balances)
+    return None
+
+
+def _format_balances(message: str, balances: List[Dict[str, Any]]) -> str:
+    held = [b for b in balances if isinstance(b, dict) and "symbol" in b and "balance" in b]
+    if not held:
+        return "You don't hold any tokens in this account yet."
+    words = {w.lower() for w in re.findall(r"[\w.-]+", message)}
+    asked = [b for b in held if str(b["symbol"]).lower() in words]
+    lines = [f"- {b['symbol']}: {b['balance']}" for b in (asked or held)]
+    return "Your balance:\n" + "\n".join(lines) if asked else "Your balances:\n" + "\n".join(lines)
+
+
+INTENT_DURATION = metrics.histogram(
+    "kadena_intent_duration_seconds",
+    "Agent turn latency by routed intent",
+    ("intent",),
+)
+INTENT_COST = metrics.counter(
+    "kadena_intent_cost_usd_total",
+    "Estimated model spend by routed intent",
+    ("intent",),
+)
+
+
+class RouteReport:
+    """Per-intent turn counts, latency percentiles over recent turns, tokens and estimated cost."""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._totals: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, intent: str, seconds: float, usage: ModelUsage) -> None:
+        INTENT_DURATION.observe(seconds, intent=intent)
+        INTENT_COST.inc(usage.cost, intent=intent)
+        with self._lock:
+            self._latencies.setdefault(intent, collections.deque(maxlen=self.window)).append(seconds)
+            totals = self._totals.setdefault(intent, {
+                "turns": 0, "answered_without_model": 0, "model_calls": 0,
+                "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0,
+            })
+            totals["turns"] += 1
+            totals["answered_without_model"] += usage.calls == 0
+            totals["model_calls"] += usage.calls
+            totals["prompt_tokens"] += usage.prompt_tokens
+            totals["completion_tokens"] += usage.completion_tokens
+            totals["cost_usd"] += usage.cost
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        with self._lock:
+            for intent, totals in self._totals.items():
+                latencies = sorted(self._latencies[intent])
+                plan = plan_for(intent)
+                report[intent] = {
+                    "model": plan.model,
+                    "reasoning_effort": plan.reasoning_effort,
+                    "format_model": plan.format_model,
+                    **{k: round(v, 6) if isinstance(v, float) else v for k, v in totals.items()},
+                    "avg_cost_usd": round(totals["cost_usd"] / totals["turns"], 6),
+                    "p50_seconds": round(_percentile(latencies, 50), 3),
+                    "p95_seconds": round(_percentile(latencies, 95), 3),
+                }
+        return report
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    index = max(0, -(-len(values) * percent // 100) - 1)
+    return values[int(index)]
+
+
+REPORT = RouteReport()
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+
+import pytest
+
+from kadena_common.admission import AdmissionController
+from kadena_common.quota import MemoryBackend, RateLimit
+
+import batch
+from batch import run_batch
+from turns import TurnGate
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    """Stub agent recording the admission slots in use while each turn runs."""
+    calls = {"count": 0, "in_flight": []}
+    lock = threading.Lock()
+
+    def run(query, history):
+        with lock:
+            calls["count"] += 1
+            calls["in_flight"].append(calls["limiter"].in_flight if "limiter" in calls else None)
+        if query == "fail":
+            raise RuntimeError("boom")
+        return {"response": query.upper(), "history": history + [query]}
+
+    monkeypatch.setattr(batch, "run_kadena_agent_with_context", run)
+    return calls
+
+
+def collect(items, **kwargs):
+    async def run():
+        return [result async for result in run_batch(items, **kwargs)]
+    return sorted(asyncio.run(run()), key=lambda result: result["index"])
+
+
+def make_gate(per_minute=60, burst=10):
+    limiter = AdmissionController().limit("/query")
+    backend = MemoryBackend()
+    return TurnGate(limiter, backend, RateLimit("query", per_minute=per_minute, burst=burst)), backend
+
+
+def test_items_run_once_and_report_per_item(agent):
+    results = collect([{"id": "a", "query": "hi"}, {"query": "hi"}, {"query": "fail"}], concurrency=2)
+    assert agent["count"] == 2
+    assert [r["status"] for r in results] == ["ok", "ok", "error"]
+    assert results[0]["id"] == "a" and results[0]["response"] == "HI"
+    assert results[1]["duplicate"] is True
+    assert results[2]["error"] == "boom"
+
+
+def test_each_item_is_charged_to_the_query_limit(agent):
+    gate, backend = make_gate(per_minute=600, burst=2)
+    agent["limiter"] = gate.limiter
+    results = collect([{"query": f"q{i}"} for i in range(5)] + [{"query": "q0"}],
+                      concurrency=2, gate=gate, caller="ip:a")
+
+    # Items past the burst wait for a token (one every 0.1s) instead of being refused
+    assert agent["count"] == 5
+    assert all(r["status"] == "ok" for r in results)
+    queued = sorted(r["queued_seconds"] for r in results if not r.get("duplicate"))
+    assert queued[:2] == pytest.approx([0, 0], abs=0.05)
+    assert queued[-1] >= 0.25
+    usage = backend.usage("ip:a")["ip:a"]["query"]
+    assert usage["requests"] == 5
+    assert usage["rejected"] == 0
+
+
+def test_items_are_refused_once_the_deadline_passes(agent):
+    gate, backend = make_gate(per_minute=6, burst=2)
+    results = collect([{"query": f"q{i}"} for i in range(4)], concurrency=4, gate=gate, caller="ip:a",
+                      deadline_seconds=1)
+
+    assert agent["count"] == 2
+    refused = [r for r in results if r["status"] == "error"]
+    assert len(refused) == 2
+    assert all(r["status_code"] == 429 and r["retry_after"] > 0 for r in refused)
+    assert backend.usage("ip:a")["ip:a"]["query"]["rejected"] == 2
+
+
+def test_each_turn_holds_an_admission_slot(agent):
+    gate, _ = make_gate()
+    agent["limiter"] = gate.limiter
+    collect([{"query": f"q{i}"} for i in range(4)] + [{"query": "fail"}], concurrency=1, gate=gate, caller="ip:a")
+
+    assert agent["in_flight"] == [1] * 5
+    assert gate.limiter.in_flight == 0
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import time
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+import chat
+import router
+from agent import current_progress
+from chat import ChatServer, QuoteWatcher
+from kadena_common.admission import AdmissionController
+from kadena_common.quota import MemoryBackend, RateLimit
+
+
+class FakeWebSocket:
+    """Scripted client: `say()` queues client messages, `paused` stops it reading."""
+
+    def __init__(self):
+        self.scope = {"type": "websocket", "headers": [], "client": ("10.0.0.1", 1234)}
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.received = []
+        self.closed = None
+        self.paused = False
+
+    async def accept(self):
+        pass
+
+    async def receive_text(self):
+        message = await self.incoming.get()
+        if message is None:
+            raise WebSocketDisconnect(1000)
+        return json.dumps(message)
+
+    async def send_text(self, text):
+        while self.paused:
+            await asyncio.sleep(1)
+        self.received.append(json.loads(text))
+
+    async def close(self, code=1000, reason=None):
+        self.closed = (code, reason)
+
+    def say(self, *messages):
+        for message in messages:
+            self.incoming.put_nowait(message)
+
+    def of_type(self, kind):
+        return [event for event in self.received if event["type"] == kind]
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    """Stub agent emitting `progress_events` progress events per turn, after `delay` seconds."""
+    calls = {"queries": [], "progress_events": 1, "delay": 0.0}
+
+    def run(query, history):
+        calls["queries"].append(query)
+        time.sleep(calls["delay"])
+        for step in range(calls["progress_events"]):
+            current_progress.get()({"type": "progress", "stage": "route", "step": step})
+        return {"response": f"answer {len(history) // 2}", "intermediate_steps": [],
+                "history": history + [query, "answer"]}
+
+    monkeypatch.setattr(chat, "run_kadena_agent_with_context", run)
+    return calls
+
+
+def make_server():
+    return ChatServer(None, MemoryBackend(), RateLimit("query", per_minute=600, burst=100))
+
+
+def serve(websocket):
+    """Serve the connection until it closes."""
+    async def run():
+        server = make_server()
+        await asyncio.wait_for(server.serve(websocket), 5)
+        return server
+
+    return asyncio.run(run())
+
+
+def test_session_keeps_history_and_context(agent):
+    websocket = FakeWebSocket()
+
+    async def client():
+        websocket.say({"type": "context", "account": "k:abc", "chainId": "2"},
+                      {"type": "query", "id": 1, "query": "balance?"})
+        while not websocket.of_type("result"):
+            await asyncio.sleep(0.01)
+        websocket.say({"type": "query", "id": 2, "query": "and now?"}, {"type": "ping"})
+        while len(websocket.of_type("result")) < 2:
+            await asyncio.sleep(0.01)
+        websocket.say(None)
+
+    async def run():
+        server = make_server()
+        await asyncio.wait_for(asyncio.gather(server.serve(websocket), client()), 5)
+        return server
+
+    server = asyncio.run(run())
+    assert websocket.received[0]["type"] == "ready"
+    assert [event["response"] for event in websocket.of_type("result")] == ["answer 0", "answer 1"]
+    assert websocket.of_type("progress")[0] == {"type": "progress", "stage": "route", "step": 0, "id": 1}
+    # Every turn carries the connection's account context for the agent
+    context = f'{router.CONTEXT_MARKER} {{"account": "k:abc", "chainId": "2"}}'
+    assert agent["queries"] == [f"balance?\n{context}", f"and now?\n{context}"]
+    assert websocket.closed is None and server.connections == 0
+
+
+def test_second_query_while_busy_is_refused(agent):
+    agent["delay"] = 0.2
+    websocket = FakeWebSocket()
+    websocket.say({"type": "query", "id": 1, "query": "one"}, {"type": "query", "id": 2, "query": "two"},
+                  {"type": "bogus"}, "not an object")
+
+    async def run():
+        task = asyncio.create_task(make_server().serve(websocket))
+        while not websocket.of_type("result"):
+            await asyncio.sleep(0.01)
+        websocket.say(None)
+        await asyncio.wait_for(task, 5)
+
+    asyncio.run(run())
+    errors = websocket.of_type("error")
+    assert [(e.get("id"), e["status"]) for e in errors] == [(2, 409), (None, 400), (None, 400)]
+    assert agent["queries"] == ["one"]
+
+
+def test_idle_connections_are_closed(agent, monkeypatch):
+    monkeypatch.setattr(chat, "CHAT_IDLE_TIMEOUT", 0.05)
+    websocket = FakeWebSocket()
+    serve(websocket)
+    assert websocket.closed == (chat.NORMAL_CLOSURE, "Idle timeout")
+    assert [event["type"] for event in websocket.received] == ["ready"]
+
+
+def test_running_turn_keeps_the_connection_open(agent, monkeypatch):
+    monkeypatch.setattr(chat, "CHAT_IDLE_TIMEOUT", 0.05)
+    agent["delay"] = 0.3
+    websocket = FakeWebSocket()
+    websocket.say({"type": "query", "id": 1, "query": "slow"})
+    serve(websocket)
+    assert websocket.of_type("result")
+    assert websocket.closed == (chat.NORMAL_CLOSURE, "Idle timeout")
+
+
+def test_client_that_stops_reading_is_disconnected(agent, monkeypatch):
+    monkeypatch.setattr(chat, "CHAT_SEND_QUEUE_SIZE", 2)
+    monkeypatch.setattr(chat, "CHAT_SEND_TIMEOUT", 0.05)
+    agent["progress_events"] = 10
+    websocket = FakeWebSocket()
+    websocket.paused = True
+    websocket.say({"type": "query", "id": 1, "query": "chatty"})
+    started = time.perf_counter()
+    server = serve(websocket)
+    # The turn waited on the full queue instead of buffering, then the client was dropped
+    assert websocket.closed == (chat.POLICY_VIOLATION, "Client is not reading messages")
+    assert time.perf_counter() - started < 2
+    assert server.connections == 0
+
+
+class FakeSession:
+    def __init__(self):
+        self.pushed = []
+
+    def push(self, event):
+        self.pushed.append(event)
+
+
+def test_sessions_watching_a_quote_share_one_refresh(monkeypatch):
+    monkeypatch.setattr(chat, "CHAT_QUOTE_REFRESH_SECONDS", 0.02)
+    calls = []
+
+    async def aquote(body):
+        calls.append(body)
+        return {"amountOut": str(len(calls))}
+
+    monkeypatch.setattr(chat.KADENA, "aquote", aquote)
+    body = {"tokenInAddress": "coin", "tokenOutAddress": "n_b.zUSD", "amountIn": "10", "chainId": "2"}
+
+    async def run():
+        watcher = QuoteWatcher()
+        first, second = FakeSession(), FakeSession()
+        key = watcher.watch(first, body)
+        assert watcher.watch(second, dict(reversed(list(body.items())))) == key
+        await asyncio.sleep(0.09)
+        watcher.unwatch(first, key)
+        watcher.unwatch(second, key)
+        return watcher, first, second
+
+    watcher, first, second = asyncio.run(run())
+    # One upstream call per refresh, pushed to both sessions
+    assert 2 <= len(calls) <= 5
+    assert first.pushed == second.pushed and len(first.pushed) == len(calls)
+    assert watcher.tasks == {} and watcher.watches == {}
+
+
+def test_quote_watches_expire(monkeypatch):
+    monkeypatch.setattr(chat, "CHAT_QUOTE_REFRESH_SECONDS", 0.02)
+    monkeypatch.setattr(chat, "CHAT_QUOTE_WATCH_SECONDS", 0.05)
+
+    async def aquote(body):
+        return {"amountOut": "1"}
+
+    monkeypatch.setattr(chat.KADENA, "aquote", aquote)
+
+    async def run():
+        watcher = QuoteWatcher()
+        session = FakeSession()
+        key = watcher.watch(session, {"tokenOutAddress": "n_b.zUSD"})
+        await asyncio.sleep(0.15)
+        # Unwatching after the watch ended is harmless
+        watcher.unwatch(session, key)
+        return watcher, session
+
+    watcher, session = asyncio.run(run())
+    assert len(session.pushed) == 1
+    assert watcher.tasks == {} and watcher.watches == {}
+
+
+def test_cancelled_turn_keeps_its_slot_until_the_agent_returns(agent):
+    agent["delay"] = 0.3
+    websocket = FakeWebSocket()
+    websocket.say({"type": "query", "id": 1, "query": "slow"})
+
+    async def run():
+        server = ChatServer(AdmissionController().limit("/query"), MemoryBackend(),
+                            RateLimit("query", per_minute=600, burst=100))
+        limiter = server.gate.limiter
+        task = asyncio.create_task(server.serve(websocket))
+        while limiter.in_flight == 0:
+            await asyncio.sleep(0.01)
+        websocket.say(None)
+        await asyncio.wait_for(task, 5)
+        # The connection is gone but the agent thread is still running
+        held = limiter.in_flight
+        while server.draining:
+            await asyncio.sleep(0.01)
+        return held, limiter.in_flight
+
+    assert asyncio.run(run()) == (1, 0)
+    assert not websocket.of_type("result")
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+import router
+from router import BALANCE, GREETING, KNOWLEDGE, QUOTE, STRATEGY, TRANSACTION, answer_directly, cache_key, classify
+
+BALANCES = [{"symbol": "KDA", "balance": 12.5}, {"symbol": "zUSD", "balance": 3}]
+
+
+def with_context(message, **context):
+    return f"{message}\n{router.CONTEXT_MARKER} {json.dumps(context)}"
+
+
+@pytest.mark.parametrize("message,intent", [
+    ("hi", GREETING),
+    ("Thanks so much!", GREETING),
+    ("swap 10 KDA for zUSD", TRANSACTION),
+    ("Swap KDA for arkade.token", TRANSACTION),
+    ("Transfer 1 KDA to my friend", TRANSACTION),
+    ("send 5 KDA to k:abc123", TRANSACTION),
+    ("buy ARKD", TRANSACTION),
+    ("can you send some KDA to bob", TRANSACTION),
+    ("Launch an NFT in my collection", TRANSACTION),
+    ("Create an NFT collection called Bench", TRANSACTION),
+    ("should I stake my KDA?", STRATEGY),
+    ("what's my KDA balance", BALANCE),
+    ("How much KDA do I have?", BALANCE),
+    ("what do I own?", BALANCE),
+    ("price of KDA in zUSD", QUOTE),
+    ("Get me a quote for 10 KDA to arkade.token", QUOTE),
+    ("what is Chainweb?", KNOWLEDGE),
+])
+def test_classify(message, intent):
+    assert classify(message) == intent
+
+
+@pytest.mark.parametrize("message,intent", [
+    # Naming the words is not asking for the action
+    ("Can you explain what a swap is?", KNOWLEDGE),
+    ("send me info on chainweb", KNOWLEDGE),
+    ("how does minting work?", KNOWLEDGE),
+    # Someone else's balance, or balances in general, need the model
+    ("what is the balance of k:abc", KNOWLEDGE),
+    ("what is my balance compared to k:abc", KNOWLEDGE),
+    ("How does the coin contract track balances?", KNOWLEDGE),
+    ("what do I have to do to create a wallet?", KNOWLEDGE),
+])
+def test_classify_misroutes(message, intent):
+    assert classify(message) == intent
+
+
+def test_classify_ignores_appended_context():
+    assert classify(with_context("what is Chainweb?", balances=BALANCES, account="k:abc")) == KNOWLEDGE
+
+
+def test_balance_answered_from_context(monkeypatch):
+    monkeypatch.setattr(router, "MODEL_ROUTING", True)
+    query = with_context("what's my zUSD balance", balances=BALANCES)
+    assert answer_directly(classify(query), query) == "Your balance:\n- zUSD: 3"
+    query = with_context("how much do i have", balances=BALANCES)
+    assert answer_directly(BALANCE, query) == "Your balances:\n- KDA: 12.5\n- zUSD: 3"
+
+
+def test_balance_without_context_goes_to_model(monkeypatch):
+    monkeypatch.setattr(router, "MODEL_ROUTING", True)
+    assert answer_directly(BALANCE, "what's my balance") is None
+
+
+def test_other_accounts_are_never_answered_from_context(monkeypatch):
+    monkeypatch.setattr(router, "MODEL_ROUTING", True)
+    query = with_context("what is the balance of k:abc", balances=BALANCES)
+    intent = classify(query)
+    assert intent != BALANCE
+    assert answer_directly(intent, query) is None
+
+
+@pytest.mark.parametrize("message,history,shared", [
+    ("what is Chainweb?", [], True),
+    ("what is my balance?", [], False),
+    ("what is the balance of k:abc", [], False),
+    ("how does it work?", ["what is Chainweb?"], False),
+    ("how does it work?", [], True),
+])
+def test_cache_key_only_for_general_questions(message, history, shared):
+    key = cache_key(classify(message), message, history)
+    assert (key is not None) == shared
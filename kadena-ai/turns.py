@@ -0,0 +1,92 @@
+"""
+Admission for agent turns that aren't HTTP requests of their own.
+
+WebSocket chat turns and batch items run inside a longer-lived connection or
+request, so the /query middleware never sees them. `TurnGate` gives each
+turn what POST /query gets: one token from the caller's "query" rate limit,
+a slot from the /query admission limiter for as long as the turn runs, and
+its usage recorded under the caller's "query" bucket. Batch items wait for
+their token and slot instead of being refused, which paces a batch to the
+caller's limits.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from kadena_common.admission import Rejected, RouteLimiter
+from kadena_common.quota import RATE_LIMITED, RATE_LIMIT_ENABLED, Backend, RateLimit, Usage
+
+logger = logging.getLogger(__name__)
+
+
+class TurnGate:
+    """
+    Rate limit, admission and usage accounting per agent turn.
+
+    Args:
+        limiter: Admission limiter of /query, or None without admission control
+        backend: Rate limit and usage backend
+        limit: Rate limit charged per turn
+    """
+
+    def __init__(self, limiter: Optional[RouteLimiter], backend: Backend, limit: RateLimit):
+        self.limiter = limiter
+        self.backend = backend
+        self.limit = limit
+
+    async def _call(self, fn, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def admit(self, caller: str, wait_until: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Charge a turn to the caller's rate limit and wait for an admission slot.
+
+        Args:
+            caller: Caller id the turn is charged to
+            wait_until: time.monotonic() up to which a refused turn waits out
+                its retry_after and tries again, so it is paced to the caller's
+                limits; None refuses at once, as POST /query does
+
+        Returns:
+            None if admitted (call `finish` when the turn ends), else the
+            refusal: status, retry_after and detail
+        """
+        if RATE_LIMIT_ENABLED:
+            while True:
+                wait = await self._call(self.backend.take, f"{self.limit.name}:{caller}", self.limit)
+                if wait <= 0:
+                    break
+                if not _can_wait(wait, wait_until):
+                    RATE_LIMITED.inc(bucket=self.limit.name)
+                    await self._call(self.backend.add_usage, caller, self.limit.name, {"rejected": 1})
+                    return {"status": 429, "retry_after": wait,
+                            "detail": f"Rate limit exceeded for {self.limit.name}. Please retry later."}
+                await asyncio.sleep(wait)
+        if self.limiter is not None:
+            while True:
+                try:
+                    await self.limiter.acquire()
+                    break
+                except Rejected as e:
+                    if not _can_wait(e.retry_after, wait_until):
+                        return {"status": e.status_code, "retry_after": e.retry_after,
+                                "detail": f"Server is busy ({e.reason}). Please retry later."}
+                    await asyncio.sleep(e.retry_after)
+        return None
+
+    async def finish(self, caller: str, started: float, failed: bool, usage: Usage) -> None:
+        """Release an admitted turn's slot and record its usage; `started` is its time.perf_counter()."""
+        if self.limiter is not None:
+            self.limiter.release(time.perf_counter() - started, failed=failed)
+        usage.add("requests")
+        try:
+            await self._call(self.backend.add_usage, caller, self.limit.name, usage.counts)
+        except Exception as e:
+            logger.warning(f"Failed to record usage for {caller}: {str(e)}")
+
+
+def _can_wait(seconds: float, wait_until: Optional[float]) -> bool:
+    return wait_until is not None and time.monotonic() + seconds <= wait_until
@@ -1,21 +1,33 @@
 import os
+import sys
+import asyncio
 import json
 import logging
+from functools import partial
 from typing import Dict, List, Any, Optional
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
+# Shared modules (kadena_common) live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kadena_common.admission import EXPENSIVE, INTERACTIVE, install_admission
+from kadena_common.idempotency import install_idempotency
+from kadena_common.health import HealthCheck, HealthMonitor, install_health, openai_probe
+from kadena_common.logs import install_request_logging, setup_logging
+from kadena_common.middleware import install_metrics
+from kadena_common.profiling import install_profiling
+from kadena_common.quota import RateLimit, install_quotas
+from kadena_common.warmup import install_warmup
+from backtest import StrategyParams, backtest, load_prices, parse_strategy
+from coder import CODE_MODEL, CodePatch, GeneratedAgent, code, patch_code
+from prompt import PROMPT_MODEL, PromptEvaluation, improve_prompt
+from structured import StructuredOutputError, openai_tool
+
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('kadena_trader.log')
-    ]
-)
+setup_logging("kadena-trader", log_file=os.getenv("LOG_FILE", "kadena_trader.log"))
 logger = logging.getLogger(__name__)
 
 # Load environment variables
@@ -28,6 +40,17 @@ app = FastAPI(
     version="1.0.0",
 )
 
+# Admission control, per-caller quotas and idempotency go first so they run innermost, behind
+# CORS, metrics and logging; each wraps the one before it, so rate-limited callers never take a
+# queue slot and replayed retries use neither
+admission = install_admission(app, {"/prompt": INTERACTIVE, "/code": EXPENSIVE, "/backtest": EXPENSIVE})
+quota_backend = install_quotas(app, {
+    "/prompt": RateLimit("prompt", per_minute=10, burst=5),
+    "/code": RateLimit("code", per_minute=3, burst=3),
+    "/backtest": RateLimit("backtest", per_minute=10, burst=5),
+})
+idempotency_store = install_idempotency(app, ["/code"])
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -37,6 +60,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+install_metrics(app)
+install_profiling(app)
+install_request_logging(app)
+
+health_monitor = HealthMonitor([HealthCheck("openai", openai_probe(os.getenv("OPENAI_API_KEY")))])
+install_health(app, health_monitor)
+install_warmup(
+    app,
+    models=[PROMPT_MODEL, CODE_MODEL],
+    # Tool definitions of the structured outputs; the first conversion is slow
+    hooks=[partial(openai_tool, schema) for schema in (PromptEvaluation, GeneratedAgent, CodePatch)],
+)
+
 class PromptRequest(BaseModel):
     prompt: str
     history: Optional[List[str]] = Field(default_factory=list)
@@ -44,6 +80,17 @@ class PromptRequest(BaseModel):
 class CodeRequest(BaseModel):
     prompt: str
     history: Optional[List[str]] = Field(default_factory=list)
+    previous_code: Optional[str] = Field(None, description="Code from an earlier /code call; enables patch mode")
+    previous_interval: Optional[str] = Field(None, description="Interval from that earlier call")
+
+class BacktestRequest(BaseModel):
+    prices: str = Field(..., description="Price fixture (CSV or Parquet) in BACKTEST_DATA_DIR")
+    code: Optional[str] = Field(None, description="Generated agent code to parse into strategy parameters")
+    interval: Optional[str] = Field(None, description="Schedule expression of the generated agent")
+    strategies: Optional[List[Dict[str, Any]]] = Field(None, description="Explicit strategy parameters")
+    bar_seconds: int = Field(60, ge=1, description="Seconds per bar of the price fixture")
+    liquidity: Optional[float] = None
+    fee: Optional[float] = None
 
 @app.get("/")
 async def health_check():
@@ -61,13 +108,16 @@ async def process_prompt(request: PromptRequest):
     Returns:
         Dict containing the evaluation results and improvement suggestions
     """
-    logger.info(f"Processing prompt request: {request.prompt[:100]}...")
+    logger.info(f"Processing prompt request ({len(request.prompt)} chars)")
     
     try:
-        from prompt import improve_prompt
-        result = improve_prompt(prompt=request.prompt, history=request.history)
+        # Model calls block; run them off the event loop so other requests keep flowing
+        result = await asyncio.to_thread(improve_prompt, prompt=request.prompt, history=request.history)
         logger.info("Prompt processing completed successfully")
         return result
+    except StructuredOutputError as e:
+        logger.error(f"Prompt evaluation returned invalid output: {str(e)}")
+        raise HTTPException(status_code=502, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing prompt: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -78,22 +128,61 @@ async def generate_code(request: CodeRequest):
     Generate JavaScript code for a trading agent based on the provided prompt.
     
     Args:
-        request: CodeRequest containing the prompt and optional history
+        request: CodeRequest containing the prompt and optional history. When previous_code
+            and previous_interval are given, the prompt is treated as a change to that code.
         
     Returns:
         Dict containing the generated code and execution interval
     """
-    logger.info(f"Generating code for prompt: {request.prompt[:100]}...")
+    logger.info(f"Generating code for prompt ({len(request.prompt)} chars)")
     
     try:
-        from coder import code
-        result = code(prompt=request.prompt)
+        if request.previous_code and request.previous_interval:
+            result = await asyncio.to_thread(
+                patch_code,
+                prompt=request.prompt,
+                previous_code=request.previous_code,
+                previous_interval=request.previous_interval
+            )
+        else:
+            result = await asyncio.to_thread(code, prompt=request.prompt)
         logger.info("Code generation completed successfully")
         return result
     except Exception as e:
         logger.error(f"Error generating code: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/backtest", summary="Backtest a generated trading agent")
+async def run_backtest(request: BacktestRequest):
+    """
+    Replay a local price fixture against a generated agent's strategy.
+
+    Args:
+        request: BacktestRequest with either generated code and interval, or explicit strategies
+
+    Returns:
+        Dict containing per-strategy PnL, drawdown and trade counts
+    """
+    data_dir = os.path.abspath(os.getenv("BACKTEST_DATA_DIR", "data"))
+    path = os.path.abspath(os.path.join(data_dir, request.prices))
+    if not path.startswith(data_dir + os.sep) or not os.path.isfile(path):
+        raise HTTPException(status_code=400, detail=f"Unknown price fixture: {request.prices}")
+
+    overrides = {k: v for k, v in {"liquidity": request.liquidity, "fee": request.fee}.items() if v is not None}
+    try:
+        if request.strategies:
+            strategies = [StrategyParams(**{**s, **overrides}) for s in request.strategies]
+        elif request.code and request.interval:
+            strategies = [parse_strategy(request.code, request.interval, bar_seconds=request.bar_seconds, **overrides)]
+        else:
+            raise ValueError("Provide either strategies, or code and interval")
+        prices = await asyncio.to_thread(load_prices, path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    results = await asyncio.to_thread(backtest, prices, strategies)
+    return {"bars": len(prices), "results": results}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -0,0 +1,502 @@
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from scheduler import RateSchedule, parse_schedule
+
+# Kaddex/EchoDEX swap fee
+DEFAULT_FEE = 0.003
+
+# Strategies simulated together, and cells (strategies x bars) per block; a block of
+# float64 working arrays should fit in CPU cache
+CHUNK_STRATEGIES = 64
+BLOCK_CELLS = 65_536
+
+PRICE_COLUMNS = ("close", "price")
+
+SWAP_CALL_PATTERN = re.compile(r"\bswap\s*\(\s*\{(?P<body>[^{}]*)\}\s*\)", re.DOTALL)
+QUOTE_CALL_PATTERN = re.compile(
+    r"\b(?:(?:const|let|var)\s+)?(?P<name>[A-Za-z_$][\w$]*)\s*=\s*(?:await\s+)?quote\s*\(\s*\{(?P<body>[^{}]*)\}\s*\)",
+    re.DOTALL,
+)
+SWAP_PARAM_PATTERN = re.compile(
+    r"(?P<key>tokenInAddress|tokenOutAddress|amountIn|amountOut)\s*:\s*"
+    r"(?:'(?P<single>[^']*)'|\"(?P<double>[^\"]*)\"|(?P<number>\d+(?:\.\d+)?))"
+)
+# Comments and string literals, blanked out before matching braces and parentheses
+COMMENT_OR_STRING_PATTERN = re.compile(
+    r"//[^\n]*|/\*.*?\*/|'(?:\\.|[^'\\\n])*'|\"(?:\\.|[^\"\\\n])*\"|`(?:\\.|[^`\\])*`", re.DOTALL
+)
+STATEMENT_PATTERN = re.compile(r"(?P<keyword>if|else|for|while|do)\b")
+COMPARISON_PATTERN = re.compile(r"^(?P<left>[^<>=!]+?)\s*(?P<op><=|>=|<|>)\s*(?P<right>[^<>=!]+)$")
+NUMBER_PATTERN = re.compile(r"^\d+(?:\.\d+)?$")
+# A quote's amount, as read in a condition: q.amountOut, parseFloat(q.amountOut), Number(q.amountIn), +q.amountOut
+QUOTE_AMOUNT_PATTERN = re.compile(
+    r"^(?:\+\s*)?(?:(?:parseFloat|Number)\s*\(\s*)?(?P<name>[A-Za-z_$][\w$]*)\.(?P<field>amountIn|amountOut)\s*\)?$"
+)
+# An existence check such as `if (q && ...)`
+TRUTHY_PATTERN = re.compile(r"^[A-Za-z_$][\w$.]*$")
+MIRRORED = {"<": ">", "<=": ">=", ">": "<", ">=": "<="}
+NEGATED = {"<": ">=", "<=": ">", ">": "<=", ">=": "<"}
+
+
+class StrategyParams(BaseModel):
+    """
+    Parameters of a generated agent, as simulated by the backtester.
+
+    Prices are the price of the traded token in units of the quote token
+    (KDA unless stated otherwise). On every scheduled bar the agent buys
+    `buy_amount` quote tokens worth when the price is within
+    [`buy_above`, `buy_below`], and sells `sell_amount` traded tokens when it
+    is within [`sell_above`, `sell_below`]. A missing bound is open; a leg
+    with no bounds runs unconditionally (e.g. DCA).
+    """
+    name: str = "strategy"
+    every: int = Field(1, ge=1, description="Bars between scheduled runs")
+    buy_amount: float = Field(0.0, ge=0)
+    buy_below: Optional[float] = None
+    buy_above: Optional[float] = None
+    sell_amount: float = Field(0.0, ge=0)
+    sell_above: Optional[float] = None
+    sell_below: Optional[float] = None
+    fee: float = Field(DEFAULT_FEE, ge=0, lt=1)
+    liquidity: float = Field(1_000_000.0, gt=0, description="Pool reserve of the traded token")
+
+
+def load_prices(path: str, column: Optional[str] = None) -> np.ndarray:
+    """
+    Load a price series from a local CSV or Parquet fixture.
+
+    Args:
+        path: File path; `.parquet` files need pandas with a parquet engine installed
+        column: Price column name (defaults to the first of `close`, `price`)
+
+    Returns:
+        1-D float64 array of prices, oldest first
+    """
+    if path.endswith(".parquet"):
+        try:
+            import pandas as pd
+        except ImportError:
+            raise ImportError("Reading Parquet fixtures requires pandas and pyarrow")
+        frame = pd.read_parquet(path)
+        column = column or next((c for c in PRICE_COLUMNS if c in frame.columns), None)
+        if column is None:
+            raise ValueError(f"No price column found in {path}; expected one of {PRICE_COLUMNS}")
+        return frame[column].to_numpy(dtype=np.float64)
+
+    with open(path) as f:
+        header = [name.strip().lower() for name in f.readline().split(",")]
+    column = (column or next((c for c in PRICE_COLUMNS if c in header), "")).lower()
+    if column not in header:
+        raise ValueError(f"No price column found in {path}; expected one of {PRICE_COLUMNS}")
+    return np.loadtxt(path, delimiter=",", skiprows=1, usecols=header.index(column), dtype=np.float64, ndmin=1)
+
+
+def interval_to_bars(interval: str, bar_seconds: int = 60) -> int:
+    """Convert an EventBridge schedule to a number of bars between runs (cron is approximated by its next gap)."""
+    if bar_seconds < 1:
+        raise ValueError("bar_seconds must be at least 1")
+    schedule = parse_schedule(interval)
+    if isinstance(schedule, RateSchedule):
+        seconds = schedule.period.total_seconds()
+    else:
+        first = schedule.next_after(datetime(2024, 1, 1, tzinfo=timezone.utc))
+        seconds = (schedule.next_after(first) - first).total_seconds()
+    return max(1, int(seconds // bar_seconds))
+
+
+class _Block(NamedTuple):
+    """A span of code run only under a condition (`negated` for else branches), or in a loop."""
+    start: int
+    end: int
+    condition: Optional[str]
+    negated: bool = False
+    loop: bool = False
+
+
+def _mask(code: str) -> str:
+    """`code` with comments and string contents blanked out, keeping every position."""
+    def blank(match: re.Match) -> str:
+        text = match.group()
+        if text[0] in "'\"`":
+            return text[0] + " " * (len(text) - 2) + text[-1]
+        return re.sub(r"[^\n]", " ", text)
+    return COMMENT_OR_STRING_PATTERN.sub(blank, code)
+
+
+def _skip_space(masked: str, index: int) -> int:
+    while index < len(masked) and masked[index].isspace():
+        index += 1
+    return index
+
+
+def _closing(masked: str, start: int) -> int:
+    """Index just past the bracket closing the one at `start`."""
+    depth = 0
+    for index in range(start, len(masked)):
+        if masked[index] in "({[":
+            depth += 1
+        elif masked[index] in ")}]":
+            depth -= 1
+            if depth == 0:
+                return index + 1
+    raise ValueError("Unbalanced brackets in the generated code")
+
+
+def _scan(masked: str, start: int, end: int, blocks: List[_Block]) -> None:
+    """Record the conditional and loop bodies of the statements in [start, end)."""
+    index = _skip_space(masked, start)
+    while index < end:
+        index = _skip_space(masked, max(_statement(masked, index, blocks), index + 1))
+
+
+def _statement(masked: str, start: int, blocks: List[_Block]) -> int:
+    """Record the conditional and loop bodies in the statement at `start`; returns its end."""
+    if masked[start] == "{":
+        end = _closing(masked, start)
+        _scan(masked, start + 1, end - 1, blocks)
+        return end
+
+    keyword = STATEMENT_PATTERN.match(masked, start)
+    if keyword and keyword.group("keyword") == "do":
+        body_end = _statement(masked, _skip_space(masked, keyword.end()), blocks)
+        blocks.append(_Block(keyword.end(), body_end, None, loop=True))
+        return _statement(masked, _skip_space(masked, body_end), blocks)
+    if keyword and keyword.group("keyword") in ("if", "for", "while"):
+        header = _skip_space(masked, keyword.end())
+        if masked[header:header + 1] == "(":
+            header_end = _closing(masked, header)
+            body_start = _skip_space(masked, header_end)
+            if body_start >= len(masked) or masked[body_start] == ";":
+                return body_start + 1
+            body_end = _statement(masked, body_start, blocks)
+            if keyword.group("keyword") != "if":
+                blocks.append(_Block(body_start, body_end, None, loop=True))
+                return body_end
+            condition = masked[header + 1:header_end - 1]
+            blocks.append(_Block(body_start, body_end, condition))
+            after = _skip_space(masked, body_end)
+            otherwise = STATEMENT_PATTERN.match(masked, after)
+            if otherwise and otherwise.group("keyword") == "else":
+                else_start = _skip_space(masked, otherwise.end())
+                else_end = _statement(masked, else_start, blocks)
+                blocks.append(_Block(else_start, else_end, condition, negated=True))
+                return else_end
+            return body_end
+
+    # Any other statement runs to a `;`, a line break that ends it, or the end of the enclosing block;
+    # blocks inside it (function and try bodies, callbacks) are scanned too
+    depth = 0
+    index = start
+    while index < len(masked):
+        char = masked[index]
+        if char == "{":
+            end = _closing(masked, index)
+            _scan(masked, index + 1, end - 1, blocks)
+            index = end
+            continue
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+            if depth < 0:
+                return index
+        elif char == "}":
+            return index
+        elif char == ";" and depth == 0:
+            return index + 1
+        elif char == "\n" and depth == 0 and masked[start:index].rstrip()[-1:] not in ("", "=", "+", "-", "*", "/",
+                                                                                          ",", "(", "&", "|", "?", ":"):
+            return index
+        index += 1
+    return index
+
+
+def _split_top_level(condition: str, operator: str) -> List[str]:
+    """Split `condition` on `operator` outside parentheses."""
+    parts, depth, last = [], 0, 0
+    for index, char in enumerate(condition):
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif depth == 0 and condition.startswith(operator, index):
+            parts.append(condition[last:index])
+            last = index + len(operator)
+    return parts + [condition[last:]]
+
+
+def _strip_parentheses(term: str) -> str:
+    term = term.strip()
+    while term.startswith("(") and _closing(term, 0) == len(term):
+        term = term[1:-1].strip()
+    return term
+
+
+def _price_bound(quote: Dict[str, str], field: str, op: str, value: float,
+                 traded: str, quote_token: str) -> Tuple[str, float]:
+    """
+    Turn `<quote>.<field> <op> <value>` into a bound `price <op> <threshold>`.
+
+    Quote amounts are converted at the quoted price, ignoring the fee and price
+    impact: A quote tokens buy A / price traded tokens, and A traded tokens
+    sell for A * price quote tokens.
+    """
+    if {quote.get("tokenInAddress"), quote.get("tokenOutAddress")} != {quote_token, traded}:
+        raise ValueError(f"The quote() in a swap condition must price {traded} in {quote_token}")
+    given = "amountIn" if "amountIn" in quote else "amountOut" if "amountOut" in quote else None
+    if given is None or given == field:
+        raise ValueError(f"The quote() in a swap condition needs a literal amount other than {field}")
+    amount = _amount(quote[given])
+    if amount <= 0:
+        raise ValueError("The quote() in a swap condition needs a positive amount")
+    # Paying quote tokens for a given output, or selling traded tokens, grows with the price
+    if (quote["tokenInAddress"] == quote_token) == (given == "amountOut"):
+        return op, value / amount
+    if value <= 0:
+        raise ValueError(f"Can't backtest {field} {op} {value:g}: the threshold must be positive")
+    return MIRRORED[op], amount / value
+
+
+def _bounds(condition: str, negated: bool, quotes: Dict[str, Dict[str, str]],
+            traded: str, quote_token: str) -> List[Tuple[str, float]]:
+    """Price bounds a condition (or, for an else branch, its negation) puts on the swap it guards."""
+    terms = [_strip_parentheses(term) for term in _split_top_level(condition, "&&")]
+    # Existence checks such as `q && ...` always hold in a backtest
+    terms = [term for term in terms if not TRUTHY_PATTERN.match(term)]
+    if negated and len(terms) != 1:
+        raise ValueError(f"Can't backtest a swap in the else branch of `{condition.strip()}`")
+    bounds = []
+    for term in terms:
+        if len(_split_top_level(term, "||")) > 1:
+            raise ValueError(f"Can't backtest a swap guarded by `{term}`: use a single price comparison")
+        comparison = COMPARISON_PATTERN.match(term)
+        if not comparison:
+            raise ValueError(f"Can't backtest a swap guarded by `{term}`: only quote amounts compared "
+                             "with a number are supported")
+        left, op, right = (comparison.group(g).strip() for g in ("left", "op", "right"))
+        if negated:
+            op = NEGATED[op]
+        if NUMBER_PATTERN.match(left) and not NUMBER_PATTERN.match(right):
+            left, op, right = right, MIRRORED[op], left
+        amount = QUOTE_AMOUNT_PATTERN.match(left)
+        if not NUMBER_PATTERN.match(right) or not amount or amount.group("name") not in quotes:
+            raise ValueError(f"Can't backtest a swap guarded by `{term}`: only quote amounts compared "
+                             "with a number are supported")
+        bounds.append(_price_bound(quotes[amount.group("name")], amount.group("field"), op, float(right),
+                                   traded, quote_token))
+    return bounds
+
+
+def _literal_params(body: str) -> Dict[str, str]:
+    params = {}
+    for match in SWAP_PARAM_PATTERN.finditer(body):
+        params[match.group("key")] = next(
+            v for v in (match.group("single"), match.group("double"), match.group("number")) if v is not None
+        )
+    return params
+
+
+def _amount(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"Amount {value!r} is not a number")
+
+
+def parse_strategy(code: str, interval: str, quote_token: str = "coin",
+                   bar_seconds: int = 60, **overrides: Any) -> StrategyParams:
+    """
+    Extract backtest parameters from generated agent code.
+
+    Swaps paying `quote_token` are buys and swaps receiving it are sells. Each
+    swap takes its price bounds from the `if` (or `else`) blocks enclosing it:
+    comparisons of a `quote()` result's amountIn/amountOut with a number are
+    converted to the traded token's price (see `_price_bound`), keeping their
+    direction; `&&` adds bounds. Strict and non-strict comparisons are treated
+    alike.
+
+    Raises:
+        ValueError: If no swap is found, or the code can't be mapped faithfully
+            (e.g. a swap without literal tokens and amountIn, in a loop, or
+            guarded by any other condition)
+    """
+    params: Dict[str, Any] = {"every": interval_to_bars(interval, bar_seconds)}
+    code = code or ""
+    masked = _mask(code)
+    blocks: List[_Block] = []
+    _scan(masked, 0, len(masked), blocks)
+    quote_calls = [(call.start(), call.group("name"), _literal_params(call.group("body")))
+                   for call in QUOTE_CALL_PATTERN.finditer(code) if masked[call.start()] == code[call.start()]]
+
+    traded = None
+    for call in SWAP_CALL_PATTERN.finditer(code):
+        if masked[call.start()] != "s":
+            continue  # In a comment or string
+        swap = _literal_params(call.group("body"))
+        if not {"tokenInAddress", "tokenOutAddress", "amountIn"} <= swap.keys():
+            raise ValueError("Every swap() needs literal tokenInAddress, tokenOutAddress and amountIn to be backtested")
+        if swap["tokenInAddress"] == quote_token:
+            leg, token = "buy", swap["tokenOutAddress"]
+        elif swap["tokenOutAddress"] == quote_token:
+            leg, token = "sell", swap["tokenInAddress"]
+        else:
+            raise ValueError(f"Can't backtest a swap of {swap['tokenInAddress']} for {swap['tokenOutAddress']}: "
+                             f"one side must be {quote_token}")
+        if traded not in (None, token):
+            raise ValueError(f"Can't backtest swaps of both {traded} and {token}")
+        if f"{leg}_amount" in params:
+            raise ValueError(f"Can't backtest more than one {leg} swap")
+        traded = token
+        params[f"{leg}_amount"] = _amount(swap["amountIn"])
+
+        for block in blocks:
+            if not block.start <= call.start() < block.end:
+                continue
+            if block.loop:
+                raise ValueError("Can't backtest a swap in a loop")
+            quotes = {name: quote for start, name, quote in quote_calls if start < block.start}
+            for op, threshold in _bounds(block.condition, block.negated, quotes, traded, quote_token):
+                if op in ("<", "<="):
+                    params[f"{leg}_below"] = min(threshold, params.get(f"{leg}_below", threshold))
+                else:
+                    params[f"{leg}_above"] = max(threshold, params.get(f"{leg}_above", threshold))
+
+    if "buy_amount" not in params and "sell_amount" not in params:
+        raise ValueError("No swap() call with literal tokenInAddress/tokenOutAddress/amountIn found")
+
+    params.update(overrides)
+    return StrategyParams(**params)
+
+
+def _column(strategies: Sequence[StrategyParams], attribute: str, default: float = 0.0) -> np.ndarray:
+    values = [getattr(s, attribute) for s in strategies]
+    return np.array([default if v is None else v for v in values], dtype=np.float64)[:, None]
+
+
+def _simulate(prices: np.ndarray, strategies: Sequence[StrategyParams]) -> List[Dict[str, Any]]:
+    """
+    Simulate strategies that all run on every bar of `prices`.
+
+    Bars are processed in blocks small enough to stay in CPU cache, carrying
+    position, cash and the equity peak from one block to the next.
+    """
+    rows = len(strategies)
+    fee = _column(strategies, "fee")
+    liquidity = _column(strategies, "liquidity")
+    buy_amount = _column(strategies, "buy_amount")
+    sell_amount = _column(strategies, "sell_amount")
+    buy_below = np.where(buy_amount > 0, _column(strategies, "buy_below", np.inf), -np.inf)
+    buy_above = _column(strategies, "buy_above", -np.inf)
+    sell_above = np.where(sell_amount > 0, _column(strategies, "sell_above", -np.inf), np.inf)
+    sell_below = _column(strategies, "sell_below", np.inf)
+
+    # Constant-product fill against reserves (liquidity, liquidity * price):
+    # out = reserve_out * in_after_fee / (reserve_in + in_after_fee)
+    buy_in = buy_amount * (1 - fee)
+    buy_offset = buy_in / liquidity
+    sell_in = sell_amount * (1 - fee)
+    sell_factor = sell_in / (1 + sell_in / liquidity)
+
+    position = np.zeros((rows, 1))
+    cash = np.zeros((rows, 1))
+    # Equity starts at zero before the first bar
+    peak = np.zeros((rows, 1))
+    drawdown = np.zeros(rows)
+    buy_count = np.zeros(rows, dtype=np.int64)
+    sell_count = np.zeros(rows, dtype=np.int64)
+    sell_value = np.zeros(rows)
+
+    block_bars = max(1, BLOCK_CELLS // rows)
+    for start in range(0, len(prices), block_bars):
+        block = prices[start:start + block_bars]
+        buys = (block <= buy_below) & (block >= buy_above)
+        sells = (block >= sell_above) & (block <= sell_below)
+
+        flow = np.add(block, buy_offset)
+        np.divide(buy_in, flow, out=flow)
+        np.multiply(flow, buys, out=flow)
+        np.subtract(flow, sell_amount, out=flow, where=sells)
+        np.cumsum(flow, axis=1, out=flow)
+        flow += position
+        position = flow[:, -1:].copy()
+        equity = np.multiply(flow, block, out=flow)
+
+        cash_flow = np.zeros_like(equity)
+        np.multiply(block, sell_factor, out=cash_flow, where=sells)
+        np.subtract(cash_flow, buy_amount, out=cash_flow, where=buys)
+        np.cumsum(cash_flow, axis=1, out=cash_flow)
+        cash_flow += cash
+        cash = cash_flow[:, -1:].copy()
+        equity += cash_flow
+
+        running_peak = np.maximum.accumulate(equity, axis=1, out=cash_flow)
+        np.maximum(running_peak, peak, out=running_peak)
+        peak = running_peak[:, -1:].copy()
+        running_peak -= equity
+        np.maximum(drawdown, running_peak.max(axis=1), out=drawdown)
+
+        buy_count += buys.sum(axis=1)
+        sell_count += sells.sum(axis=1)
+        sell_value += np.sum(np.broadcast_to(block, sells.shape), axis=1, where=sells)
+
+    invested = buy_count * buy_amount[:, 0]
+    fees = (invested + sell_value * sell_amount[:, 0]) * fee[:, 0]
+    final_equity = cash[:, 0] + position[:, 0] * prices[-1]
+
+    results = []
+    for i, strategy in enumerate(strategies):
+        pnl = float(final_equity[i])
+        results.append({
+            "name": strategy.name,
+            "pnl": pnl,
+            "invested": float(invested[i]),
+            "return_pct": pnl / invested[i] * 100 if invested[i] else None,
+            "max_drawdown": float(drawdown[i]),
+            "trades": int(buy_count[i] + sell_count[i]),
+            "buys": int(buy_count[i]),
+            "sells": int(sell_count[i]),
+            "fees": float(fees[i]),
+        })
+    return results
+
+
+def backtest(prices: np.ndarray, strategies: Sequence[StrategyParams]) -> List[Dict[str, Any]]:
+    """
+    Replay a price series against many strategies at once.
+
+    Strategies are grouped by schedule and each group is simulated on the
+    bars it actually runs on (every `every`-th bar), vectorized over
+    strategies and bars. Equity and drawdown are therefore marked at the
+    strategy's own run frequency.
+
+    Each swap is filled against a constant-product pool holding `liquidity`
+    traded tokens at the bar's price, after the swap fee. Pools re-anchor to
+    the market price on every bar and balances are not capped, so a strategy
+    can sell more than it bought.
+
+    Returns:
+        One dict per strategy, in input order, with pnl, invested, return_pct,
+        max_drawdown, trades, buys, sells and fees (amounts in quote-token units)
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    if prices.ndim != 1 or len(prices) == 0:
+        raise ValueError("prices must be a non-empty 1-D series")
+
+    groups: Dict[int, List[int]] = {}
+    for index, strategy in enumerate(strategies):
+        groups.setdefault(strategy.every, []).append(index)
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(strategies)
+    for every, indices in groups.items():
+        sampled = np.ascontiguousarray(prices[::every])
+        for start in range(0, len(indices), CHUNK_STRATEGIES):
+            chunk = indices[start:start + CHUNK_STRATEGIES]
+            for index, result in zip(chunk, _simulate(sampled, [strategies[i] for i in chunk])):
+                results[index] = result
+
+    return results
@@ -45,6 +45,21 @@ export const rpcUrl = `https://api.chainweb.com/chainweb/0.0/${networkId}/chain/
 
 const client = createClient(rpcUrl);
 
+// Quotes pre-fetched by the scheduler for the current tick (see price_feed.py)
+let priceSnapshot = {};
+
+function snapshotKey(tokenInAddress, tokenOutAddress, chainId, amountIn, amountOut) {
+  // Must stay in sync with QuoteKey.id in price_feed.py
+  const amount = (value) => (value === undefined ? "" : String(Number(value)));
+  return [
+    tokenInAddress,
+    tokenOutAddress,
+    String(chainId),
+    amount(amountIn),
+    amount(amountOut),
+  ].join("|");
+}
+
 // Constants
 const NETWORK_ID = "mainnet01";
 
@@ -259,6 +274,12 @@ async function quote({
 
   const validatedChainId = validateChainId(chainId);
 
+  const cached =
+    priceSnapshot[
+      snapshotKey(tokenInAddress, tokenOutAddress, validatedChainId, amountIn, amountOut)
+    ];
+  if (cached) return cached;
+
   const requestBody = {
     tokenInAddress,
     tokenOutAddress,
@@ -666,6 +687,7 @@ async function baselineFunction() {
 }
 
 export const handler = async (event, context) => {
+  priceSnapshot = event?.prices?.quotes || {};
   try {
     const result = await baselineFunction();
     return {
@@ -1,25 +1,24 @@
 import os
-import json
-import requests
+import time
+import difflib
 from typing import Dict, List, Any, Optional, Union, Tuple
 
 # LangChain imports
-from langchain.agents import Tool, AgentExecutor, create_openai_functions_agent
-from langchain.memory import ConversationBufferMemory
-from langchain.schema import SystemMessage, HumanMessage
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.chat_history import BaseChatMessageHistory
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain_core.runnables.history import RunnableWithMessageHistory
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_community.callbacks import get_openai_callback
+from pydantic import BaseModel, Field
 # Set your OpenAI API key
 from dotenv import load_dotenv
 
+from kadena_common.metrics import counter, span
+from kadena_common.models import chat_model
+from kadena_common.tokens import TOKENS
+from structured import StructuredOutputError, follow_up, invoke_structured
+from validator import TRANSACTION_PARAMS, CodeValidator
+
 # Load environment variables from .env file
 load_dotenv()
 
-# Get OpenAI API key from environment variables
-os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
 
 TRANSACTIONS_CODE = """
 /**
@@ -190,403 +189,6 @@ TRANSACTIONS_USAGE = """
 */
 """
 
-TOKENS = """
-mainnet:
-  coin:
-    symbol: KDA
-    name: KDA
-    description: Native token of Kadena
-    img: img/kda.svg
-    color: "#4a9079"
-    totalSupply: 1000000000
-    precision: 12
-    socials:
-      - type: website
-        url: https://www.kadena.io/
-      - type: twitter
-        url: https://twitter.com/kadena_io
-      - type: discord
-        url: https://discord.com/invite/kadena
-      - type: github
-        url: https://github.com/kadena-io
-
-  arkade.token:
-    symbol: ARKD
-    name: Arkade
-    description:
-    img: img/ark.png
-    color: "#cc66ff"
-    precision: 12
-    socials:
-      - type: website
-        url: https://www.arkade.fun/
-      - type: twitter
-        url: https://twitter.com/ArkadeFun
-
-  free.maga:
-    symbol: MAGA
-    name: MAGA
-    description:
-    img: img/maga.png
-    color: "#9d0b32"
-    precision: 12
-    socials:
-      - type: twitter
-        url: https://x.com/MAGA_KDA
-
-  free.crankk01:
-    symbol: CRKK
-    name: CRKK
-    description:
-    img: img/crankk.png
-    color: "#7f6afc"
-    precision: 12
-    socials:
-      - type: website
-        url: https://crankk.io/
-
-
-  free.cyberfly_token:
-    symbol: CFLY
-    name: CFLY
-    description:
-    img: img/cfly.svg
-    color: "#1f1fc2"
-    precision: 8
-    socials: []
-
-  free.finux:
-    symbol: FINX
-    name: FINUX
-    description:
-    img: img/finux.png
-    color: "#23a45c"
-    precision: 12
-    socials: []
-
-  free.kishu-ken:
-    symbol: KISHK
-    name: KISHK
-    description: First Kadena memecoin 
-    img: img/kishk.png
-    color: "#cbcbcc"
-    totalSupply: 1000000000000000.00
-    circulatingSupply: 689488206446005.00
-    precision: 12
-    socials:
-      - type: website
-        url: https://kishuken.me/
-      - type: twitter
-        url: https://x.com/kishu_ken_kda
-      - type: telegram
-        url: https://t.me/kishukens
-      
-  kaddex.kdx:
-    symbol: KDX
-    name: KDX
-    description: Kaddex / Ecko Token
-    img: img/kdx.svg
-    color: "#ff5271"
-    totalSupply: 900699352.80
-    circulatingSupply: 244,760,172.96
-    precision: 12
-    socials:
-      - type: website
-        url: https://ecko.finance/
-      - type: github
-        url: https://github.com/eckoDAO-org
-      - type: twitter
-        url: https://x.com/eckoDAO
-      - type: discord
-        url: https://discord.gg/eckodao
-
-  n_625e9938ae84bdb7d190f14fc283c7a6dfc15d58.ktoshi:
-    symbol: KTO
-    name: KTO
-    description: Katoshi
-    img: img/ktoshi.png
-    color: "#34daa8"
-    precision: 15
-    socials:
-      - type: website
-        url: https://ktoshi.com/
-      - type: twitter
-        url: https://x.com/ktoshis
-
-  n_b742b4e9c600892af545afb408326e82a6c0c6ed.zUSD:
-    symbol: zUSD
-    name: zUSD
-    description: Stable coin issued by Zelcore
-    img: img/zUSD.svg
-    color: "#8a62eb"
-    precision: 18
-    socials:
-      - type: website
-        url: https://zelcore.io/
-
-  n_e309f0fa7cf3a13f93a8da5325cdad32790d2070.heron:
-    symbol: HERON
-    name: HERON
-    description:
-    img: img/heron.png
-    totalSupply: 963142522
-    circulatingSupply: 693142522
-    color: "#a22726"
-    precision: 12
-    socials:
-      - type: website
-        url: https://www.heronheroes.com
-      - type: twitter
-        url: https://x.com/HeronHeroesKDA
-
-  n_582fed11af00dc626812cd7890bb88e72067f28c.bro:
-    symbol: BRO
-    name: BRO
-    description: Token of the Brother's Telegram group
-    img: img/bro.png
-    color: "#af826a"
-    totalSupply: 100
-    circulatingSupply: 80
-    precision: 12
-    socials:
-        - type: website
-          url: https://bro.pink/
-        - type: twitter
-          url: https://x.com/thebrothersdao
-
-  runonflux.flux:
-    symbol: FLUX
-    name: FLUX
-    description: Native token of the Flux blockchain
-    img: img/flux-crypto.svg
-    color: "#2b61d1"
-    totalSupply: 440000000
-    precision: 8
-    socials:
-      - type: website
-        url: https://runonflux.io/
-      - type: twitter
-        url: https://t.me/zelhub
-      - type: discord
-        url: https://discord.gg/keVn3HDKZw
-
-  free.wiza:
-      symbol: WIZA
-      name: WIZA
-      description: Wizards Arena
-      img: img/wizards.png
-      color: "#ed0404"
-      precision: 12
-      socials:
-        - type: website
-          url: https://www.wizardsarena.net
-
-  hypercent.prod-hype-coin:
-    symbol: HYPE
-    name: HYPE
-    description: Hypercent token
-    img: img/hypercent-crypto.svg
-    color: "#c40a8d"
-    totalSupply: 10000000
-    precision: 12
-    socials:
-      - type: website
-        url: https://hypercent.io/
-      - type: twitter
-        url: https://twitter.com/hypercentpad
-      - type: discord
-        url: https://discord.gg/dxVvdNhqaE
-      - type: telegram
-        url: http://t.me/HyperCent
-
-  free.babena:
-    symbol: BABE
-    name: BABE
-    description: Babena - First DEFI project on Kadena
-    img: img/babena-logo.svg
-    color: "#ffcc4d"
-    totalSupply: 12967695
-    precision: 12
-    socials:
-      - type: website
-        url: https://babena.finance
-
-  kdlaunch.token:
-    symbol: KDL
-    name: KDL
-    description: KDLaunch
-    img: img/kdl.svg
-    color: "#4aa5b1"
-    totalSupply: 100000000
-    precision: 12
-    socials:
-      - type: website
-        url: https://www.kdlaunch.com/
-      - type: twitter
-        url: https://twitter.com/KdLaunch
-      - type: telegram
-        url: https://t.me/KDLaunchOfficial
-      - type: discord
-        url: https://discord.com/invite/GghUdhmk6z
-
-  kdlaunch.kdswap-token:
-    symbol: KDS
-    name: KDS
-    description: KDSwap
-    img: img/kds.svg
-    color: "#6ebbf2"
-    totalSupply: 100000000
-    precision: 12
-    socials:
-      - type: website
-        url: https://www.kdswap.exchange/
-      - type: twitter
-        url: https://twitter.com/KDSwap
-      - type: telegram
-        url: https://t.me/KDSwapOfficial
-      - type: discord
-        url: https://discord.com/invite/GghUdhmk6z
-
-  n_2669414de420c0d40bbc3caa615e989eaba83d6f.highlander:
-    symbol: HLR
-    name: HLR
-    description:
-    img: img/uno.webp
-    totalSupply: 1
-    circulatingSupply: 1
-    color: "#3d3939"
-    precision: 12
-    socials:
-      - type: website
-        url: https://youtu.be/dQw4w9WgXcQ?si=h0SS4HbaWxLgw2IA
-  
-  n_c89f6bb915bf2eddf7683fdea9e40691c840f2b6.cwc:
-    symbol: CWC
-    name: CWC
-    description:
-    img: img/cwc.webp
-    totalSupply: 4000000
-    circulatingSupply: 520
-    color: "#a22726"
-    precision: 12
-    socials:
-      - type: website
-        url: guardiansofkadena.com
-      - type: twitter
-        url: https://x.com/GuardiansofKDA
-
-  n_95d7fe012aa7e05c187b3fc8c605ff3b1a2c521d.MesutÖzilDönerKebabMerkel42Inu:
-    symbol: KEBAB
-    name: KEBAB
-    description: This Token is a symbol of love to Döner Kebab and to the friendship between Germany and Turkey
-    img: img/kebab.webp
-    totalSupply: 100000000
-    circulatingSupply: 100000000
-    color: "#a22726"
-    precision: 12
-    socials: []
-             
-  n_95d7fe012aa7e05c187b3fc8c605ff3b1a2c521d.ShrekYodaTrumpMarsX12Inu:
-    symbol: GREENCOIN
-    name: GREENCOIN
-    description: Cult for green coin, Trump and mars lovers.
-    img: img/greencoin.webp
-    totalSupply: 100000000
-    circulatingSupply: 100000000
-    color: "#a22726"
-    precision: 12
-    socials: []
-
-  n_95d7fe012aa7e05c187b3fc8c605ff3b1a2c521d.SonGokuBezosPikachu12Inu:
-    symbol: WLONG
-    name: WLONG
-    description: May the power of Wenlong be with us.
-    img: img/wlong.webp
-    totalSupply: 100000000
-    circulatingSupply: 100000000
-    color: "#a22726"
-    precision: 12
-    socials: []
-
-  n_d8d407d0445ed92ba102c2ce678591d69e464006.TRILLIONCARBON:
-    symbol: TCTC
-    name: TCTC
-    description: the official corporate token and ledger of Trillion Capital Toronto Corporation used for internal purposes
-    img: img/tril.png
-    totalSupply: 1000001
-    circulatingSupply: 1000001
-    color: "#a22726"
-    precision: 12
-    socials: 
-      - type: website
-        url: https://trillioncapital.ca
-      - type: twitter
-        url: https://twitter.com/TRILLIONCAP
-
-  n_518dfea5f0d2abe95cbcd8956eb97f3238e274a9.AZUKI:
-    symbol: AZUKI
-    name: AZUKI
-    description: Will Martino's beloved companion, AZUKI is a community managed token. Woof!.
-    img: img/azuki.png
-    totalSupply: 100000000
-    circulatingSupply: 100000000
-    color: "#218dc5"
-    precision: 12
-    socials:
-      - type: website
-        url: https://www.azukionkadena.fun
-      - type: twitter
-        url: https://x.com/AzukiKDA
-      - type: telegram
-        url: https://t.me/AzukiKDA
-
-  n_71c27e6720665fb572433c8e52eb89833b47b49b.Peppapig:
-    symbol: PP
-    name: PP
-    description:
-    img: img/peppa.png
-    totalSupply: 1000000000
-    circulatingSupply: 1000000000
-    color: "#a22726"
-    precision: 12
-    socials: 
-      - type: telegram
-        url: https://t.me/peppapigmemetokenkda
-
-testnet:
-  coin:
-    symbol: KDA
-    name: KDA
-    description: Native token of Kadena
-    img: img/kda.svg
-    totalSupply: 1000000000
-    socials:
-      - type: website
-        url: https://www.kadena.io/
-      - type: twitter
-        url: https://twitter.com/kadena_io
-      - type: discord
-        url: https://discord.com/invite/kadena
-      - type: github
-        url: https://github.com/kadena-io
-
-blacklist:
-  - lago.USD2
-  - lago.kwBTC
-  - lago.kwUSDC
-  - free.elon
-  - mok.token
-  - free.docu
-  - free.kpepe
-  - free.backalley
-  - free.kapybara-token
-  - free.jodie-token
-  - free.corona-token
-  - free.KAYC
-  - free.anedak
-  - n_95d7fe012aa7e05c187b3fc8c605ff3b1a2c521d.MesutÖzilDönerKebabMerkel42Inu
-"""
-
 BASELINE_JS = """
 [CODE]
 // Baseline function for Kadena blockchain transactions
@@ -638,6 +240,31 @@ async function baselineFunction() {
 [/CODE]
 """
 
+VALIDATOR = CodeValidator(BASELINE_JS, TOKENS)
+
+CODE_MODEL = "o4-mini"
+
+CODE_VALIDATION_FAILURES = counter(
+    "kadena_code_validation_failures_total",
+    "Generated agent code rejected by the static validator, by attempt",
+    ("attempt",),
+)
+CODE_PATCH_RESULTS = counter(
+    "kadena_code_patch_results_total",
+    "Patch-mode /code requests, by whether the patch was applied or fell back to full generation",
+    ("outcome",),
+)
+
+VALIDATION_FEEDBACK = """The generated code failed static validation:
+{report}
+
+Fix only these problems and return the complete baselineFunction and interval again."""
+
+class GeneratedAgent(BaseModel):
+    """Return the generated trading agent."""
+    code: str = Field(..., description="The complete baselineFunction() JavaScript code")
+    interval: str = Field(..., description='AWS EventBridge schedule expression, e.g. "rate(5 minutes)" or "cron(0 12 * * ? *)"')
+
 def code(prompt: str) -> Dict[str, Any]:
     """
     Generate code for a trading agent based on the provided prompt.
@@ -648,7 +275,7 @@ def code(prompt: str) -> Dict[str, Any]:
     Returns:
         Dict containing the generated code and execution interval
     """
-    model = ChatOpenAI(model="o4-mini")
+    model = chat_model(CODE_MODEL)
 
     prompt_template = ChatPromptTemplate.from_messages([
         ("system", """
@@ -700,7 +327,7 @@ def code(prompt: str) -> Dict[str, Any]:
         {BASELINE_JS}
 
         Output Format:
-        > - Output Structured JSON with only the following keys:
+        > - Call the GeneratedAgent function with only the following arguments:
         > - code (the code for baseline function)
         > - interval (AWS EventBridge schedule expression (e.g., "rate(5 minutes)", "cron(0 12 * * ? *)"))
         
@@ -722,7 +349,7 @@ def code(prompt: str) -> Dict[str, Any]:
         ("human", "{input}")
     ])
 
-    formatted_prompt = prompt_template.format(
+    messages = prompt_template.format_messages(
         input=prompt,
         TRANSACTIONS_CODE=TRANSACTIONS_CODE,
         TRANSACTIONS_USAGE=TRANSACTIONS_USAGE,
@@ -730,21 +357,174 @@ def code(prompt: str) -> Dict[str, Any]:
         BASELINE_JS=BASELINE_JS
     )
 
-    response = model.invoke(formatted_prompt).content
-
-    if response.startswith('```json'):
-        response = response.replace('```json', '').replace('```', '').strip()
-    elif response.startswith('```'):
-        response = response.replace('```', '').strip()
-    
+    started = time.perf_counter()
     try:
-        result = json.loads(response)
-        return {
-            "code": result['code'],
-            "interval": result['interval']
-        } 
-    except json.JSONDecodeError:
+        with span("code_generation", model=CODE_MODEL), get_openai_callback() as usage:
+            result, responses = invoke_structured(model, messages, GeneratedAgent, stage="code")
+        _record_full_generation((time.perf_counter() - started) * 1000, usage.prompt_tokens)
+
+        # Catch bad code here rather than at Lambda runtime; one targeted regeneration with the report attached
+        report = VALIDATOR.validate(result.code, result.interval)
+        if not report.ok:
+            CODE_VALIDATION_FAILURES.inc(attempt="first")
+            messages = follow_up(messages, responses[-1], VALIDATION_FEEDBACK.format(report=report.format()))
+            with span("code_fix", model=CODE_MODEL):
+                result, _ = invoke_structured(model, messages, GeneratedAgent, stage="code_fix")
+            report = VALIDATOR.validate(result.code, result.interval)
+            if not report.ok:
+                CODE_VALIDATION_FAILURES.inc(attempt="regenerated")
+    except StructuredOutputError as e:
         return {
             "error": "Failed to parse response as JSON",
-            "raw_response": response
+            "raw_response": e.raw_response
+        }
+
+    if not report.ok:
+        return {
+            "error": "Generated code failed validation",
+            "validation_errors": report.errors,
+            "raw_response": result.code
+        }
+
+    return {
+        "code": result.code,
+        "interval": result.interval
+    }
+
+
+# Patch mode: edit previously generated code instead of regenerating it from the full context
+
+# Fall back to full generation when a patch rewrites more than this fraction of the code
+MAX_PATCH_CHANGE = 0.5
+
+# Running average cost of full generations, the baseline patch savings are reported against
+FULL_GENERATION = {"latency_ms": None, "prompt_tokens": None}
+
+TRANSACTION_SIGNATURES = "\n".join(
+    f"- {name}({{ {', '.join(sorted(spec['required']))}"
+    + (f", {' or '.join(spec['one_of'])}" if spec["one_of"] else "")
+    + (f" }}; optional: {', '.join(sorted(spec['optional']))}" if spec["optional"] else " }")
+    + ")"
+    for name, spec in TRANSACTION_PARAMS.items()
+)
+
+PATCH_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """
+    You are <Agent K1>, a trading agent launcher created by Xade.
+
+    You previously generated the JavaScript code below for a trading agent on the Kadena Blockchain
+    (mainnet01, chain ID 2). The user wants to change it.
+
+    Make the smallest edit that implements the change:
+    - Return a list of edits. Each edit replaces one exact snippet of the current code (search) with new text (replace).
+    - Each search snippet must appear exactly once in the current code; include enough surrounding text to make it unique.
+    - Do not touch code unrelated to the change and keep the baselineFunction structure intact.
+    - Return the current interval unless the change is about the schedule. It must be an AWS EventBridge schedule expression.
+
+    Available transaction functions:
+    {SIGNATURES}
+
+    Current interval: {INTERVAL}
+
+    Current code:
+    {CODE}
+    """),
+    ("human", "{input}")
+])
+
+def _record_full_generation(latency_ms: float, prompt_tokens: int) -> None:
+    for key, value in (("latency_ms", latency_ms), ("prompt_tokens", prompt_tokens)):
+        if not value:
+            continue
+        previous = FULL_GENERATION[key]
+        FULL_GENERATION[key] = value if previous is None else 0.8 * previous + 0.2 * value
+
+class CodeEdit(BaseModel):
+    """One exact search/replace edit."""
+    search: str = Field(..., description="Exact snippet of the current code, appearing exactly once")
+    replace: str = Field(..., description="Text to put in place of the snippet")
+
+class CodePatch(BaseModel):
+    """Return the edits to apply to the current code."""
+    edits: List[CodeEdit] = Field(default_factory=list)
+    interval: str = Field(..., description='AWS EventBridge schedule expression, e.g. "rate(5 minutes)"')
+
+def apply_edits(source: str, edits: List[CodeEdit]) -> str:
+    """
+    Apply search/replace edits in order.
+
+    Raises:
+        ValueError: If a search snippet is missing or ambiguous
+    """
+    for edit in edits:
+        count = source.count(edit.search) if edit.search else 0
+        if count != 1:
+            raise ValueError(f"Edit snippet found {count} times: {edit.search[:80]!r}")
+        source = source.replace(edit.search, edit.replace, 1)
+    return source
+
+def patch_code(prompt: str, previous_code: str, previous_interval: str) -> Dict[str, Any]:
+    """
+    Apply a prompt change to previously generated code with a minimal edit.
+
+    Only the previous code and the transaction function signatures are sent,
+    instead of the full documentation, token list and baseline. Falls back to
+    full generation when the edit does not apply, changes too much of the code
+    or fails validation.
+
+    Args:
+        prompt: The requested change
+        previous_code: Code returned by an earlier /code call
+        previous_interval: Interval returned by that call
+
+    Returns:
+        Dict containing the code and interval, plus a `patch` report with token and latency savings
+    """
+    model = chat_model(CODE_MODEL)
+    messages = PATCH_PROMPT.format_messages(
+        input=prompt,
+        SIGNATURES=TRANSACTION_SIGNATURES,
+        INTERVAL=previous_interval,
+        CODE=previous_code
+    )
+
+    started = time.perf_counter()
+    fallback_reason = None
+    try:
+        with span("code_patch", model=CODE_MODEL), get_openai_callback() as usage:
+            patch, _ = invoke_structured(model, messages, CodePatch, stage="patch")
+        patched = apply_edits(previous_code, patch.edits)
+
+        similarity = difflib.SequenceMatcher(None, previous_code.splitlines(), patched.splitlines()).ratio()
+        report = VALIDATOR.validate(patched, patch.interval)
+        if 1 - similarity > MAX_PATCH_CHANGE:
+            fallback_reason = f"diff too large ({1 - similarity:.0%} of the code changed)"
+        elif not report.ok:
+            fallback_reason = f"patched code failed validation: {'; '.join(report.errors)}"
+    except (StructuredOutputError, ValueError) as e:
+        fallback_reason = str(e)
+    latency_ms = (time.perf_counter() - started) * 1000
+
+    if fallback_reason:
+        CODE_PATCH_RESULTS.inc(outcome="fallback")
+        result = code(
+            prompt=f"{prompt}\n\nThe agent currently runs this code on the schedule {previous_interval}:\n{previous_code}"
+        )
+        result["patch"] = {"mode": "full", "fallback_reason": fallback_reason, "patch_latency_ms": round(latency_ms)}
+        return result
+
+    CODE_PATCH_RESULTS.inc(outcome="applied")
+    full_tokens, full_latency = FULL_GENERATION["prompt_tokens"], FULL_GENERATION["latency_ms"]
+    return {
+        "code": patched,
+        "interval": patch.interval,
+        "patch": {
+            "mode": "patch",
+            "edits": len(patch.edits),
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+            "latency_ms": round(latency_ms),
+            "prompt_tokens_saved": round(full_tokens - usage.prompt_tokens) if full_tokens else None,
+            "latency_saved_ms": round(full_latency - latency_ms) if full_latency else None,
         }
+    }
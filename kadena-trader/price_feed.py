@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import math
+import re
+import time
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from kadena_common.kadena_client import KADENA_API_BASE_URL, KadenaClient
+
+logger = logging.getLogger(__name__)
+
+# Matches the object literal passed to quote({...}) in generated agent code
+QUOTE_CALL_PATTERN = re.compile(r"\bquote\s*\(\s*\{(?P<body>[^{}]*)\}\s*\)", re.DOTALL)
+LITERAL_PARAM_PATTERN = re.compile(
+    r"(?P<key>tokenInAddress|tokenOutAddress|chainId|amountIn|amountOut)\s*:\s*"
+    r"(?:'(?P<single>[^']*)'|\"(?P<double>[^\"]*)\"|(?P<number>-?\d+(?:\.\d+)?))"
+)
+
+
+def _normalize_amount(value: Any) -> str:
+    """Format an amount the way JavaScript's String(Number(x)) does."""
+    if value is None or value == "":
+        return ""
+    number = float(value)
+    if number == 0:
+        return "0"
+    # Both use the shortest digits that round-trip; JS writes them out in full from 1e-6 up to 1e21
+    text = repr(number)
+    if not math.isfinite(number) or 1e-6 <= abs(number) < 1e21:
+        return format(Decimal(text).normalize(), "f")
+    mantissa, exponent = text.split("e")
+    return f"{mantissa}e{int(exponent):+d}"
+
+
+class QuoteKey(NamedTuple):
+    """One distinct quote request. Agents asking for the same key share a single upstream call."""
+    tokenInAddress: str
+    tokenOutAddress: str
+    chainId: str
+    amountIn: str = ""
+    amountOut: str = ""
+
+    @classmethod
+    def create(cls, tokenInAddress: str, tokenOutAddress: str, chainId: Any = "2",
+               amountIn: Any = None, amountOut: Any = None) -> "QuoteKey":
+        return cls(tokenInAddress, tokenOutAddress, str(chainId),
+                   _normalize_amount(amountIn), _normalize_amount(amountOut))
+
+    @property
+    def id(self) -> str:
+        # Must stay in sync with snapshotKey() in baseline.js
+        return "|".join(self)
+
+    def body(self) -> Dict[str, str]:
+        body = {
+            "tokenInAddress": self.tokenInAddress,
+            "tokenOutAddress": self.tokenOutAddress,
+            "chainId": self.chainId,
+        }
+        if self.amountIn:
+            body["amountIn"] = self.amountIn
+        if self.amountOut:
+            body["amountOut"] = self.amountOut
+        return body
+
+
+def extract_quote_keys(code: str) -> List[QuoteKey]:
+    """
+    Find the quote() calls in generated agent code whose parameters are all literals.
+
+    Generated agents hardcode their parameters, so this covers the usual case; calls
+    built from variables are skipped and simply fall through to a live quote at runtime.
+    """
+    keys = []
+    for call in QUOTE_CALL_PATTERN.finditer(code or ""):
+        params = {}
+        for match in LITERAL_PARAM_PATTERN.finditer(call.group("body")):
+            value = next(v for v in (match.group("single"), match.group("double"), match.group("number")) if v is not None)
+            params[match.group("key")] = value
+        if "tokenInAddress" not in params or "tokenOutAddress" not in params:
+            continue
+        if ("amountIn" in params) == ("amountOut" in params):
+            continue
+        try:
+            keys.append(QuoteKey.create(**{"chainId": "2", **params}))
+        except ValueError:
+            continue
+    return keys
+
+
+class PriceSnapshot:
+    """Quotes fetched once for a scheduler tick and shared by every agent on that tick."""
+
+    def __init__(self, quotes: Dict[QuoteKey, Dict[str, Any]], taken_at: float):
+        self.quotes = quotes
+        self.taken_at = taken_at
+
+    def get(self, key: QuoteKey) -> Optional[Dict[str, Any]]:
+        """Return the quote for `key`, or None if it was not fetched or the fetch failed."""
+        quote = self.quotes.get(key)
+        if quote is None or "error" in quote:
+            return None
+        return quote
+
+    def to_event(self) -> Dict[str, Any]:
+        """Serialize for the Lambda event; baseline.js reads `event.prices` in quote()."""
+        return {
+            "takenAt": self.taken_at,
+            "quotes": {key.id: quote for key, quote in self.quotes.items() if "error" not in quote},
+        }
+
+
+class PriceFeed:
+    """
+    Tick-scoped price service for the agent scheduler.
+
+    When a tick fires, the feed collects the union of quote requests needed by
+    the due agents and fetches each distinct one exactly once, concurrently.
+    Quotes go through the shared Kadena API client (kadena_common.kadena_client).
+    """
+
+    def __init__(self, base_url: str = KADENA_API_BASE_URL, api_key: Optional[str] = None,
+                 max_concurrency: int = 16, timeout: float = 10.0, client: Optional[KadenaClient] = None):
+        self.client = client or KadenaClient(base_url, api_key, timeout=timeout)
+        self.max_concurrency = max_concurrency
+        self.stats = {"ticks": 0, "requested": 0, "fetched": 0, "errors": 0}
+
+    async def snapshot(self, keys: Iterable[QuoteKey]) -> PriceSnapshot:
+        """
+        Fetch every distinct key once, with at most `max_concurrency` requests in flight.
+
+        Args:
+            keys: Quote requests from all due agents, duplicates allowed
+
+        Returns:
+            PriceSnapshot containing one result (or error) per distinct key
+        """
+        keys = list(keys)
+        unique = list(dict.fromkeys(keys))
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def fetch(key: QuoteKey) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.client.aquote(key.body())
+
+        results = await asyncio.gather(*(fetch(key) for key in unique))
+        quotes = dict(zip(unique, results))
+
+        errors = sum(1 for quote in results if "error" in quote)
+        self.stats["ticks"] += 1
+        self.stats["requested"] += len(keys)
+        self.stats["fetched"] += len(unique)
+        self.stats["errors"] += errors
+        if errors:
+            logger.warning(f"{errors} of {len(unique)} quotes failed for this tick")
+
+        return PriceSnapshot(quotes, taken_at=time.time())
+
+    async def prepare_tick(self, tick) -> None:
+        """
+        Scheduler `before_tick` hook: attach a shared PriceSnapshot to the tick.
+
+        Agents declare their quotes in `metadata["quotes"]` (a list of QuoteKey);
+        otherwise they are extracted from `metadata["code"]` once and memoized.
+        """
+        keys: List[QuoteKey] = []
+        for agent in tick.agents:
+            if "quotes" not in agent.metadata:
+                agent.metadata["quotes"] = extract_quote_keys(agent.metadata.get("code", ""))
+            keys.extend(agent.metadata["quotes"])
+        tick.prices = await self.snapshot(keys)
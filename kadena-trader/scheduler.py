@@ -0,0 +1,389 @@
+import asyncio
+import heapq
+import logging
+import random
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# EventBridge schedule expressions, as produced in the `interval` field by coder.code()
+RATE_PATTERN = re.compile(r"^rate\(\s*(\d+)\s+(minute|minutes|hour|hours|day|days)\s*\)$")
+CRON_PATTERN = re.compile(r"^cron\((.+)\)$")
+
+RATE_UNITS = {"minute": 60, "hour": 3600, "day": 86400}
+
+MONTH_NAMES = {name: i + 1 for i, name in enumerate(
+    ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+)}
+# EventBridge numbers days of the week 1-7 starting on Sunday
+DAY_NAMES = {name: i + 1 for i, name in enumerate(["SUN", "MON", "TUE", "WED", "THU", "FRI", "SAT"])}
+
+# Upper bound on how far ahead we search for the next cron match
+MAX_CRON_LOOKAHEAD_YEARS = 5
+
+
+class Schedule:
+    """Base class for parsed schedule expressions."""
+
+    expression: str
+
+    def next_after(self, moment: datetime) -> datetime:
+        """Return the first fire time strictly after `moment` (UTC)."""
+        raise NotImplementedError
+
+
+class RateSchedule(Schedule):
+    def __init__(self, expression: str, seconds: int):
+        self.expression = expression
+        self.period = timedelta(seconds=seconds)
+
+    def next_after(self, moment: datetime) -> datetime:
+        # Align to the period boundary so agents sharing a rate fire on the same tick
+        epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+        elapsed = (moment - epoch) // self.period
+        return epoch + (elapsed + 1) * self.period
+
+
+class CronSchedule(Schedule):
+    def __init__(self, expression: str, minutes: Set[int], hours: Set[int],
+                 days_of_month: Optional[Set[int]], months: Set[int],
+                 days_of_week: Optional[Set[int]], years: Optional[Set[int]]):
+        self.expression = expression
+        self.minutes = minutes
+        self.hours = hours
+        self.days_of_month = days_of_month
+        self.months = months
+        self.days_of_week = days_of_week
+        self.years = years
+
+    def _day_matches(self, moment: datetime) -> bool:
+        if self.days_of_month is not None and moment.day not in self.days_of_month:
+            return False
+        if self.days_of_week is not None:
+            # datetime.weekday(): Monday=0 .. Sunday=6 -> EventBridge: Sunday=1 .. Saturday=7
+            if (moment.weekday() + 1) % 7 + 1 not in self.days_of_week:
+                return False
+        return True
+
+    def next_after(self, moment: datetime) -> datetime:
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate.year + MAX_CRON_LOOKAHEAD_YEARS
+
+        while candidate.year <= limit:
+            if self.years is not None and candidate.year not in self.years:
+                candidate = datetime(candidate.year + 1, 1, 1, tzinfo=timezone.utc)
+                continue
+            if candidate.month not in self.months:
+                year, month = (candidate.year + 1, 1) if candidate.month == 12 else (candidate.year, candidate.month + 1)
+                candidate = datetime(year, month, 1, tzinfo=timezone.utc)
+                continue
+            if not self._day_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+                continue
+            if candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+                continue
+            return candidate
+
+        raise ValueError(f"Schedule {self.expression} never fires within {MAX_CRON_LOOKAHEAD_YEARS} years")
+
+
+def _parse_cron_field(value: str, low: int, high: int, names: Optional[Dict[str, int]] = None) -> Optional[Set[int]]:
+    """
+    Parse one cron field into the set of matching values.
+
+    Returns None for `?` (no constraint). Raises ValueError on anything
+    EventBridge would reject or that we do not support (L, W and #).
+    """
+    if value == "?":
+        return None
+
+    def to_int(token: str) -> int:
+        token = token.upper()
+        if names and token in names:
+            return names[token]
+        if not token.isdigit():
+            raise ValueError(f"Invalid cron value '{token}'")
+        number = int(token)
+        if number < low or number > high:
+            raise ValueError(f"Cron value {number} out of range {low}-{high}")
+        return number
+
+    result: Set[int] = set()
+    for part in value.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            if not step_text.isdigit() or int(step_text) == 0:
+                raise ValueError(f"Invalid cron step '{step_text}'")
+            step = int(step_text)
+
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = to_int(start_text), to_int(end_text)
+        else:
+            start = to_int(part)
+            end = high if step > 1 else start
+
+        if start > end:
+            raise ValueError(f"Invalid cron range '{part}'")
+        result.update(range(start, end + 1, step))
+
+    return result
+
+
+def parse_schedule(expression: str) -> Schedule:
+    """
+    Parse an AWS EventBridge schedule expression.
+
+    Args:
+        expression: e.g. "rate(5 minutes)" or "cron(0 12 * * ? *)"
+
+    Returns:
+        A Schedule that can compute its next fire time
+
+    Raises:
+        ValueError: If the expression is not a valid rate/cron expression
+    """
+    expression = (expression or "").strip()
+
+    rate_match = RATE_PATTERN.match(expression)
+    if rate_match:
+        value, unit = int(rate_match.group(1)), rate_match.group(2)
+        if value <= 0:
+            raise ValueError("Rate value must be a positive integer")
+        # EventBridge rejects "rate(1 minutes)" and "rate(5 minute)"
+        if (value == 1) != (not unit.endswith("s")):
+            raise ValueError(f"Use the {'singular' if value == 1 else 'plural'} unit in '{expression}'")
+        return RateSchedule(expression, value * RATE_UNITS[unit.rstrip("s")])
+
+    cron_match = CRON_PATTERN.match(expression)
+    if cron_match:
+        fields = cron_match.group(1).split()
+        if len(fields) != 6:
+            raise ValueError("Cron expressions need 6 fields: minutes hours day-of-month month day-of-week year")
+        minutes, hours, dom, month, dow, year = fields
+        if (dom == "?") == (dow == "?"):
+            raise ValueError("Exactly one of day-of-month or day-of-week must be '?'")
+        return CronSchedule(
+            expression,
+            minutes=_parse_cron_field(minutes, 0, 59),
+            hours=_parse_cron_field(hours, 0, 23),
+            days_of_month=_parse_cron_field(dom, 1, 31),
+            months=_parse_cron_field(month, 1, 12, MONTH_NAMES),
+            days_of_week=_parse_cron_field(dow, 1, 7, DAY_NAMES),
+            years=None if year == "*" else _parse_cron_field(year, 1970, 2199),
+        )
+
+    raise ValueError(f"Invalid schedule expression '{expression}'. Expected rate(...) or cron(...)")
+
+
+@dataclass
+class ScheduledAgent:
+    """A generated trading agent registered with the scheduler."""
+    agent_id: str
+    interval: str
+    run: Callable[["ScheduledAgent", "Tick"], Awaitable[Any]]
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    schedule: Optional[Schedule] = None
+
+    def __post_init__(self):
+        if self.schedule is None:
+            self.schedule = parse_schedule(self.interval)
+
+
+@dataclass
+class Tick:
+    """A batch of agents that share the same due time."""
+    due_at: datetime
+    agents: List[ScheduledAgent]
+    fired_at: Optional[datetime] = None
+    # Shared price_feed.PriceSnapshot, set by the before_tick hook when one is configured
+    prices: Optional[Any] = None
+
+
+class AgentScheduler:
+    """
+    Runs many agents from a single asyncio loop instead of one EventBridge
+    rule (and Lambda cold start) per agent.
+
+    Agents are kept in a heap ordered by their next fire time. All agents
+    due at the same instant are fired together as one Tick, each after a
+    small random jitter and under a shared concurrency limit.
+    """
+
+    def __init__(self, max_concurrency: int = 50, max_jitter: float = 1.0,
+                 lag_window: int = 1000,
+                 before_tick: Optional[Callable[[Tick], Awaitable[None]]] = None):
+        self.max_concurrency = max_concurrency
+        self.max_jitter = max_jitter
+        self.before_tick = before_tick
+        self._agents: Dict[str, ScheduledAgent] = {}
+        self._heap: List[Any] = []
+        self._sequence = 0
+        self._current: Dict[str, int] = {}
+        self._running: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._lags: deque = deque(maxlen=lag_window)
+        self._counters = {"ticks": 0, "runs": 0, "failures": 0, "skipped_overlaps": 0}
+
+    def add(self, agent: ScheduledAgent, now: Optional[datetime] = None) -> datetime:
+        """
+        Register (or replace) an agent and schedule its next run.
+
+        Returns:
+            The agent's first fire time
+        """
+        now = now or datetime.now(timezone.utc)
+        self._agents[agent.agent_id] = agent
+        due_at = agent.schedule.next_after(now)
+        self._push(due_at, agent.agent_id)
+        return due_at
+
+    def remove(self, agent_id: str) -> None:
+        """Unregister an agent. Pending heap entries are dropped lazily."""
+        self._agents.pop(agent_id, None)
+        self._current.pop(agent_id, None)
+
+    def _push(self, due_at: datetime, agent_id: str) -> None:
+        self._sequence += 1
+        self._current[agent_id] = self._sequence
+        heapq.heappush(self._heap, (due_at, self._sequence, agent_id))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def pop_due(self, now: datetime) -> List[Tick]:
+        """
+        Pop every agent due at or before `now`, grouped into one Tick per due time,
+        and reschedule each agent for its following run.
+        """
+        batches: Dict[datetime, List[ScheduledAgent]] = {}
+        while self._heap and self._heap[0][0] <= now:
+            due_at, sequence, agent_id = heapq.heappop(self._heap)
+            agent = self._agents.get(agent_id)
+            if agent is None or self._current.get(agent_id) != sequence:
+                # Removed, or superseded by a later add()
+                continue
+            batches.setdefault(due_at, []).append(agent)
+            self._push(agent.schedule.next_after(max(due_at, now)), agent_id)
+        return [Tick(due_at=due_at, agents=agents) for due_at, agents in sorted(batches.items(), key=lambda item: item[0])]
+
+    async def start(self) -> None:
+        """Start the scheduling loop in the background."""
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._wakeup = asyncio.Event()
+        self._loop_task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Stop scheduling and wait for in-flight agent runs to finish."""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _loop(self) -> None:
+        while True:
+            now = datetime.now(timezone.utc)
+            for tick in self.pop_due(now):
+                self._dispatch(tick)
+
+            self._wakeup.clear()
+            delay = (self._heap[0][0] - datetime.now(timezone.utc)).total_seconds() if self._heap else 60.0
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _dispatch(self, tick: Tick) -> None:
+        tick.fired_at = datetime.now(timezone.utc)
+        self._counters["ticks"] += 1
+        task = asyncio.create_task(self.fire(tick))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def fire(self, tick: Tick) -> List[Any]:
+        """
+        Run every agent in a tick concurrently (bounded by max_concurrency).
+
+        Returns:
+            The per-agent results, with exceptions returned in place of results
+        """
+        if tick.fired_at is None:
+            tick.fired_at = datetime.now(timezone.utc)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self.before_tick is not None:
+            try:
+                await self.before_tick(tick)
+            except Exception as e:
+                # Agents can still run without shared data; they fall back to their own calls
+                logger.error(f"before_tick hook failed: {str(e)}", exc_info=True)
+        return await asyncio.gather(*(self._run_agent(agent, tick) for agent in tick.agents),
+                                    return_exceptions=True)
+
+    async def _run_agent(self, agent: ScheduledAgent, tick: Tick) -> Any:
+        if agent.agent_id in self._running:
+            # Previous run is still going; EventBridge would start a second Lambda, we skip instead
+            self._counters["skipped_overlaps"] += 1
+            logger.warning(f"Skipping run of agent {agent.agent_id}: previous run still in progress")
+            return None
+
+        self._running.add(agent.agent_id)
+        try:
+            if self.max_jitter > 0:
+                await asyncio.sleep(random.uniform(0, self.max_jitter))
+            async with self._semaphore:
+                started = time.time()
+                self._lags.append(started - tick.due_at.timestamp())
+                self._counters["runs"] += 1
+                return await agent.run(agent, tick)
+        except Exception as e:
+            self._counters["failures"] += 1
+            logger.error(f"Agent {agent.agent_id} failed: {str(e)}", exc_info=True)
+            raise
+        finally:
+            self._running.discard(agent.agent_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report scheduling lag (time from due to actually starting a run,
+        including jitter and waiting for a concurrency slot) and counters.
+        """
+        lags = sorted(self._lags)
+
+        def percentile(p: float) -> Optional[float]:
+            if not lags:
+                return None
+            return round(lags[min(len(lags) - 1, int(p * len(lags)))], 4)
+
+        return {
+            "agents": len(self._agents),
+            "next_due": self._heap[0][0].isoformat() if self._heap else None,
+            "in_flight": len(self._running),
+            "lag_seconds": {
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": round(lags[-1], 4) if lags else None,
+            },
+            **self._counters,
+        }
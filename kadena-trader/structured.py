@@ -0,0 +1,131 @@
+import json
+import logging
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple, Type, TypeVar
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import BaseModel, ValidationError
+
+from kadena_common.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+STRUCTURED_OUTPUT_CALLS = counter(
+    "kadena_structured_output_calls_total",
+    "Model calls made for structured output, including repair attempts",
+    ("stage",),
+)
+STRUCTURED_OUTPUT_PARSE_FAILURES = counter(
+    "kadena_structured_output_parse_failures_total",
+    "Model responses that did not parse into the expected schema",
+    ("stage",),
+)
+STRUCTURED_OUTPUT_REPAIRS = counter(
+    "kadena_structured_output_repairs_total",
+    "In-process repair attempts after a parse failure, by outcome",
+    ("stage", "outcome"),
+)
+
+T = TypeVar("T", bound=BaseModel)
+
+REPAIR_PROMPT = """Your previous response could not be used: {error}
+Call the `{name}` function again with corrected arguments that satisfy its schema."""
+
+
+class StructuredOutputError(Exception):
+    """The model did not produce valid structured output, even after a repair attempt."""
+
+    def __init__(self, message: str, raw_response: str = ""):
+        super().__init__(message)
+        self.raw_response = raw_response
+
+
+def _parse(message: AIMessage, schema: Type[T]) -> T:
+    """Extract the forced function call from a model message and validate it against `schema`."""
+    tool_calls = message.additional_kwargs.get("tool_calls") or []
+    if tool_calls:
+        arguments = tool_calls[0]["function"]["arguments"]
+    else:
+        # Fall back to the message text in case the model answered in plain JSON anyway
+        arguments = message.content.strip()
+        if arguments.startswith("```"):
+            arguments = arguments.strip("`").removeprefix("json").strip()
+    return schema.model_validate_json(arguments)
+
+
+def follow_up(messages: List[BaseMessage], response: AIMessage, content: str) -> List[BaseMessage]:
+    """Extend a conversation with the model's last response and feedback on it."""
+    tool_calls = response.additional_kwargs.get("tool_calls") or []
+    if tool_calls:
+        # OpenAI requires every tool call to be answered by a tool message
+        feedback = ToolMessage(content=content, tool_call_id=tool_calls[0]["id"])
+    else:
+        feedback = HumanMessage(content=content)
+    return messages + [response, feedback]
+
+
+def _raw(message: Optional[AIMessage]) -> str:
+    if message is None:
+        return ""
+    tool_calls = message.additional_kwargs.get("tool_calls") or []
+    return tool_calls[0]["function"]["arguments"] if tool_calls else message.content
+
+
+@lru_cache(maxsize=None)
+def openai_tool(schema: Type[BaseModel]) -> dict:
+    """
+    The OpenAI tool definition of `schema`.
+
+    Converted once per schema: LangChain's conversion inspects every loaded
+    module on its first call, which would otherwise land on the first request.
+    """
+    return convert_to_openai_tool(schema)
+
+
+def invoke_structured(model, messages: List[BaseMessage], schema: Type[T], stage: str,
+                      **invoke_kwargs: Any) -> Tuple[T, List[AIMessage]]:
+    """
+    Call a chat model with `schema` as a forced function call and parse the result.
+
+    If the response does not validate, the validation error is sent back to the
+    model once so it can repair its output, saving a full regeneration by the caller.
+
+    Args:
+        model: Chat model supporting OpenAI function calling
+        messages: Prompt messages
+        schema: Pydantic model the output must satisfy (its docstring describes the function)
+        stage: Label for metrics, e.g. "code" or "prompt"
+
+    Returns:
+        Tuple of the parsed output and every model message received (for usage accounting)
+
+    Raises:
+        StructuredOutputError: If the output is still invalid after the repair attempt
+    """
+    tool = openai_tool(schema)
+    name = tool["function"]["name"]
+    bound = model.bind(tools=[tool], tool_choice={"type": "function", "function": {"name": name}})
+
+    responses: List[AIMessage] = []
+    error: Optional[Exception] = None
+    for attempt in range(2):
+        STRUCTURED_OUTPUT_CALLS.inc(stage=stage)
+        if attempt:
+            messages = follow_up(messages, responses[-1], REPAIR_PROMPT.format(error=error, name=name))
+        response = bound.invoke(messages, **invoke_kwargs)
+        responses.append(response)
+        try:
+            parsed = _parse(response, schema)
+        except (ValidationError, ValueError, KeyError, json.JSONDecodeError) as e:
+            STRUCTURED_OUTPUT_PARSE_FAILURES.inc(stage=stage)
+            logger.warning(f"Structured output for {stage} failed to parse (attempt {attempt + 1}): {str(e)}")
+            if attempt:
+                STRUCTURED_OUTPUT_REPAIRS.inc(stage=stage, outcome="failed")
+            error = e
+            continue
+        if attempt:
+            STRUCTURED_OUTPUT_REPAIRS.inc(stage=stage, outcome="repaired")
+        return parsed, responses
+
+    raise StructuredOutputError(f"Model output did not match {name}: {error}", raw_response=_raw(responses[-1]))
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The service's modules import each other by name and kadena_common from the repository root
+SERVICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [SERVICE, os.path.dirname(SERVICE)]
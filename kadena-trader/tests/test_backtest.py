@@ -0,0 +1,168 @@
+import numpy as np
+import pytest
+
+from backtest import StrategyParams, backtest, interval_to_bars, parse_strategy
+
+QUOTE_1_KDA = (
+    "const q = await quote({ tokenInAddress: 'coin', tokenOutAddress: 'arkade.token', amountIn: '1', chainId: '2' });\n"
+)
+QUOTE_100_TOKENS = (
+    "const q = await quote({ tokenInAddress: 'arkade.token', tokenOutAddress: 'coin', amountIn: '100', chainId: '2' });\n"
+)
+BUY = "await swap({ tokenInAddress: 'coin', tokenOutAddress: 'arkade.token', account: 'k:a', amountIn: '10' })"
+SELL = "await swap({ tokenInAddress: 'arkade.token', tokenOutAddress: 'coin', account: 'k:a', amountIn: '5' })"
+
+
+def test_interval_to_bars():
+    assert interval_to_bars("rate(5 minutes)") == 5
+    assert interval_to_bars("rate(1 hour)", bar_seconds=300) == 12
+    assert interval_to_bars("rate(1 minute)", bar_seconds=300) == 1
+    assert interval_to_bars("cron(0 12 * * ? *)", bar_seconds=3600) == 24
+    with pytest.raises(ValueError):
+        interval_to_bars("rate(5 minutes)", bar_seconds=0)
+
+
+def test_unconditional_swaps_run_every_time():
+    params = parse_strategy(f"{BUY};\n{SELL};", "rate(5 minutes)")
+    assert (params.every, params.buy_amount, params.sell_amount) == (5, 10.0, 5.0)
+    assert params.buy_below is params.buy_above is params.sell_above is params.sell_below is None
+
+
+@pytest.mark.parametrize("condition,bound", [
+    # 1 KDA buys amountOut tokens, so the price is 1 / amountOut: the direction flips
+    ("q.amountOut > 50", ("buy_below", 0.02)),
+    ("parseFloat(q.amountOut) < 50", ("buy_above", 0.02)),
+    ("50 >= Number(q.amountOut)", ("buy_above", 0.02)),
+])
+def test_buy_condition_on_kda_quote(condition, bound):
+    params = parse_strategy(f"{QUOTE_1_KDA}if ({condition}) {{\n  {BUY};\n}}", "rate(1 minute)")
+    assert getattr(params, bound[0]) == pytest.approx(bound[1])
+    other = "buy_above" if bound[0] == "buy_below" else "buy_below"
+    assert getattr(params, other) is None
+
+
+@pytest.mark.parametrize("condition,bound", [
+    # 100 tokens sell for amountOut KDA, so the price is amountOut / 100: the direction holds
+    ("q.amountOut > 3", ("sell_above", 0.03)),
+    ("q.amountOut <= 3", ("sell_below", 0.03)),
+])
+def test_sell_condition_on_token_quote(condition, bound):
+    params = parse_strategy(f"{QUOTE_100_TOKENS}if ({condition}) {SELL};", "rate(1 minute)")
+    assert getattr(params, bound[0]) == pytest.approx(bound[1])
+
+
+def test_quote_for_an_output_amount():
+    code = ("const q = await quote({ tokenInAddress: 'coin', tokenOutAddress: 'arkade.token', amountOut: '100' });\n"
+            f"if (q.amountIn < 2) {{ {BUY} }}")
+    assert parse_strategy(code, "rate(1 minute)").buy_below == pytest.approx(0.02)
+
+
+def test_conditions_bind_to_the_swap_they_guard():
+    code = (
+        "if (!balances) { throw new Error('No balances'); }\n"
+        f"{QUOTE_100_TOKENS}"
+        "// if (q.amountOut > 1000) ...\n"
+        "if (q && q.amountOut < 2) {\n"
+        f"  {BUY};\n"
+        "} else if (q.amountOut > 3) {\n"
+        f"  {SELL};\n"
+        "}\n"
+    )
+    params = parse_strategy(code, "rate(1 minute)")
+    assert params.buy_below == pytest.approx(0.02)
+    assert params.buy_above is None
+    # The else branch adds the negated first condition: price >= 0.02 and price > 0.03
+    assert params.sell_above == pytest.approx(0.03)
+    assert params.sell_below is None
+
+
+def test_conditions_combine():
+    code = f"{QUOTE_1_KDA}if (q.amountOut > 40 && q.amountOut < 50) {{ {BUY} }}"
+    params = parse_strategy(code, "rate(1 minute)")
+    assert (params.buy_above, params.buy_below) == (pytest.approx(0.02), pytest.approx(0.025))
+
+
+@pytest.mark.parametrize("code", [
+    f"if (balances.coin > 10) {{ {BUY} }}",
+    f"{QUOTE_1_KDA}if (q.amountOut > 40 || q.amountOut < 10) {{ {BUY} }}",
+    f"{QUOTE_1_KDA}if (q.amountOut === 50) {{ {BUY} }}",
+    f"{QUOTE_1_KDA}if (q.amountOut > 40 && q.amountOut < 50) {{ }} else {{ {BUY} }}",
+    f"{QUOTE_1_KDA}if (q) {{ }} else {{ {BUY} }}",
+    f"{QUOTE_1_KDA}const price = 1 / q.amountOut;\nif (price < 0.02) {{ {BUY} }}",
+    f"for (let i = 0; i < 3; i++) {{ {BUY} }}",
+    f"{BUY};\n{BUY};",
+    "await swap({ tokenInAddress: 'coin', tokenOutAddress: 'arkade.token', amountIn: amount })",
+    "await swap({ tokenInAddress: 'kaddex.kdx', tokenOutAddress: 'arkade.token', amountIn: '1' })",
+    "console.log('no swaps here')",
+])
+def test_unmappable_strategies_are_rejected(code):
+    with pytest.raises(ValueError):
+        parse_strategy(code, "rate(1 minute)")
+
+
+def test_overrides():
+    params = parse_strategy(BUY, "rate(1 minute)", fee=0.01, liquidity=500)
+    assert (params.fee, params.liquidity) == (0.01, 500)
+
+
+def test_dca_numbers():
+    # Deep pool and no fee: every bar buys 10 / price tokens
+    strategy = StrategyParams(buy_amount=10, fee=0, liquidity=1e12)
+    [result] = backtest(np.array([1.0, 2.0, 1.0]), [strategy])
+    assert result["buys"] == 3 and result["sells"] == 0 and result["trades"] == 3
+    assert result["invested"] == 30
+    # 25 tokens worth 25 KDA against 30 KDA paid
+    assert result["pnl"] == pytest.approx(-5)
+    assert result["return_pct"] == pytest.approx(-5 / 30 * 100)
+    # Equity per bar: 0, 15 * 2 - 20 = 10, 25 - 30 = -5
+    assert result["max_drawdown"] == pytest.approx(15)
+    assert result["fees"] == 0
+
+
+def test_constant_product_fill_and_fee():
+    # 10 KDA into a pool of 100 tokens / 100 KDA, after a 10% fee: 9 in, 100 * 9 / 109 out
+    strategy = StrategyParams(buy_amount=10, fee=0.1, liquidity=100)
+    [result] = backtest(np.array([1.0]), [strategy])
+    assert result["pnl"] == pytest.approx(100 * 9 / 109 - 10)
+    assert result["fees"] == pytest.approx(1.0)
+
+
+def test_threshold_legs():
+    prices = np.array([1.0, 2.0, 3.0, 2.0])
+    strategies = [
+        StrategyParams(name="band", buy_amount=6, buy_above=1.5, buy_below=2.5, fee=0, liquidity=1e12),
+        StrategyParams(name="take-profit", sell_amount=1, sell_above=3, fee=0, liquidity=1e12),
+        StrategyParams(name="stop-loss", sell_amount=1, sell_below=1, fee=0, liquidity=1e12),
+    ]
+    band, take_profit, stop_loss = backtest(prices, strategies)
+    assert (band["buys"], band["invested"]) == (2, 12)
+    # Bought 3 tokens at 2, twice, and marked at 2
+    assert band["pnl"] == pytest.approx(0, abs=1e-6)
+    assert take_profit["sells"] == 1
+    # Sold 1 token for 3 KDA, short 1 token at 2 KDA
+    assert take_profit["pnl"] == pytest.approx(3 - 2)
+    assert stop_loss["sells"] == 1
+    assert stop_loss["pnl"] == pytest.approx(1 - 2)
+
+
+def test_schedules_sample_their_own_bars():
+    prices = np.array([1.0, 2.0, 1.0, 2.0, 1.0])
+    every_bar, every_other = backtest(prices, [StrategyParams(buy_amount=1, fee=0),
+                                               StrategyParams(buy_amount=1, fee=0, every=2)])
+    assert every_bar["buys"] == 5
+    assert every_other["buys"] == 3
+    assert every_other["pnl"] == pytest.approx(0, abs=1e-5)
+
+
+def test_many_strategies_match_one_at_a_time():
+    prices = np.random.default_rng(0).lognormal(0, 0.05, 500).cumprod()
+    strategies = [StrategyParams(name=str(i), buy_amount=1 + i % 3, buy_below=1 + i / 100, sell_amount=i % 2,
+                                 sell_above=1.5, every=1 + i % 4) for i in range(150)]
+    together = backtest(prices, strategies)
+    for strategy, result in zip(strategies[::37], together[::37]):
+        assert backtest(prices, [strategy])[0] == pytest.approx(result)
+
+
+def test_empty_prices_are_rejected():
+    with pytest.raises(ValueError):
+        backtest(np.array([]), [StrategyParams(buy_amount=1)])
@@ -0,0 +1,69 @@
+import pytest
+
+import coder
+from coder import CodeEdit, CodePatch, apply_edits, patch_code
+from structured import StructuredOutputError
+
+SWAP = ('const transaction = await swap({ tokenInAddress: "coin", tokenOutAddress: "arkade.token", '
+        'account: "k:" + keyPair.publicKey, chainId: "2", amountIn: "1" });')
+PREVIOUS = coder.BASELINE_JS.split("[CODE]")[1].split("[/CODE]")[0].strip().replace("// ENTER AI CODE HERE", SWAP)
+
+
+@pytest.fixture
+def generate(monkeypatch):
+    """Stub out the model; returns the prompts full generation was called with."""
+    calls = []
+
+    def full_generation(prompt):
+        calls.append(prompt)
+        return {"code": "regenerated", "interval": "rate(1 hour)"}
+
+    monkeypatch.setattr(coder, "chat_model", lambda *args, **kwargs: None, raising=False)
+    monkeypatch.setattr(coder, "ChatOpenAI", lambda *args, **kwargs: None, raising=False)
+    monkeypatch.setattr(coder, "code", full_generation)
+    return calls
+
+
+def patched_with(monkeypatch, result):
+    def invoke(model, messages, schema, stage):
+        assert schema is CodePatch and stage == "patch"
+        if isinstance(result, Exception):
+            raise result
+        return result, []
+
+    monkeypatch.setattr(coder, "invoke_structured", invoke)
+
+
+def test_apply_edits():
+    assert apply_edits("a b c", [CodeEdit(search="b", replace="x"), CodeEdit(search="x c", replace="y")]) == "a y"
+    for search in ("missing", " ", ""):
+        with pytest.raises(ValueError):
+            apply_edits("a b c", [CodeEdit(search=search, replace="x")])
+
+
+def test_small_valid_edits_are_applied(monkeypatch, generate):
+    edit = CodeEdit(search='amountIn: "1"', replace='amountIn: "2.5"')
+    patched_with(monkeypatch, CodePatch(edits=[edit], interval="rate(10 minutes)"))
+    result = patch_code("swap 2.5 KDA every 10 minutes", PREVIOUS, "rate(5 minutes)")
+    assert result["code"] == PREVIOUS.replace('amountIn: "1"', 'amountIn: "2.5"')
+    assert result["interval"] == "rate(10 minutes)"
+    assert result["patch"]["mode"] == "patch" and result["patch"]["edits"] == 1
+    assert generate == []
+
+
+@pytest.mark.parametrize("result,reason", [
+    (CodePatch(edits=[CodeEdit(search="not in the code", replace="x")], interval="rate(5 minutes)"), "found 0 times"),
+    (CodePatch(edits=[CodeEdit(search=PREVIOUS, replace=SWAP)], interval="rate(5 minutes)"), "diff too large"),
+    (CodePatch(edits=[CodeEdit(search=SWAP, replace="")], interval="rate(5 minutes)"), "failed validation"),
+    (CodePatch(edits=[], interval="every 5 minutes"), "failed validation"),
+    (StructuredOutputError("no tool call", "{}"), "no tool call"),
+])
+def test_unusable_patches_fall_back_to_full_generation(monkeypatch, generate, result, reason):
+    patched_with(monkeypatch, result)
+    response = patch_code("change it", PREVIOUS, "rate(5 minutes)")
+    assert response["code"] == "regenerated"
+    assert response["patch"]["mode"] == "full"
+    assert reason in response["patch"]["fallback_reason"]
+    # The full generation is told what the agent currently runs
+    assert len(generate) == 1
+    assert generate[0].startswith("change it") and PREVIOUS in generate[0] and "rate(5 minutes)" in generate[0]
@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime, timezone
+
+from price_feed import PriceFeed, PriceSnapshot, QuoteKey, _normalize_amount, extract_quote_keys
+from scheduler import AgentScheduler, ScheduledAgent, Tick
+
+
+class FakeClient:
+    """Quote client answering with the request's amount, or an error for unknown tokens."""
+
+    def __init__(self):
+        self.bodies = []
+
+    async def aquote(self, body):
+        self.bodies.append(body)
+        if body["tokenOutAddress"] == "missing.token":
+            return {"error": "Bad Request: unknown token"}
+        return {"amountOut": body.get("amountIn", "0")}
+
+
+def make_feed():
+    client = FakeClient()
+    return PriceFeed(client=client), client.bodies
+
+
+def test_quote_keys_normalize_amounts_and_chain():
+    assert QuoteKey.create("coin", "arkade.token", 2, amountIn="1.50") == QuoteKey.create(
+        "coin", "arkade.token", "2", amountIn=1.5)
+    assert QuoteKey.create("coin", "arkade.token", amountIn="10").id == "coin|arkade.token|2|10|"
+    assert QuoteKey.create("coin", "arkade.token", amountOut=0.5).body() == {
+        "tokenInAddress": "coin", "tokenOutAddress": "arkade.token", "chainId": "2", "amountOut": "0.5",
+    }
+
+
+def test_amounts_are_formatted_like_javascript():
+    # String(Number(x)) in node
+    cases = {
+        "10": "10", "2.50": "2.5", 0.1: "0.1", -0.0: "0", "0.00001": "0.00001", 1e-6: "0.000001",
+        1e-7: "1e-7", -2e-9: "-2e-9", 1e16: "10000000000000000", 123456789012345680000: "123456789012345680000",
+        1e21: "1e+21", 1.5e21: "1.5e+21",
+    }
+    assert {value: _normalize_amount(value) for value in cases} == cases
+
+
+def test_extract_quote_keys_from_literal_calls():
+    code = """
+    const a = await quote({ tokenInAddress: 'coin', tokenOutAddress: "arkade.token", amountIn: 1, chainId: '1' });
+    const b = await quote({ tokenInAddress: 'coin', tokenOutAddress: 'arkade.token', amountOut: '2.0' });
+    const c = await quote({ tokenInAddress: 'coin', tokenOutAddress: token, amountIn: '1' });
+    const d = await quote({ tokenInAddress: 'coin', tokenOutAddress: 'arkade.token', amountIn: '1', amountOut: '1' });
+    const e = await quote(params);
+    """
+    assert extract_quote_keys(code) == [
+        QuoteKey("coin", "arkade.token", "1", "1", ""),
+        QuoteKey("coin", "arkade.token", "2", "", "2"),
+    ]
+    assert extract_quote_keys(None) == []
+
+
+def test_snapshot_fetches_each_distinct_quote_once():
+    feed, bodies = make_feed()
+    kda = QuoteKey.create("coin", "arkade.token", amountIn="1")
+    missing = QuoteKey.create("coin", "missing.token", amountIn="1")
+    snapshot = asyncio.run(feed.snapshot([kda, QuoteKey.create("coin", "arkade.token", amountIn=1.0), missing, kda]))
+
+    assert len(bodies) == 2
+    assert feed.stats == {"ticks": 1, "requested": 4, "fetched": 2, "errors": 1}
+    assert snapshot.get(kda) == {"amountOut": "1"}
+    # Failed and unknown quotes fall through to a live request in the agent
+    assert snapshot.get(missing) is None
+    assert snapshot.get(QuoteKey.create("coin", "arkade.token", amountIn="2")) is None
+    assert snapshot.to_event()["quotes"] == {kda.id: {"amountOut": "1"}}
+
+
+def test_agents_on_a_tick_share_one_snapshot():
+    feed, bodies = make_feed()
+    code = "const q = await quote({ tokenInAddress: 'coin', tokenOutAddress: 'arkade.token', amountIn: '1' });"
+    seen = []
+
+    async def run(agent, tick):
+        seen.append(tick.prices)
+        return tick.prices.get(agent.metadata["quotes"][0])
+
+    async def fire():
+        scheduler = AgentScheduler(max_jitter=0, before_tick=feed.prepare_tick)
+        agents = [ScheduledAgent(f"agent-{i}", "rate(1 minute)", run, metadata={"code": code}) for i in range(3)]
+        first = await scheduler.fire(Tick(due_at=datetime.now(timezone.utc), agents=agents))
+        second = await scheduler.fire(Tick(due_at=datetime.now(timezone.utc), agents=agents))
+        return first, second
+
+    first, second = asyncio.run(fire())
+    assert first == second == [{"amountOut": "1"}] * 3
+    assert isinstance(seen[0], PriceSnapshot)
+    assert seen[0] is seen[1] is seen[2] and seen[3] is not seen[0]
+    # One upstream call per tick, not per agent
+    assert len(bodies) == 2
@@ -0,0 +1,123 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from scheduler import AgentScheduler, CronSchedule, RateSchedule, ScheduledAgent, parse_schedule
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("expression,seconds", [
+    ("rate(1 minute)", 60),
+    ("rate(5 minutes)", 300),
+    ("rate( 2 hours )", 7200),
+    ("rate(1 day)", 86400),
+])
+def test_rate_expressions(expression, seconds):
+    schedule = parse_schedule(expression)
+    assert isinstance(schedule, RateSchedule)
+    assert schedule.period.total_seconds() == seconds
+
+
+@pytest.mark.parametrize("expression", [
+    "rate(0 minutes)", "rate(1 minutes)", "rate(5 minute)", "rate(30 seconds)", "rate(5 weeks)",
+    "cron(0 12 * * *)", "cron(0 12 * * MON *)", "cron(0 12 ? * ? *)", "cron(60 * * * ? *)",
+    "cron(0 24 * * ? *)", "cron(0 12 L * ? *)", "cron(0 12 ? * 2#1 *)", "cron(*/0 * * * ? *)",
+    "cron(0 12 10-5 * ? *)", "every 5 minutes", "", None,
+])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        parse_schedule(expression)
+
+
+def test_rate_fires_on_period_boundaries():
+    schedule = parse_schedule("rate(5 minutes)")
+    assert schedule.next_after(utc(2024, 1, 1, 12, 3, 20)) == utc(2024, 1, 1, 12, 5)
+    # Strictly after: a boundary moves on to the next one
+    assert schedule.next_after(utc(2024, 1, 1, 12, 5)) == utc(2024, 1, 1, 12, 10)
+
+
+def test_cron_fields():
+    schedule = parse_schedule("cron(0/15 9-17 ? JAN-MAR MON-FRI 2024,2025)")
+    assert isinstance(schedule, CronSchedule)
+    assert schedule.minutes == {0, 15, 30, 45}
+    assert schedule.hours == set(range(9, 18))
+    assert schedule.days_of_month is None
+    assert schedule.months == {1, 2, 3}
+    assert schedule.days_of_week == {2, 3, 4, 5, 6}
+    assert schedule.years == {2024, 2025}
+
+
+@pytest.mark.parametrize("expression,moment,expected", [
+    ("cron(0 12 * * ? *)", utc(2024, 1, 1, 11, 59, 30), utc(2024, 1, 1, 12, 0)),
+    ("cron(0 12 * * ? *)", utc(2024, 1, 1, 12, 0), utc(2024, 1, 2, 12, 0)),
+    ("cron(*/10 * * * ? *)", utc(2024, 1, 1, 12, 0, 1), utc(2024, 1, 1, 12, 10)),
+    # 2024-01-01 is a Monday; EventBridge numbers Sunday 1 .. Saturday 7
+    ("cron(30 8 ? * SAT *)", utc(2024, 1, 1), utc(2024, 1, 6, 8, 30)),
+    ("cron(0 0 ? * 1 *)", utc(2024, 1, 1), utc(2024, 1, 7, 0, 0)),
+    ("cron(0 0 31 * ? *)", utc(2024, 2, 1), utc(2024, 3, 31, 0, 0)),
+    ("cron(0 0 29 FEB ? *)", utc(2024, 3, 1), utc(2028, 2, 29, 0, 0)),
+    ("cron(15 6 1 * ? 2026)", utc(2024, 5, 5), utc(2026, 1, 1, 6, 15)),
+    ("cron(0 0 1 1 ? *)", utc(2024, 12, 31, 23, 59), utc(2025, 1, 1, 0, 0)),
+])
+def test_cron_next_fire(expression, moment, expected):
+    assert parse_schedule(expression).next_after(moment) == expected
+
+
+def test_cron_that_never_fires():
+    with pytest.raises(ValueError):
+        parse_schedule("cron(0 0 30 FEB ? *)").next_after(utc(2024, 1, 1))
+    with pytest.raises(ValueError):
+        parse_schedule("cron(0 0 1 1 ? 2020)").next_after(utc(2024, 1, 1))
+
+
+async def noop(agent, tick):
+    return agent.agent_id
+
+
+def test_pop_due_groups_agents_by_due_time_and_reschedules():
+    scheduler = AgentScheduler(max_jitter=0)
+    start = utc(2024, 1, 1, 12, 0, 30)
+    for agent_id, interval in [("a", "rate(1 minute)"), ("b", "rate(1 minute)"), ("c", "rate(5 minutes)")]:
+        scheduler.add(ScheduledAgent(agent_id, interval, noop), now=start)
+
+    assert scheduler.pop_due(utc(2024, 1, 1, 12, 0, 59)) == []
+    ticks = scheduler.pop_due(utc(2024, 1, 1, 12, 1))
+    assert [(t.due_at, sorted(a.agent_id for a in t.agents)) for t in ticks] == [(utc(2024, 1, 1, 12, 1), ["a", "b"])]
+
+    scheduler.remove("b")
+    ticks = scheduler.pop_due(utc(2024, 1, 1, 12, 5))
+    assert [(t.due_at, [a.agent_id for a in t.agents]) for t in ticks] == [
+        (utc(2024, 1, 1, 12, 2), ["a"]),
+        (utc(2024, 1, 1, 12, 5), ["c"]),
+    ]
+    # A late pop reschedules from now, not from the missed due time
+    assert scheduler.stats()["next_due"] == utc(2024, 1, 1, 12, 6).isoformat()
+
+
+def test_overlapping_runs_are_skipped():
+    release = None
+
+    async def slow(agent, tick):
+        await release.wait()
+        return "done"
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        scheduler = AgentScheduler(max_jitter=0)
+        agent = ScheduledAgent("a", "rate(1 minute)", slow)
+        scheduler.add(agent, now=utc(2024, 1, 1))
+        first = asyncio.create_task(scheduler.fire(scheduler.pop_due(utc(2024, 1, 1, 0, 1))[0]))
+        await asyncio.sleep(0)
+        second = await scheduler.fire(scheduler.pop_due(utc(2024, 1, 1, 0, 2))[0])
+        release.set()
+        return await first, second, scheduler.stats()
+
+    first, second, stats = asyncio.run(run())
+    assert first == ["done"]
+    assert second == [None]
+    assert stats["skipped_overlaps"] == 1
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from pydantic import BaseModel
+
+from structured import StructuredOutputError, invoke_structured
+
+
+class Answer(BaseModel):
+    """Answer the question."""
+    text: str
+    score: int
+
+
+class ScriptedModel:
+    """Chat model returning scripted responses and recording what it was sent."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+        self.bound = None
+
+    def bind(self, **kwargs):
+        self.bound = kwargs
+        return self
+
+    def invoke(self, messages, **kwargs):
+        self.calls.append(messages)
+        return self.responses.pop(0)
+
+
+def tool_call(arguments, call_id="call_1"):
+    return AIMessage(content="", additional_kwargs={"tool_calls": [
+        {"id": call_id, "type": "function", "function": {"name": "Answer", "arguments": json.dumps(arguments)}},
+    ]})
+
+
+def test_forced_function_call_is_parsed():
+    model = ScriptedModel(tool_call({"text": "hi", "score": 3}))
+    parsed, responses = invoke_structured(model, [HumanMessage(content="q")], Answer, stage="test")
+    assert parsed == Answer(text="hi", score=3)
+    assert len(responses) == 1
+    assert model.bound["tool_choice"] == {"type": "function", "function": {"name": "Answer"}}
+
+
+def test_plain_json_answers_are_accepted():
+    model = ScriptedModel(AIMessage(content='```json\n{"text": "hi", "score": 1}\n```'))
+    parsed, _ = invoke_structured(model, [HumanMessage(content="q")], Answer, stage="test")
+    assert parsed.score == 1
+
+
+def test_invalid_output_is_repaired_once():
+    model = ScriptedModel(tool_call({"text": "hi"}), tool_call({"text": "hi", "score": 2}, call_id="call_2"))
+    parsed, responses = invoke_structured(model, [HumanMessage(content="q")], Answer, stage="test")
+    assert parsed.score == 2
+    assert len(responses) == 2
+
+    # The repair request answers the failed tool call with the validation error
+    repair = model.calls[1]
+    assert repair[:2] == [HumanMessage(content="q"), responses[0]]
+    assert isinstance(repair[2], ToolMessage) and repair[2].tool_call_id == "call_1"
+    assert "score" in repair[2].content and "`Answer`" in repair[2].content
+
+
+def test_text_answers_are_repaired_with_a_human_message():
+    model = ScriptedModel(AIMessage(content="Sure! Here you go."), tool_call({"text": "ok", "score": 0}))
+    invoke_structured(model, [HumanMessage(content="q")], Answer, stage="test")
+    assert isinstance(model.calls[1][-1], HumanMessage)
+
+
+def test_failed_repair_raises_with_the_last_response():
+    model = ScriptedModel(tool_call({"text": "hi"}), tool_call({"score": "many"}))
+    with pytest.raises(StructuredOutputError) as raised:
+        invoke_structured(model, [HumanMessage(content="q")], Answer, stage="test")
+    assert json.loads(raised.value.raw_response) == {"score": "many"}
+    assert not model.responses
@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+
+SERVICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in a fresh interpreter: the service's `api` module would clash with kadena-ai's, and the
+# environment must not have OPENAI_API_KEY when the modules are first imported
+SCRIPT = """
+import json, sys
+sys.path[:0] = [sys.argv[1], sys.argv[2]]
+from fastapi.testclient import TestClient
+import api
+
+with TestClient(api.app) as client:
+    backtest = client.post("/backtest", json={"prices": "prices.csv", "strategies": [{"buy_amount": 1}]})
+    print(json.dumps({
+        "live": client.get("/health/live").status_code,
+        "health": client.get("/").status_code,
+        "metrics": client.get("/metrics").status_code,
+        "backtest": backtest.status_code,
+        "bars": backtest.json().get("bars"),
+    }))
+"""
+
+
+def test_serves_without_openai_key(tmp_path):
+    (tmp_path / "prices.csv").write_text("close\n1.0\n1.1\n0.9\n")
+    env = {k: v for k, v in os.environ.items() if k not in ("OPENAI_API_KEY", "API_KEY")}
+    env.update(BACKTEST_DATA_DIR=str(tmp_path), LOG_FILE="", LOG_LEVEL="WARNING")
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT, SERVICE, os.path.dirname(SERVICE)],
+        cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    codes = json.loads(result.stdout.strip().splitlines()[-1])
+    assert codes == {"live": 200, "health": 200, "metrics": 200, "backtest": 200, "bars": 3}
@@ -0,0 +1,125 @@
+import pytest
+
+from validator import CodeValidator
+
+BASELINE_JS = """
+[CODE]
+async function baselineFunction() {
+  const keys = getKeys();
+  const balances = await getBalances(keys.publicKey);
+  let transaction;
+  // agent code
+  console.log(transaction);
+  const signed = signTransaction(transaction, keys);
+  return submitTransaction(signed);
+}
+[/CODE]
+"""
+
+TOKENS_YAML = """
+mainnet:
+  coin: {symbol: KDA}
+  arkade.token: {symbol: ARKD}
+blacklist:
+  - scam.token
+"""
+
+SWAP = "swap({ tokenInAddress: 'coin', tokenOutAddress: 'arkade.token', account: keys.account, chainId: '2', amountIn: '1' })"
+
+
+def agent(body):
+    return f"""async function baselineFunction() {{
+  const keys = getKeys();
+  const balances = await getBalances(keys.publicKey);
+  let transaction;
+  {body}
+  const signed = signTransaction(transaction, keys);
+  return submitTransaction(signed);
+}}"""
+
+
+@pytest.fixture(scope="module")
+def validator():
+    return CodeValidator(BASELINE_JS, TOKENS_YAML)
+
+
+def test_valid_code(validator):
+    code = agent(f"""
+  // quote first
+  const q = await quote({{ tokenInAddress: "coin", tokenOutAddress: "arkade.token", chainId: "2", amountIn: "1" }});
+  const helper = (x) => parseFloat(x);
+  if (helper(q.amountOut) > 50) {{
+    transaction = await {SWAP};
+  }}""")
+    report = validator.validate(code, "rate(5 minutes)")
+    assert report.ok, report.format()
+
+
+def test_formatting_changes_keep_the_skeleton(validator):
+    code = agent(f"transaction = await {SWAP};").replace("  ", "    ").replace("keys;", "keys ;")
+    assert validator.validate(code, "rate(1 hour)").ok
+
+
+def test_changed_skeleton(validator):
+    code = agent(f"transaction = await {SWAP};").replace("const signed = signTransaction(transaction, keys);", "")
+    errors = validator.validate(code, "rate(5 minutes)").errors
+    assert any("skeleton" in error and "signTransaction" in error for error in errors)
+
+
+def test_transaction_must_be_assigned(validator):
+    code = agent(f"await {SWAP};").replace("let transaction;", "// let transaction;")
+    errors = validator.validate(code, "rate(5 minutes)").errors
+    assert any("`transaction` is never assigned" in error for error in errors)
+
+
+def test_undefined_calls_are_reported_once(validator):
+    code = agent("transaction = fetchPrice('x') || fetchPrice('y'); eval('1');")
+    errors = [e for e in validator.validate(code, "rate(5 minutes)").errors if "disallowed" in e]
+    assert len(errors) == 2
+    assert "`fetchPrice()`" in errors[0] and "`eval()`" in errors[1]
+
+
+@pytest.mark.parametrize("call,message", [
+    ("swap({ tokenInAddress: 'coin', tokenOutAddress: 'arkade.token', chainId: '2', amountIn: '1' })",
+     "missing required parameters: ['account']"),
+    ("swap({ tokenInAddress: 'coin', tokenOutAddress: 'arkade.token', account: 'k:a', chainId: '2', amountIn: '1', "
+     "amountOut: '2' })", "needs exactly one of ['amountIn', 'amountOut']"),
+    ("transfer({ tokenAddress: 'coin', sender: 'k:a', receiver: 'k:b', amount: '1', chainId: '2', memo: 'x' })",
+     "got unknown parameters: ['memo']"),
+])
+def test_transaction_parameters(validator, call, message):
+    errors = validator.validate(agent(f"transaction = await {call};"), "rate(5 minutes)").errors
+    assert any(message in error for error in errors), errors
+
+
+def test_parameters_from_variables_or_spreads_are_not_checked(validator):
+    code = agent("const params = { amountIn: '1' };\n  transaction = await swap(params);\n"
+                 "  transaction = await swap({ ...params, chainId: '2' });")
+    assert validator.validate(code, "rate(5 minutes)").ok
+
+
+def test_nested_values_are_not_parameters(validator):
+    call = ("transfer({ tokenAddress: 'coin', sender: 'k:a', receiver: 'k:b', amount: String(1), chainId: '2', "
+            "meta: { memo: 'x, y: 1' } })")
+    assert validator.validate(agent(f"transaction = await {call};"), "rate(5 minutes)").ok
+
+
+def test_tokens(validator):
+    code = agent("transaction = await swap({ tokenInAddress: 'coin', tokenOutAddress: 'scam.token', account: 'k:a', "
+                 "chainId: '2', amountIn: '1' });\n  await quote({ tokenInAddress: `fake.token`, "
+                 "tokenOutAddress: \"coin\", chainId: '2', amountOut: '1' });")
+    errors = validator.validate(code, "rate(5 minutes)").errors
+    assert errors == ["tokenInAddress 'fake.token' is not in the token list",
+                      "tokenOutAddress 'scam.token' is blacklisted"]
+
+
+def test_other_networks_have_their_own_token_list():
+    validator = CodeValidator(BASELINE_JS, TOKENS_YAML, network="testnet04")
+    errors = validator.validate(agent(f"transaction = await {SWAP};"), "rate(5 minutes)").errors
+    assert "tokenInAddress 'coin' is not in the token list" in errors
+
+
+def test_invalid_interval(validator):
+    errors = validator.validate(agent(f"transaction = await {SWAP};"), "every 5 minutes").errors
+    assert len(errors) == 1 and errors[0].startswith("interval: ")
+    assert validator.validate(agent(f"transaction = await {SWAP};"), "every 5 minutes").format().startswith("- interval")
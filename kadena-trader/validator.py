@@ -0,0 +1,233 @@
+import re
+from typing import List, Optional, Set, Tuple
+
+import yaml
+
+from scheduler import parse_schedule
+
+# Parameters of the pre-defined transaction functions (see TRANSACTIONS_CODE in coder.py)
+TRANSACTION_PARAMS = {
+    "transfer": {
+        "required": {"tokenAddress", "sender", "receiver", "amount", "chainId"},
+        "optional": {"meta", "gasLimit", "gasPrice", "ttl"},
+        "one_of": None,
+    },
+    "swap": {
+        "required": {"tokenInAddress", "tokenOutAddress", "account", "chainId"},
+        "optional": {"slippage"},
+        "one_of": ("amountIn", "amountOut"),
+    },
+    "quote": {
+        "required": {"tokenInAddress", "tokenOutAddress", "chainId"},
+        "optional": set(),
+        "one_of": ("amountIn", "amountOut"),
+    },
+}
+
+TOKEN_PARAMS = ("tokenAddress", "tokenInAddress", "tokenOutAddress")
+
+# Helpers defined alongside baselineFunction in baseline.js
+BASELINE_FUNCTIONS = {"getKeys", "getBalances", "getBalance", "signTransaction", "submitTransaction"}
+
+JS_GLOBALS = {
+    "parseFloat", "parseInt", "Number", "String", "Boolean", "BigInt", "Error", "Date",
+    "Array", "Object", "Promise", "isNaN", "isFinite", "setTimeout",
+}
+
+JS_KEYWORDS = {
+    "if", "for", "while", "switch", "catch", "function", "return", "typeof", "await",
+    "async", "new", "do", "else", "throw", "in", "of", "delete", "void", "instanceof",
+}
+
+CALL_PATTERN = re.compile(r"(?<![\w$.])([A-Za-z_$][\w$]*)\s*\(")
+DECLARATION_PATTERN = re.compile(
+    r"\bfunction\s+([A-Za-z_$][\w$]*)|\b(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s*)?(?:function\b|\([^()]*\)\s*=>|[A-Za-z_$][\w$]*\s*=>)"
+)
+TRANSACTION_DECLARED_PATTERN = re.compile(r"\b(?:let|const|var)\s+transaction\b|(?<![\w$.])transaction\s*=(?!=)")
+STRING_VALUE_PATTERN = r"{key}\s*:\s*(?:'([^']*)'|\"([^\"]*)\"|`([^`$]*)`)"
+COMMENT_PATTERN = re.compile(r"//[^\n]*|/\*.*?\*/", re.DOTALL)
+
+
+def _normalize(code: str) -> str:
+    """Strip comments, whitespace and trailing commas and unify quotes so formatting changes don't count as edits."""
+    code = re.sub(r"\s+", "", COMMENT_PATTERN.sub("", code)).replace("'", '"')
+    return re.sub(r",(?=[}\])])", "", code)
+
+
+def _skeleton_statements(baseline_js: str) -> List[str]:
+    """The statements of BASELINE_JS that generated code must keep, in order."""
+    body = baseline_js.split("[CODE]")[-1].split("[/CODE]")[0]
+    lines = [line for line in body.splitlines() if not line.strip().startswith("console.")]
+    statements = re.split(r"[;{}]", _normalize("\n".join(lines)))
+    return [statement for statement in statements if len(statement) > 2]
+
+
+def _call_arguments(code: str, start: int) -> Optional[str]:
+    """Return the text between the parentheses opened at `start`, honoring nesting and strings."""
+    depth, quote = 0, None
+    for i in range(start, len(code)):
+        char = code[i]
+        if quote:
+            if char == quote and code[i - 1] != "\\":
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                return code[start + 1:i]
+    return None
+
+
+def _top_level_keys(literal: str) -> Set[str]:
+    """Keys of a JS object literal, ignoring nested objects, arrays and strings."""
+    flat, depth, quote = [], 0, None
+    for char in literal:
+        if quote:
+            if char == quote:
+                quote = None
+            continue
+        if char in "'\"`":
+            quote = char
+            flat.append("0")
+        elif char in "{[(":
+            depth += 1
+            if depth == 1 and char == "{":
+                flat.append("{")
+        elif char in "}])":
+            depth -= 1
+        elif depth == 1:
+            flat.append(char)
+    keys = set()
+    for entry in "".join(flat).lstrip("{").split(","):
+        entry = entry.strip()
+        if entry.startswith("..."):
+            keys.add(entry)
+            continue
+        name = entry.split(":", 1)[0].strip()
+        if re.fullmatch(r"[A-Za-z_$][\w$]*", name):
+            keys.add(name)
+    return keys
+
+
+class ValidationReport:
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def format(self) -> str:
+        return "\n".join(f"- {error}" for error in self.errors)
+
+
+class CodeValidator:
+    """
+    Static checks for generated agent code, run before the code is returned.
+
+    Everything derived from BASELINE_JS and the token list is compiled once,
+    so each validation is a handful of regex passes over the generated code.
+    """
+
+    def __init__(self, baseline_js: str, tokens_yaml: str, network: str = "mainnet"):
+        self.skeleton = _skeleton_statements(baseline_js)
+        tokens = yaml.safe_load(tokens_yaml)
+        self.tokens: Set[str] = set(tokens.get(network) or {})
+        self.blacklist: Set[str] = set(tokens.get("blacklist") or [])
+        self.allowed_calls = set(TRANSACTION_PARAMS) | BASELINE_FUNCTIONS | JS_GLOBALS
+        self.token_patterns = {key: re.compile(STRING_VALUE_PATTERN.format(key=key)) for key in TOKEN_PARAMS}
+
+    def validate(self, code: str, interval: str) -> ValidationReport:
+        """
+        Validate generated code and its schedule.
+
+        Returns:
+            ValidationReport listing every problem found (empty when the code is valid)
+        """
+        errors: List[str] = []
+        errors.extend(self._check_skeleton(code))
+        errors.extend(self._check_calls(code))
+        errors.extend(self._check_tokens(code))
+        try:
+            parse_schedule(interval)
+        except ValueError as e:
+            errors.append(f"interval: {str(e)}")
+        return ValidationReport(errors)
+
+    def _check_skeleton(self, code: str) -> List[str]:
+        normalized = _normalize(code)
+        errors = []
+        position = 0
+        for statement in self.skeleton:
+            found = normalized.find(statement, position)
+            if found < 0:
+                errors.append(f"baselineFunction skeleton changed: missing or reordered `{statement}`")
+                continue
+            position = found + len(statement)
+        if not TRANSACTION_DECLARED_PATTERN.search(COMMENT_PATTERN.sub("", code)):
+            errors.append("`transaction` is never assigned; it must hold the transaction to sign")
+        return errors
+
+    def _check_calls(self, code: str) -> List[str]:
+        code = COMMENT_PATTERN.sub("", code)
+        declared = {name for match in DECLARATION_PATTERN.finditer(code) for name in match.groups() if name}
+        errors = []
+        seen_unknown = set()
+
+        for match in CALL_PATTERN.finditer(code):
+            name = match.group(1)
+            if name in JS_KEYWORDS or name in declared or name == "baselineFunction":
+                continue
+            if name not in self.allowed_calls:
+                if name not in seen_unknown:
+                    seen_unknown.add(name)
+                    errors.append(f"Call to undefined or disallowed function `{name}()`; only transfer, swap and quote are available")
+                continue
+            if name not in TRANSACTION_PARAMS:
+                continue
+
+            arguments = _call_arguments(code, match.end() - 1)
+            if arguments is None or not arguments.strip().startswith("{"):
+                # Built from a variable; parameters can't be checked statically
+                continue
+            keys = _top_level_keys(arguments.strip())
+            if any(key.startswith("...") for key in keys):
+                continue
+            errors.extend(self._check_params(name, keys))
+
+        return errors
+
+    @staticmethod
+    def _check_params(name: str, keys: Set[str]) -> List[str]:
+        spec = TRANSACTION_PARAMS[name]
+        errors = []
+        missing = sorted(spec["required"] - keys)
+        if missing:
+            errors.append(f"{name}() is missing required parameters: {missing}")
+        allowed = spec["required"] | spec["optional"] | set(spec["one_of"] or ())
+        unknown = sorted(keys - allowed)
+        if unknown:
+            errors.append(f"{name}() got unknown parameters: {unknown}")
+        if spec["one_of"]:
+            given = [key for key in spec["one_of"] if key in keys]
+            if len(given) != 1:
+                errors.append(f"{name}() needs exactly one of {list(spec['one_of'])}")
+        return errors
+
+    def _check_tokens(self, code: str) -> List[str]:
+        errors = []
+        seen: Set[Tuple[str, str]] = set()
+        for key, pattern in self.token_patterns.items():
+            for match in pattern.finditer(code):
+                address = next(group for group in match.groups() if group is not None)
+                if (key, address) in seen:
+                    continue
+                seen.add((key, address))
+                if address in self.blacklist:
+                    errors.append(f"{key} '{address}' is blacklisted")
+                elif address not in self.tokens:
+                    errors.append(f"{key} '{address}' is not in the token list")
+        return errors
@@ -0,0 +1 @@
+"""Modules shared by the kadena-ai and kadena-trader services."""
@@ -0,0 +1,292 @@
+"""
+Adaptive admission control for expensive routes.
+
+Each limited route gets a concurrency limit that adapts to observed latency
+(AIMD: grow by one per limit's worth of fast completions, shrink by
+ADMISSION_BACKOFF when latency climbs past ADMISSION_LATENCY_TOLERANCE times
+the no-load baseline or the request failed with a 5xx). Requests over the
+limit wait in a bounded queue; when the queue is full or the wait takes too
+long they are rejected with 429/503 and a Retry-After header, instead of all
+piling up behind OpenAI rate limits and timing out together.
+
+Routes have a priority. While an interactive route has requests waiting,
+requests to expensive routes that can't start right away are shed instead
+of queued. Routes that aren't registered (health checks, metrics) are never
+limited.
+"""
+import asyncio
+import collections
+import logging
+import math
+import os
+import time
+from typing import Deque, Dict, Optional
+
+from fastapi import FastAPI
+from starlette.routing import get_route_path
+
+from kadena_common import metrics
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_CONTROL", "1") not in ("0", "false", "False")
+ADMISSION_INITIAL_LIMIT = float(os.getenv("ADMISSION_INITIAL_LIMIT", "8"))
+ADMISSION_MIN_LIMIT = float(os.getenv("ADMISSION_MIN_LIMIT", "1"))
+ADMISSION_MAX_LIMIT = float(os.getenv("ADMISSION_MAX_LIMIT", "64"))
+ADMISSION_EXPENSIVE_MAX_LIMIT = float(os.getenv("ADMISSION_EXPENSIVE_MAX_LIMIT", "8"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10"))
+ADMISSION_LATENCY_TOLERANCE = float(os.getenv("ADMISSION_LATENCY_TOLERANCE", "2.0"))
+ADMISSION_BACKOFF = float(os.getenv("ADMISSION_BACKOFF", "0.9"))
+
+INTERACTIVE = 0
+EXPENSIVE = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", EXPENSIVE: "expensive"}
+
+ADMISSION_LIMIT = metrics.gauge(
+    "kadena_admission_limit",
+    "Current adaptive concurrency limit per route",
+    ("route",),
+)
+ADMISSION_IN_FLIGHT = metrics.gauge(
+    "kadena_admission_in_flight",
+    "Requests currently admitted per route",
+    ("route",),
+)
+ADMISSION_QUEUED = metrics.gauge(
+    "kadena_admission_queued",
+    "Requests waiting for admission per route",
+    ("route",),
+)
+ADMISSION_REJECTED = metrics.counter(
+    "kadena_admission_rejected_total",
+    "Requests rejected by admission control (queue_full, queue_timeout, shed for higher priority traffic)",
+    ("route", "reason"),
+)
+
+
+class Rejected(Exception):
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdaptiveLimit:
+    """
+    AIMD concurrency limit driven by latency relative to a no-load baseline.
+
+    The baseline follows new minimums immediately and drifts slowly towards
+    typical latency, so it recovers if the upstream gets permanently slower.
+    """
+
+    def __init__(self, initial: float, min_limit: float, max_limit: float,
+                 tolerance: float = ADMISSION_LATENCY_TOLERANCE, backoff: float = ADMISSION_BACKOFF):
+        self.limit = max(min_limit, min(initial, max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.baseline: Optional[float] = None
+        self.average: Optional[float] = None
+        self._decreased_at = 0.0
+
+    def on_sample(self, seconds: float, failed: bool, in_flight: int) -> None:
+        self.average = seconds if self.average is None else 0.9 * self.average + 0.1 * seconds
+        if not failed:
+            if self.baseline is None or seconds < self.baseline:
+                self.baseline = seconds
+            else:
+                self.baseline += (seconds - self.baseline) * 0.01
+
+        if failed or seconds > self.baseline * self.tolerance:
+            # Back off at most once per typical request, not once per slow response
+            now = time.monotonic()
+            if now - self._decreased_at >= self.average:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._decreased_at = now
+        elif in_flight + 1 >= self.limit / 2:
+            # Only grow while the limit is actually being used
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+
+class RouteLimiter:
+    """Admission for one route: an adaptive limit in front of a bounded FIFO wait queue."""
+
+    def __init__(self, route: str, priority: int, limit: AdaptiveLimit,
+                 queue_size: int = ADMISSION_QUEUE_SIZE, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.route = route
+        self.priority = priority
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = collections.deque()
+        self._publish()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _publish(self) -> None:
+        ADMISSION_LIMIT.set(self.limit.limit, route=self.route)
+        ADMISSION_IN_FLIGHT.set(self.in_flight, route=self.route)
+        ADMISSION_QUEUED.set(len(self._waiters), route=self.route)
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue should have drained, at least 1."""
+        average = self.limit.average or 1.0
+        return max(1, math.ceil((len(self._waiters) + 1) * average / max(1.0, self.limit.limit)))
+
+    def _reject(self, status_code: int, reason: str) -> Rejected:
+        ADMISSION_REJECTED.inc(route=self.route, reason=reason)
+        return Rejected(status_code, reason, self.retry_after())
+
+    async def acquire(self, shed: bool = False) -> None:
+        """
+        Wait for a slot.
+
+        Args:
+            shed: Reject instead of queueing if no slot is free right away
+
+        Raises:
+            Rejected: 429 if the queue is full, 503 if shed or the wait timed out
+        """
+        if self.in_flight < self.limit.limit and not self._waiters:
+            self.in_flight += 1
+            self._publish()
+            return
+        if shed:
+            raise self._reject(503, "shed")
+        if len(self._waiters) >= self.queue_size:
+            raise self._reject(429, "queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._publish()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the wait timed out; hand the slot on
+                self._grant_next(release=True)
+            raise self._reject(503, "queue_timeout")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._grant_next(release=True)
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            waiter.cancel()
+            self._publish()
+
+    def _grant_next(self, release: bool = False) -> None:
+        if release:
+            self.in_flight -= 1
+        while self._waiters and self.in_flight < self.limit.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+        self._publish()
+
+    def release(self, seconds: float, failed: bool) -> None:
+        self.limit.on_sample(seconds, failed, self.in_flight)
+        self._grant_next(release=True)
+
+
+class AdmissionController:
+    """The limiters of one app, keyed by exact request path."""
+
+    def __init__(self):
+        self.limiters: Dict[str, RouteLimiter] = {}
+
+    def limit(self, route: str, priority: int = INTERACTIVE) -> RouteLimiter:
+        max_limit = ADMISSION_EXPENSIVE_MAX_LIMIT if priority == EXPENSIVE else ADMISSION_MAX_LIMIT
+        limiter = RouteLimiter(route, priority, AdaptiveLimit(ADMISSION_INITIAL_LIMIT, ADMISSION_MIN_LIMIT, max_limit))
+        self.limiters[route] = limiter
+        return limiter
+
+    def should_shed(self, limiter: RouteLimiter) -> bool:
+        """Whether a more important route has requests waiting."""
+        return any(other.queued for other in self.limiters.values() if other.priority < limiter.priority)
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        return {
+            route: {
+                "priority": PRIORITY_NAMES.get(limiter.priority, str(limiter.priority)),
+                "limit": round(limiter.limit.limit, 2),
+                "in_flight": limiter.in_flight,
+                "queued": limiter.queued,
+            }
+            for route, limiter in self.limiters.items()
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware admitting requests to limited routes; other paths pass straight through."""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        # Routes are matched by their path within the app, which differs from scope["path"] when
+        # the app is mounted under a prefix (see gateway/)
+        limiter = self.controller.limiters.get(get_route_path(scope)) if scope["type"] == "http" else None
+        if limiter is None or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await limiter.acquire(shed=self.controller.should_shed(limiter))
+        except Rejected as e:
+            logger.warning(f"Rejected {scope['path']} ({e.reason}), retry after {e.retry_after}s")
+            await _reject(send, e)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            limiter.release(time.perf_counter() - started, failed=status["code"] >= 500)
+
+
+async def _reject(send, rejected: Rejected) -> None:
+    body = ('{"detail": "Server is busy (%s). Please retry later."}' % rejected.reason).encode()
+    await send({
+        "type": "http.response.start",
+        "status": rejected.status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(rejected.retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def install_admission(app: FastAPI, routes: Dict[str, int]) -> AdmissionController:
+    """
+    Limit concurrency on `routes` (path -> INTERACTIVE or EXPENSIVE).
+
+    Install before CORS and the other middleware so it runs innermost:
+    rejections then carry CORS headers and show up in metrics and access logs.
+    Set ADMISSION_CONTROL=0 to disable.
+    """
+    controller = AdmissionController()
+    if not ADMISSION_ENABLED:
+        return controller
+    for route, priority in routes.items():
+        controller.limit(route, priority)
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+    return controller
@@ -0,0 +1,105 @@
+"""
+Kadena transaction API documentation.
+
+Shown to the models that turn user requests into API calls, and the source
+of the per-endpoint request models in kadena_client.py.
+"""
+
+API_DOCS = {
+
+    # Token transfer
+    "transfer": {
+        "description": "Transfer tokens from one account to another",
+        "required_params": [
+            "tokenAddress",  # Token contract address
+            "sender",        # Sender account
+            "receiver",      # Receiver account
+            "amount",        # Amount to transfer
+            "chainId"        # Chain ID (0-19)
+        ],
+        "optional_params": [
+            {"name": "meta", "description": "Additional metadata"},
+            {"name": "gasLimit", "description": "Gas limit for transaction"},
+            {"name": "gasPrice", "description": "Gas price for transaction"},
+            {"name": "ttl", "description": "Transaction time-to-live"}
+        ],
+        "endpoint": "/transfer"
+    },
+    
+    # Token swapping
+    "swap": {
+        "description": "Swap one token for another using Kaddex/EchoDEX",
+        "required_params": [
+            "tokenInAddress",  # Address of input token
+            "tokenOutAddress", # Address of output token
+            "account",         # Sender account
+            "chainId"          # Chain ID (0-19)
+        ],
+        "conditional_params": [
+            {"name": "amountIn", "description": "Amount to swap", "condition": "Either amountIn or amountOut must be provided"},
+            {"name": "amountOut", "description": "Desired output amount", "condition": "Either amountIn or amountOut must be provided"}
+        ],
+        "optional_params": [
+            {"name": "slippage", "description": "Maximum acceptable slippage"}
+        ],
+        "endpoint": "/swap"
+    },
+    
+    # Token quote
+    "quote": {
+        "description": "Get price quotes for swapping tokens",
+        "required_params": [
+            "tokenInAddress",  # Address of input token
+            "tokenOutAddress", # Address of output token
+            "chainId"          # Chain ID (0-19)
+        ],
+        "conditional_params": [
+            {"name": "amountIn", "description": "Input amount to get output quote", "condition": "Either amountIn or amountOut must be provided"},
+            {"name": "amountOut", "description": "Desired output amount to get input quote", "condition": "Either amountIn or amountOut must be provided"}
+        ],
+        "response": {
+            "amountIn": "Required input amount (when amountOut is provided)",
+            "amountOut": "Expected output amount (when amountIn is provided)",
+            "priceImpact": "Price impact percentage as a string"
+        },
+        "endpoint": "/quote"
+    },
+    
+    # NFT launch
+    "nft_launch": {
+        "description": "Launch a new NFT on the Kadena blockchain",
+        "required_params": [
+            "account",         # Sender account
+            "guard",           # Account guard
+            "mintTo",          # Recipient account
+            "uri",             # NFT metadata URI
+            "collectionId",     # Collection ID
+            "chainId"          # Chain ID (0-19)
+        ],
+        "optional_params": [
+            {"name": "precision", "description": "Token precision"},
+            {"name": "policy", "description": "NFT policy"},
+            {"name": "royalties", "description": "Royalty percentage"},
+            {"name": "royaltyRecipient", "description": "Royalty recipient"},
+            {"name": "name", "description": "NFT name"},
+            {"name": "description", "description": "NFT description"}
+        ],
+        "endpoint": "/nft/launch"
+    },
+    
+    # NFT collection
+    "nft_collection": {
+        "description": "Create a new NFT collection",
+        "required_params": [
+            "account",         # Sender account
+            "guard",           # Account guard
+            "name",            # Collection name
+            "chainId"          # Chain ID (0-19)
+        ],
+        "optional_params": [
+            {"name": "description", "description": "Collection description"},
+            {"name": "totalSupply", "description": "Maximum supply"}
+        ],
+        "endpoint": "/nft/collection"
+    }
+}
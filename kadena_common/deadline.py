@@ -0,0 +1,103 @@
+"""
+Per-request deadlines shared by every stage of a request.
+
+A handler opens a deadline with `deadline_scope()`; model and HTTP calls
+made while it is active take `timeout()` as their timeout, so the request as
+a whole can't outlive its budget. Optional stages check `can_afford()` and
+are skipped or degraded when the remaining budget is too short.
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from kadena_common import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEADLINE = float(os.getenv("REQUEST_DEADLINE_SECONDS", "30"))
+MAX_DEADLINE = float(os.getenv("REQUEST_MAX_DEADLINE_SECONDS", "120"))
+# Budget an optional model stage (formatting, error explanations) needs to be attempted
+OPTIONAL_STAGE_MIN_SECONDS = float(os.getenv("OPTIONAL_STAGE_MIN_SECONDS", "4"))
+
+DEGRADED_STAGES = metrics.counter(
+    "kadena_deadline_degraded_stages_total",
+    "Optional stages skipped because the request's remaining budget was too short",
+    ("stage",),
+)
+DEADLINES_EXCEEDED = metrics.counter(
+    "kadena_deadline_exceeded_total",
+    "Requests that ran out of budget before finishing",
+    ("stage",),
+)
+
+
+class DeadlineExceeded(Exception):
+    """The request's budget ran out before `stage` could start."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Request deadline exceeded before {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+
+current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float] = None) -> Iterator[Deadline]:
+    """
+    Give the calling context a deadline `seconds` from now.
+
+    Args:
+        seconds: Budget for the request; defaults to REQUEST_DEADLINE_SECONDS
+            and is capped at REQUEST_MAX_DEADLINE_SECONDS
+    """
+    deadline = Deadline(min(seconds or DEFAULT_DEADLINE, MAX_DEADLINE))
+    token = current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        current_deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request's budget, or None outside a deadline scope."""
+    deadline = current_deadline.get()
+    return deadline.remaining() if deadline is not None else None
+
+
+def timeout(default: float, stage: str = "upstream call") -> float:
+    """
+    Timeout for a call made now: `default`, shortened to the remaining budget.
+
+    Raises:
+        DeadlineExceeded: If the budget has already run out
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        DEADLINES_EXCEEDED.inc(stage=stage)
+        raise DeadlineExceeded(stage)
+    return min(default, left)
+
+
+def can_afford(stage: str, seconds: float = OPTIONAL_STAGE_MIN_SECONDS) -> bool:
+    """Whether an optional stage fits in the remaining budget; counts and logs the skip if not."""
+    left = remaining()
+    if left is None or left >= seconds:
+        return True
+    DEGRADED_STAGES.inc(stage=stage)
+    logger.info(f"Skipping {stage}: {left:.1f}s of budget left")
+    return False
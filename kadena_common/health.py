@@ -0,0 +1,161 @@
+import asyncio
+import datetime
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from kadena_common import metrics
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL_SECONDS", "30"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT_SECONDS", "5"))
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+
+UPSTREAM_UP = metrics.gauge(
+    "kadena_upstream_up",
+    "Whether the last background health check of an upstream succeeded (1) or failed (0)",
+    ("upstream",),
+)
+UPSTREAM_CHECK_LATENCY = metrics.gauge(
+    "kadena_upstream_health_check_latency_seconds",
+    "Latency of the last background health check of an upstream",
+    ("upstream",),
+)
+
+
+class HealthCheck:
+    """
+    A named upstream probe.
+
+    `probe` is a blocking callable that raises when the upstream is unhealthy;
+    it runs on a worker thread, never on the event loop. Only `critical`
+    checks affect readiness.
+    """
+
+    def __init__(self, name: str, probe: Callable[[], None], critical: bool = True):
+        self.name = name
+        self.probe = probe
+        self.critical = critical
+
+
+def http_probe(url: str, headers: Optional[Dict[str, str]] = None,
+               healthy_below: int = 500) -> Callable[[], None]:
+    """Probe that GETs `url` and fails on connection errors or a status >= `healthy_below`."""
+    session = requests.Session()
+
+    def probe() -> None:
+        response = session.get(url, headers=headers, timeout=HEALTH_CHECK_TIMEOUT)
+        if response.status_code >= healthy_below:
+            raise RuntimeError(f"HTTP {response.status_code}")
+
+    return probe
+
+
+def openai_probe(api_key: Optional[str]) -> Callable[[], None]:
+    """Probe that lists models, which also verifies the API key; it uses no tokens."""
+    return http_probe(f"{OPENAI_BASE_URL}/models", headers={"Authorization": f"Bearer {api_key}"}, healthy_below=400)
+
+
+def origin(url: str) -> str:
+    """The scheme and host of `url`, for probing a service whose API path only accepts POSTs."""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}/"
+
+
+class HealthMonitor:
+    """
+    Probes upstreams in the background and keeps the latest result of each.
+
+    Health endpoints read the cached snapshot, so probes from load balancers
+    cost nothing upstream and never wait on the network.
+    """
+
+    def __init__(self, checks: List[HealthCheck], interval: float = HEALTH_CHECK_INTERVAL,
+                 timeout: float = HEALTH_CHECK_TIMEOUT):
+        self.checks = checks
+        self.interval = interval
+        self.timeout = timeout
+        self.results: Dict[str, Dict[str, Any]] = {
+            check.name: {"status": "unknown", "latency_ms": None, "checked_at": None, "error": None}
+            for check in checks
+        }
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run_check(self, check: HealthCheck) -> None:
+        started = time.perf_counter()
+        error = None
+        try:
+            await asyncio.wait_for(asyncio.to_thread(check.probe), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            error = f"timed out after {self.timeout}s"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        latency = time.perf_counter() - started
+
+        previous = self.results[check.name]["status"]
+        status = "healthy" if error is None else "unhealthy"
+        self.results[check.name] = {
+            "status": status,
+            "latency_ms": round(latency * 1000, 1),
+            "checked_at": datetime.datetime.utcnow().isoformat(),
+            "error": error,
+        }
+        UPSTREAM_UP.set(1 if error is None else 0, upstream=check.name)
+        UPSTREAM_CHECK_LATENCY.set(latency, upstream=check.name)
+        if status != previous:
+            log = logger.info if error is None else logger.warning
+            log(f"Upstream {check.name} is {status}" + (f": {error}" if error else ""))
+
+    async def check_all(self) -> None:
+        await asyncio.gather(*(self._run_check(check) for check in self.checks))
+
+    async def _loop(self) -> None:
+        while True:
+            await self.check_all()
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    @property
+    def ready(self) -> bool:
+        return all(self.results[check.name]["status"] == "healthy" for check in self.checks if check.critical)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {name: dict(result) for name, result in self.results.items()}
+
+
+def install_health(app: FastAPI, monitor: HealthMonitor) -> None:
+    """
+    Run `monitor` for the app's lifetime and add liveness and readiness endpoints.
+
+    `GET /health/live` answers as long as the process serves requests;
+    `GET /health/ready` returns 503 until every critical upstream passed its
+    latest check.
+    """
+    app.add_event_handler("startup", monitor.start)
+    app.add_event_handler("shutdown", monitor.stop)
+
+    @app.get("/health/live", summary="Liveness probe")
+    async def liveness():
+        """The process is up and serving requests"""
+        return {"status": "ok"}
+
+    @app.get("/health/ready", summary="Readiness probe")
+    async def readiness():
+        """Whether every critical upstream passed its latest background check"""
+        body = {"status": "ready" if monitor.ready else "not ready", "dependencies": monitor.snapshot()}
+        return JSONResponse(body, status_code=200 if monitor.ready else 503)
@@ -0,0 +1,203 @@
+"""
+Idempotency-Key support for expensive POST routes.
+
+A request carrying an `Idempotency-Key` header is identified by the caller,
+the path and that key. While the first such request is running, identical
+retries wait for it and receive its response instead of re-running the LLM
+chain; once it completes, its response is replayed for IDEMPOTENCY_TTL_SECONDS.
+Reusing a key with a different body is rejected with 422, and a retry that
+arrives while the first request is running with a different body gets 409.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from fastapi import FastAPI
+from starlette.routing import get_route_path
+
+from kadena_common import metrics
+from kadena_common.quota import caller_id
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+# Responses that say nothing final about the request; a retry should run it again
+RETRYABLE_STATUSES = {408, 409, 425, 429}
+
+IDEMPOTENT_REQUESTS = metrics.counter(
+    "kadena_idempotent_requests_total",
+    "Requests with an Idempotency-Key by outcome (executed, joined, replayed, conflict)",
+    ("endpoint", "outcome"),
+)
+
+
+class _Response:
+    """A captured response: status, headers and the full body."""
+
+    def __init__(self):
+        self.status = 500
+        self.headers: List[Tuple[bytes, bytes]] = []
+        self.body = b""
+
+    def storable(self) -> bool:
+        return self.status < 500 and self.status not in RETRYABLE_STATUSES
+
+
+class _Entry:
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.done = asyncio.Event()
+        self.response: Optional[_Response] = None
+        self.expires_at = float("inf")
+
+
+class IdempotencyStore:
+    """In-flight and completed requests of one process, evicted by TTL and then oldest first."""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, str], _Entry]" = OrderedDict()
+        self._next_sweep = 0.0
+
+    def _evict(self, now: float) -> None:
+        if now >= self._next_sweep:
+            self._next_sweep = now + 1.0
+            for key in [key for key, entry in self._entries.items() if entry.expires_at <= now]:
+                del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            key = next((k for k, e in self._entries.items() if e.done.is_set()), None)
+            if key is None:
+                break
+            del self._entries[key]
+
+    def begin(self, key: Tuple[str, str, str], fingerprint: str) -> Tuple[_Entry, bool]:
+        """The entry for `key` and whether the caller owns it (must run the request)."""
+        now = time.monotonic()
+        self._evict(now)
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry, False
+        entry = self._entries[key] = _Entry(fingerprint)
+        return entry, True
+
+    def finish(self, key: Tuple[str, str, str], entry: _Entry, response: _Response) -> None:
+        entry.response = response
+        if response.storable():
+            entry.expires_at = time.monotonic() + self.ttl
+        else:
+            # Let joiners see the outcome, but don't replay it to later retries
+            self._entries.pop(key, None)
+        entry.done.set()
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware applying Idempotency-Key semantics to POSTs on the given paths."""
+
+    def __init__(self, app, paths: List[str], store: IdempotencyStore):
+        self.app = app
+        self.paths = set(paths)
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or get_route_path(scope) not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = next((v.decode("latin-1") for k, v in scope["headers"] if k == HEADER), None)
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await _send_error(send, 400, f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+            return
+
+        body = await _read_body(receive)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        key = (caller_id(scope), scope["path"], idempotency_key)
+        entry, owner = self.store.begin(key, fingerprint)
+
+        if not owner:
+            if entry.fingerprint != fingerprint:
+                IDEMPOTENT_REQUESTS.inc(endpoint=scope["path"], outcome="conflict")
+                status, detail = (422, "Idempotency-Key was already used with a different request body") \
+                    if entry.done.is_set() else (409, "A different request with this Idempotency-Key is in progress")
+                await _send_error(send, status, detail)
+                return
+            outcome = "replayed" if entry.done.is_set() else "joined"
+            IDEMPOTENT_REQUESTS.inc(endpoint=scope["path"], outcome=outcome)
+            await entry.done.wait()
+            await _replay(send, entry.response)
+            return
+
+        IDEMPOTENT_REQUESTS.inc(endpoint=scope["path"], outcome="executed")
+        response = _Response()
+        delivered = False
+
+        async def receive_body():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                response.status = message["status"]
+                response.headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                response.body += message.get("body", b"")
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, capture)
+        finally:
+            self.store.finish(key, entry, response)
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+async def _replay(send, response: _Response) -> None:
+    headers = [(k, v) for k, v in response.headers if k.lower() != b"content-length"]
+    headers += [(b"content-length", str(len(response.body)).encode()), (b"idempotent-replayed", b"true")]
+    await send({"type": "http.response.start", "status": response.status, "headers": headers})
+    await send({"type": "http.response.body", "body": response.body})
+
+
+async def _send_error(send, status: int, detail: str) -> None:
+    body = ('{"detail": "%s"}' % detail).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def install_idempotency(app: FastAPI, paths: List[str], store: Optional[IdempotencyStore] = None) -> IdempotencyStore:
+    """
+    Honour Idempotency-Key headers on POSTs to `paths`.
+
+    Install after admission control and quotas, so replays and joined
+    retries don't use up the caller's rate limit or a queue slot.
+    """
+    store = store or IdempotencyStore()
+    app.add_middleware(IdempotencyMiddleware, paths=paths, store=store)
+    return store
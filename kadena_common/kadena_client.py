@@ -0,0 +1,301 @@
+"""
+Client for the Kadena transaction API and the analysis API.
+
+The one implementation used by kadena-ai's agent tools, kadena-trader's
+price feed and the benchmarks. Request bodies are checked against typed
+per-endpoint models (built once, at import) before any HTTP call, so
+malformed tool arguments fail locally. Calls go through the process-wide
+pooled session and `call_upstream`, so they share connections, circuit
+breakers, retries, the request deadline and traffic record/replay.
+
+Failures are returned the way the agent's tools report them, as a dict with
+an "error" message (and "unavailable": True while the upstream's circuit is
+open), rather than raised. Methods block; the `a`-prefixed coroutines run
+them on a worker thread for async callers.
+"""
+import asyncio
+import logging
+import os
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Annotated, Any, Dict, Optional, Tuple, Type, Union
+
+import requests
+from pydantic import (
+    AfterValidator, BaseModel, BeforeValidator, ConfigDict, ValidationError, ValidationInfo,
+    create_model, model_validator,
+)
+
+from kadena_common import deadline
+from kadena_common.api_docs import API_DOCS
+from kadena_common.upstream_http import UPSTREAM_TIMEOUT, session
+from kadena_common.resilience import CircuitOpenError, call_upstream
+from kadena_common.tokens import REGISTRY, TokenRegistry
+
+logger = logging.getLogger(__name__)
+
+KADENA_API_BASE_URL = os.getenv("KADENA_API_BASE_URL", "https://kadena-agents.onrender.com")
+ANALYSIS_API_URL = os.getenv("ANALYSIS_API_URL", "https://analyze-slaz.onrender.com/analyze")
+
+UNAVAILABLE_MESSAGE = "This service is temporarily unavailable. Please try again in a minute."
+
+
+class InvalidRequest(ValueError):
+    """A request body that doesn't match its endpoint's model."""
+
+
+# Parameters documented as k:accounts
+ACCOUNT_PARAMS = {"sender", "receiver", "account", "mintTo"}
+ACCOUNT_PATTERN = re.compile(r"^k:[0-9a-f]{64}$")
+# Amount parameter -> the parameter naming the token it is denominated in
+AMOUNT_PARAMS = {"amount": "tokenAddress", "amountIn": "tokenInAddress", "amountOut": "tokenOutAddress"}
+STRING_PARAMS = {"tokenAddress", "tokenInAddress", "tokenOutAddress", "uri", "collectionId", "name", "description"}
+
+
+def _chain_id(value: Any) -> str:
+    try:
+        chain = int(str(value))
+    except ValueError:
+        chain = -1
+    if not 0 <= chain <= 19:
+        raise ValueError("Invalid chainId. Must be between 0 and 19")
+    return str(chain)
+
+
+def _account(value: str, info: ValidationInfo) -> str:
+    if not ACCOUNT_PATTERN.match(value):
+        raise ValueError(f"Invalid {info.field_name}: must be a k:account (k: followed by a 64-character hex public key)")
+    return value
+
+
+def _amount(value: Union[str, int, float], info: ValidationInfo) -> Union[str, int, float]:
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"Invalid {info.field_name}: {value!r} is not a number")
+    if not amount.is_finite() or amount <= 0:
+        raise ValueError(f"Invalid {info.field_name}: must be a positive number")
+    return value
+
+
+def _guard(value: Dict[str, Any]) -> Dict[str, Any]:
+    keys = value.get("keys")
+    if not isinstance(keys, list) or not keys or not all(isinstance(key, str) for key in keys) \
+            or not isinstance(value.get("pred"), str):
+        raise ValueError("Invalid guard: must be an object with a non-empty list of keys and a pred")
+    return value
+
+
+def _decimals(value: Any) -> int:
+    exponent = Decimal(str(value)).normalize().as_tuple().exponent
+    return max(0, -exponent)
+
+
+ChainId = Annotated[str, BeforeValidator(_chain_id)]
+Account = Annotated[str, AfterValidator(_account)]
+Amount = Annotated[Union[str, int, float], AfterValidator(_amount)]
+Guard = Annotated[Dict[str, Any], AfterValidator(_guard)]
+
+
+def _param_type(name: str) -> Any:
+    if name == "chainId":
+        return ChainId
+    if name in ACCOUNT_PARAMS:
+        return Account
+    if name in AMOUNT_PARAMS:
+        return Amount
+    if name == "guard":
+        return Guard
+    if name in STRING_PARAMS:
+        return str
+    return Any
+
+
+class _Request(BaseModel):
+    # Parameters the docs don't list are passed through as given
+    model_config = ConfigDict(extra="allow")
+
+
+def _rules(endpoint: str, either: Tuple[str, ...], tokens: TokenRegistry):
+    """The cross-field checks of one endpoint, run after its fields validated."""
+
+    def check(request: _Request) -> _Request:
+        if either:
+            given = [name for name in either if getattr(request, name) is not None]
+            if len(given) > 1:
+                raise ValueError(f"Cannot specify both {' and '.join(either)} for {endpoint}")
+            if not given:
+                raise ValueError(f"Must specify either {' or '.join(either)} for {endpoint}")
+        for amount_param, token_param in AMOUNT_PARAMS.items():
+            amount, token = getattr(request, amount_param, None), getattr(request, token_param, None)
+            if amount is None or token is None:
+                continue
+            precision = tokens.precision(token)
+            if precision is not None and _decimals(amount) > precision:
+                raise ValueError(f"Invalid {amount_param}: {token} has at most {precision} decimal places")
+        return request
+
+    return check
+
+
+def build_request_models(api_docs: Dict[str, Dict[str, Any]] = API_DOCS,
+                         tokens: TokenRegistry = REGISTRY) -> Dict[str, Type[BaseModel]]:
+    """
+    One pydantic model per documented endpoint, keyed by endpoint path (e.g. "nft/launch").
+
+    Required, conditional ("Either amountIn or amountOut") and optional
+    parameters come from the docs; each parameter is typed by its name
+    (chainId 0-19, k:accounts, positive amounts within the token's
+    precision, guards with keys and pred).
+    """
+    models = {}
+    for doc in api_docs.values():
+        endpoint = doc["endpoint"].strip("/")
+        fields: Dict[str, Any] = {name: (_param_type(name), ...) for name in doc.get("required_params", [])}
+        for param in doc.get("conditional_params", []) + doc.get("optional_params", []):
+            fields.setdefault(param["name"], (Optional[_param_type(param["name"])], None))
+        either = tuple(
+            param["name"] for param in doc.get("conditional_params", [])
+            if param.get("condition", "").startswith("Either")
+        )
+        name = "".join(part.capitalize() for part in re.split(r"[/_]", endpoint)) + "Request"
+        models[endpoint] = create_model(
+            name,
+            __base__=_Request,
+            __validators__={"check_rules": model_validator(mode="after")(_rules(endpoint, either, tokens))},
+            **fields,
+        )
+    return models
+
+
+# Built once at import; validating a body is then a single compiled pydantic call
+REQUEST_MODELS = build_request_models()
+
+
+def validate_request(endpoint: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Check a request body against its endpoint's model.
+
+    Returns:
+        The body to send, without unset optional fields
+
+    Raises:
+        InvalidRequest: For an unknown endpoint or an invalid body, with a
+            message meant for the user (or the model explaining it to them)
+    """
+    model = REQUEST_MODELS.get(endpoint)
+    if model is None:
+        raise InvalidRequest(f"Invalid endpoint. Must be one of: {set(REQUEST_MODELS)}")
+    try:
+        return model.model_validate(body).model_dump(exclude_none=True)
+    except ValidationError as e:
+        raise InvalidRequest(_describe(e)) from None
+
+
+def _describe(error: ValidationError) -> str:
+    errors = error.errors()
+    missing = [str(e["loc"][0]) for e in errors if e["type"] == "missing"]
+    messages = [f"Missing required parameters: {missing}"] if missing else []
+    for e in errors:
+        if e["type"] == "missing":
+            continue
+        if e["type"] == "value_error":
+            # Our own validators' messages; pydantic would prefix them with "Value error, "
+            messages.append(str(e["ctx"]["error"]))
+        else:
+            messages.append(f"Invalid {'.'.join(str(part) for part in e['loc'])}: {e['msg']}")
+    return "; ".join(messages)
+
+
+def _error_response(response: requests.Response) -> Optional[Dict[str, Any]]:
+    """The error for a 400 or 500 answer from either API, which carry the reason in an "error" field."""
+    label = {400: "Bad Request", 500: "Server Error"}.get(response.status_code)
+    if label is None:
+        return None
+    try:
+        reason = response.json().get("error", "Unknown error")
+    except ValueError:
+        reason = "Unknown error"
+    return {"error": f"{label}: {reason}"}
+
+
+def _request_error(e: requests.exceptions.RequestException) -> Dict[str, Any]:
+    if getattr(e, "response", None) is not None:
+        try:
+            return {"error": f"API Error: {e.response.json().get('error', str(e))}"}
+        except ValueError:
+            pass
+    return {"error": f"API request failed: {str(e)}"}
+
+
+class KadenaClient:
+    """
+    Kadena transaction and analysis API client.
+
+    Args:
+        base_url: Transaction API base URL
+        api_key: Sent as x-api-key to the transaction API
+        analysis_url: Analysis API URL
+        timeout: Per-call timeout in seconds, shortened by the request deadline
+    """
+
+    def __init__(self, base_url: str = KADENA_API_BASE_URL, api_key: Optional[str] = None,
+                 analysis_url: str = ANALYSIS_API_URL, timeout: float = UPSTREAM_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key if api_key is not None else os.getenv("API_KEY")
+        self.analysis_url = analysis_url
+        self.timeout = timeout
+        self._headers = {"Content-Type": "application/json", "x-api-key": self.api_key or ""}
+
+    def _post(self, upstream: str, url: str, body: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        try:
+            response = call_upstream(upstream, lambda: session().post(
+                url, json=body, headers=headers, timeout=deadline.timeout(self.timeout)
+            ))
+            error = _error_response(response)
+            if error is not None:
+                return error
+            response.raise_for_status()
+            return response.json()
+        except CircuitOpenError as e:
+            # Fail fast; "unavailable" tells the agent not to spend a model call explaining it
+            return {"error": f"{UNAVAILABLE_MESSAGE} ({str(e)})", "unavailable": True}
+        except requests.exceptions.RequestException as e:
+            return _request_error(e)
+        except ValueError as e:
+            return {"error": f"API returned an invalid response: {str(e)}"}
+
+    def transaction(self, endpoint: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Call a transaction API endpoint: a quote, or an unsigned transaction to sign.
+
+        Args:
+            endpoint: "quote", "transfer", "swap", "nft/launch" or "nft/collection"
+            body: Request parameters, validated locally first
+
+        Returns:
+            The API's response, or {"error": ...}
+        """
+        try:
+            body = validate_request(endpoint, body)
+        except InvalidRequest as e:
+            return {"error": str(e)}
+        return self._post("kadena_api", f"{self.base_url}/{endpoint}", body, self._headers)
+
+    def quote(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        return self.transaction("quote", body)
+
+    def analyze(self, query: str, system_prompt: str) -> Dict[str, Any]:
+        """Ask the analysis API (K-Agent's knowledge backend) to answer a query."""
+        return self._post("analysis_api", self.analysis_url,
+                          {"query": query, "systemPrompt": system_prompt},
+                          {"Content-Type": "application/json"})
+
+    async def atransaction(self, endpoint: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.transaction, endpoint, body)
+
+    async def aquote(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.quote, body)
+
+    async def aanalyze(self, query: str, system_prompt: str) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.analyze, query, system_prompt)
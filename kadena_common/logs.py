@@ -0,0 +1,245 @@
+"""
+Non-blocking, structured logging for the services.
+
+Handlers never write from the request path: records go onto a bounded queue
+and a listener thread formats them as JSON lines for the console and a
+size- and time-rotated file. When the queue is full records are dropped and
+counted rather than blocking the event loop.
+"""
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+import uuid
+import zlib
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI
+
+from kadena_common import metrics
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_SECONDS = int(os.getenv("LOG_ROTATE_SECONDS", str(24 * 60 * 60)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Fraction of requests whose INFO/DEBUG records are kept; warnings and errors are always kept
+LOG_INFO_SAMPLE_RATE = float(os.getenv("LOG_INFO_SAMPLE_RATE", "1.0"))
+# Requests slower than this are always logged, regardless of sampling
+LOG_SLOW_REQUEST_SECONDS = float(os.getenv("LOG_SLOW_REQUEST_SECONDS", "5.0"))
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+current_request_id: ContextVar[str] = ContextVar("current_request_id", default="")
+
+DROPPED_RECORDS = metrics.counter(
+    "kadena_log_records_dropped_total",
+    "Log records dropped because the log queue was full",
+)
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "always_log"}
+
+access_logger = logging.getLogger("kadena.access")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the request id, endpoint and any `extra=` fields."""
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and value not in (None, ""):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the request id and endpoint, read on the calling thread before the record is queued."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = current_request_id.get()
+        record.endpoint = metrics.current_endpoint.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of INFO and DEBUG records.
+
+    Sampling is decided per request id, so a request's records are kept or
+    dropped together; records outside a request are sampled individually.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1.0 or record.levelno >= logging.WARNING or getattr(record, "always_log", False):
+            return True
+        request_id = getattr(record, "request_id", "")
+        if request_id:
+            return zlib.crc32(request_id.encode()) / 0xFFFFFFFF < self.rate
+        return random.random() < self.rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking or raising."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the traceback here: exc_info can't cross the queue, and the default
+        # prepare() would fold it into the message
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED_RECORDS.inc()
+
+
+class RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotates when the file reaches `max_bytes` or every `interval` seconds, whichever comes first."""
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int, interval: int):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.interval = interval
+        self.rollover_at = time.time() + interval if interval else float("inf")
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        if self.interval:
+            self.rollover_at = time.time() + self.interval
+
+
+_LISTENER: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(service: str, log_file: Optional[str] = None) -> None:
+    """
+    Route all logging through a bounded queue to JSON console and file handlers.
+
+    Safe to call more than once (e.g. when both apps are loaded in one
+    process); only the first call configures logging.
+
+    Args:
+        service: Service name included in every record
+        log_file: Rotated log file path; None or "" logs to the console only. A
+            "{pid}" in it is replaced by the process id, so that workers of one
+            server each write (and rotate) their own file
+    """
+    global _LISTENER
+    if _LISTENER is not None:
+        return
+
+    formatter = JsonFormatter(service)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        log_file = log_file.replace("{pid}", str(os.getpid()))
+        handlers.append(RotatingFileHandler(log_file, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_ROTATE_SECONDS))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(SamplingFilter(LOG_INFO_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    _LISTENER = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _LISTENER.start()
+    atexit.register(_LISTENER.stop)
+
+
+class RequestLoggingMiddleware:
+    """
+    ASGI middleware assigning each request an id and logging one access record per request.
+
+    The id is taken from an incoming `X-Request-ID` header or generated, and
+    returned in the response. The access record carries the status, duration
+    and per-stage timings; it is subject to sampling unless the request failed
+    or was slow.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = next((v.decode("latin-1") for k, v in scope["headers"] if k == REQUEST_ID_HEADER), "")
+        request_id = request_id[:64] or uuid.uuid4().hex
+        id_token = current_request_id.set(request_id)
+        timings = metrics.StageTimings()
+        stages_token = metrics.request_stages.set(timings)
+        status = {"code": 500}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(REQUEST_ID_HEADER, request_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            duration = time.perf_counter() - timings.started
+            route = scope.get("route")
+            access_logger.info(
+                "request completed",
+                extra={
+                    "method": scope["method"],
+                    "path": scope.get("root_path", "") + route.path if route is not None else scope["path"],
+                    "status": status["code"],
+                    "duration_ms": round(duration * 1000, 1),
+                    "stages": timings.totals(),
+                    "always_log": status["code"] >= 500 or duration >= LOG_SLOW_REQUEST_SECONDS,
+                },
+            )
+            metrics.request_stages.reset(stages_token)
+            current_request_id.reset(id_token)
+
+
+def install_request_logging(app: FastAPI) -> None:
+    """Add request ids and per-request access records to an app. Install after the other middleware."""
+    app.add_middleware(RequestLoggingMiddleware)
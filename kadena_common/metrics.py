@@ -0,0 +1,224 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, spanning fast tool calls to multi-second LLM generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Route of the HTTP request being served, set by the metrics middleware
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="")
+
+
+class StageTimings:
+    """
+    Stages of a single request, collected only when something asks for them
+    (e.g. a profiled request).
+
+    Records every span entered while serving the request, and the threads the
+    spans ran on, so a sampler knows which threads to watch.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: List[Dict] = []
+        self.threads = {threading.get_ident()}
+
+    def record(self, stage: str, model: str, tool: str, started: float, seconds: float) -> None:
+        self.stages.append({
+            "stage": stage,
+            "model": model,
+            "tool": tool,
+            "offset_seconds": round(started - self.started, 6),
+            "seconds": round(seconds, 6),
+        })
+
+    def totals(self) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+        for entry in self.stages:
+            totals[entry["stage"]] = round(totals.get(entry["stage"], 0.0) + entry["seconds"], 6)
+        return totals
+
+
+request_stages: ContextVar[Optional[StageTimings]] = ContextVar("request_stages", default=None)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """A monotonically increasing counter with optional labels."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    """A value that can go up and down."""
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram of observed values."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (last is +Inf)], sum, count
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+REGISTRY: Dict[str, _Metric] = {}
+
+
+def _register(metric: _Metric) -> _Metric:
+    # Modules can be imported by more than one app in the same process; reuse the first instance
+    existing = REGISTRY.get(metric.name)
+    if existing is not None:
+        return existing
+    REGISTRY[metric.name] = metric
+    return metric
+
+
+def counter(name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    """Create a counter and register it for export."""
+    return _register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+    """Create a gauge and register it for export."""
+    return _register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+              buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    """Create a histogram and register it for export."""
+    return _register(Histogram(name, documentation, labelnames, buckets))
+
+
+def render() -> str:
+    """Render all registered metrics in the Prometheus text format."""
+    lines: List[str] = []
+    for metric in REGISTRY.values():
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_DURATION = histogram(
+    "kadena_http_request_duration_seconds",
+    "HTTP request latency by endpoint",
+    ("endpoint", "method", "status"),
+)
+STAGE_DURATION = histogram(
+    "kadena_stage_duration_seconds",
+    "Latency of each processing stage (model calls, tool calls, generation steps)",
+    ("stage", "model", "tool", "endpoint"),
+)
+LLM_TOKENS = counter(
+    "kadena_llm_tokens_total",
+    "Tokens used by model calls",
+    ("model", "type"),
+)
+
+
+@contextmanager
+def span(stage: str, model: str = "", tool: str = "") -> Iterator[None]:
+    """
+    Time a block of work and record it in the stage latency histogram.
+
+    Usage:
+        with span("route", model=MODEL_NAME):
+            response = agent.invoke(agent_input)
+    """
+    timings = request_stages.get()
+    if timings is not None:
+        timings.threads.add(threading.get_ident())
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_DURATION.observe(seconds, stage=stage, model=model, tool=tool, endpoint=current_endpoint.get())
+        if timings is not None:
+            timings.record(stage, model, tool, started, seconds)
+
+
+def record_token_usage(model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, model=model, type="prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, model=model, type="completion")
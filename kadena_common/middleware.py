@@ -0,0 +1,53 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import Response
+
+from kadena_common import metrics
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency and exposing the route to stage spans."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = scope["path"]
+        token = metrics.current_endpoint.set(endpoint)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Label by route template (not the raw path, which may carry ids) and put
+            # unmatched paths under one label so scanners can't blow up series cardinality.
+            # The mount prefix keeps apps sharing one process (and registry) apart.
+            route = scope.get("route")
+            if route is not None:
+                label = scope.get("root_path", "") + route.path
+            else:
+                label = "unmatched" if status["code"] == 404 else endpoint
+            metrics.REQUEST_DURATION.observe(time.perf_counter() - started, endpoint=label,
+                                             method=scope["method"], status=str(status["code"]))
+            metrics.current_endpoint.reset(token)
+
+
+def install_metrics(app: FastAPI) -> None:
+    """Add request instrumentation and a Prometheus `GET /metrics` endpoint to an app."""
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", summary="Prometheus metrics", include_in_schema=False)
+    async def get_metrics():
+        """Export service metrics in the Prometheus text format"""
+        return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,126 @@
+import importlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_openai import ChatOpenAI
+
+from kadena_common import metrics, quota, traffic
+from kadena_common.metrics import record_token_usage
+
+# USD per million prompt/completion tokens, for cost estimates; extend or override with
+# MODEL_PRICES='{"model": [prompt, completion]}'
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "o4-mini": (1.10, 4.40),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    **{model: tuple(prices) for model, prices in json.loads(os.getenv("MODEL_PRICES", "{}")).items()},
+}
+
+LLM_COST = metrics.counter(
+    "kadena_llm_cost_usd_total",
+    "Estimated model spend in USD, from reported token usage and MODEL_PRICES",
+    ("model",),
+)
+
+
+def estimate_cost(model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> float:
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return ((prompt_tokens or 0) * prompt_price + (completion_tokens or 0) * completion_price) / 1_000_000
+
+
+class ModelUsage:
+    """Model calls, tokens and estimated cost of one unit of work (e.g. an agent turn)."""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens or 0
+            self.completion_tokens += completion_tokens or 0
+            self.cost += estimate_cost(model, prompt_tokens, completion_tokens)
+
+
+current_model_usage: ContextVar[Optional[ModelUsage]] = ContextVar("current_model_usage", default=None)
+
+
+@contextmanager
+def track_model_usage() -> Iterator[ModelUsage]:
+    """Collect the model calls made inside the block (including on threads it starts with its context)."""
+    usage = ModelUsage()
+    token = current_model_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        current_model_usage.reset(token)
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Count prompt/completion tokens reported by OpenAI for every model call, globally and for the caller."""
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens, completion_tokens = usage.get("prompt_tokens"), usage.get("completion_tokens")
+        record_token_usage(self.model, prompt_tokens, completion_tokens)
+        quota.record_model_call(prompt_tokens, completion_tokens)
+        LLM_COST.inc(estimate_cost(self.model, prompt_tokens, completion_tokens), model=self.model)
+        tracked = current_model_usage.get()
+        if tracked is not None:
+            tracked.add(self.model, prompt_tokens, completion_tokens)
+
+
+_MODELS: Dict[Tuple[str, Tuple[Tuple[str, Any], ...]], ChatOpenAI] = {}
+
+# Default per-call timeout for model requests; a request deadline can shorten it
+MODEL_TIMEOUT = float(os.getenv("MODEL_TIMEOUT_SECONDS", "60"))
+# Options for clients whose calls are bounded by a request deadline (see deadline.py). The openai
+# client retries timeouts by default, so a call given the remaining budget as its timeout could
+# run for several times that budget
+DEADLINE_MODEL_OPTIONS: Dict[str, Any] = {"max_retries": 0}
+
+# "module:callable" building chat models instead of ChatOpenAI, e.g. the benchmark's fake model
+CHAT_MODEL_FACTORY = os.getenv("KADENA_CHAT_MODEL_FACTORY")
+
+
+def _factory() -> Callable[..., Any]:
+    if not CHAT_MODEL_FACTORY:
+        return ChatOpenAI
+    module, _, name = CHAT_MODEL_FACTORY.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def chat_model(model: str, **kwargs: Any) -> ChatOpenAI:
+    """
+    Return a shared chat model client, creating it on first use.
+
+    Clients are reused across requests so their HTTP connection pools stay
+    warm, and each one reports its token usage to the metrics registry.
+    With KADENA_TRAFFIC_MODE set, calls are recorded or replayed (see traffic.py).
+    """
+    key = (model, tuple(sorted(kwargs.items())))
+    client = _MODELS.get(key)
+    if client is None:
+        callbacks = [TokenUsageCallback(model)]
+        if traffic.MODE == "replay":
+            client = traffic.TrafficChatModel(model=model, callbacks=callbacks)
+        elif traffic.MODE == "record":
+            client = traffic.TrafficChatModel(model=model, inner=_factory()(model=model, **kwargs), callbacks=callbacks)
+        else:
+            client = _factory()(model=model, callbacks=callbacks, **kwargs)
+        _MODELS[key] = client
+    return client
@@ -0,0 +1,245 @@
+import collections
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs
+
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from starlette.routing import get_route_path
+
+from kadena_common import metrics
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_QUERY_PARAM = "profile"
+
+# Sampling period while a request is being profiled
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000
+# Minimum time between two profiled requests, across the whole process
+MIN_INTERVAL = float(os.getenv("PROFILE_MIN_INTERVAL_SECONDS", "30"))
+# When set, profiling is only honored (and profiles only readable) with this value as the flag
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+
+MAX_STORED_PROFILES = 50
+MAX_STACK_DEPTH = 128
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{frame.f_globals.get('__name__', '?')}:{name}"
+
+
+class Profile:
+    """
+    Samples the stacks of the threads serving one request.
+
+    Stacks are aggregated in the collapsed format (`root;...;leaf count`) read by
+    flamegraph.pl, speedscope and most other flame graph viewers.
+    """
+
+    def __init__(self, endpoint: str, method: str, timings: Optional[metrics.StageTimings] = None):
+        self.id = uuid.uuid4().hex
+        self.endpoint = endpoint
+        self.method = method
+        self.started_at = time.time()
+        self.duration: Optional[float] = None
+        # Share the request's timings when request logging already collects them
+        self.timings = timings or metrics.StageTimings()
+        self.stacks: Dict[str, int] = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name=f"profiler-{self.id[:8]}", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.timings.started
+
+    def _sample(self) -> None:
+        names = {}
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            frames = sys._current_frames()
+            for ident in list(self.timings.threads):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack: List[str] = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                if ident not in names:
+                    thread = next((t for t in threading.enumerate() if t.ident == ident), None)
+                    names[ident] = thread.name if thread else str(ident)
+                stack.append(names[ident])
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "endpoint": self.endpoint,
+            "method": self.method,
+            "started_at": self.started_at,
+            "duration_seconds": self.duration,
+            "sample_interval_ms": SAMPLE_INTERVAL * 1000,
+            "samples": self.samples,
+            "stages": self.timings.stages,
+            "stage_totals": self.timings.totals(),
+            "collapsed": self.collapsed(),
+        }
+
+
+class ProfileStore:
+    """Keeps the most recent profiles and limits how often a request may be profiled."""
+
+    def __init__(self, max_profiles: int = MAX_STORED_PROFILES, min_interval: float = MIN_INTERVAL):
+        self.max_profiles = max_profiles
+        self.min_interval = min_interval
+        self._profiles: "collections.OrderedDict[str, Profile]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._last_started = float("-inf")
+        self._active = False
+
+    def acquire(self) -> bool:
+        """Claim the profiler; only one request is profiled at a time, at most once per `min_interval`."""
+        now = time.monotonic()
+        with self._lock:
+            if self._active or now - self._last_started < self.min_interval:
+                return False
+            self._active = True
+            self._last_started = now
+            return True
+
+    def release(self, profile: Profile) -> None:
+        with self._lock:
+            self._active = False
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        return self._profiles.get(profile_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [
+            {"id": p.id, "endpoint": p.endpoint, "started_at": p.started_at, "duration_seconds": p.duration}
+            for p in reversed(self._profiles.values())
+        ]
+
+
+PROFILES = ProfileStore()
+
+PROFILED_REQUESTS = metrics.counter(
+    "kadena_profiled_requests_total",
+    "Requests that asked to be profiled, by whether the profiler ran",
+    ("outcome",),
+)
+
+
+def _flag(scope) -> Optional[str]:
+    """Value of the profiling header or query flag, or None when the request didn't ask."""
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return value.decode("latin-1")
+    query = scope.get("query_string", b"")
+    if PROFILE_QUERY_PARAM.encode() in query:
+        values = parse_qs(query.decode("latin-1")).get(PROFILE_QUERY_PARAM)
+        if values:
+            return values[0]
+    return None
+
+
+def _authorized(value: Optional[str]) -> bool:
+    if PROFILE_TOKEN:
+        return value == PROFILE_TOKEN
+    return value is not None and value.lower() in ("1", "true", "yes")
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles requests sent with an `X-Profile` header or `?profile=1`.
+
+    Requests without the flag only pay for a scan of the header list. Profiled
+    responses carry an `X-Profile-Id` header; the profile is read back from
+    `GET /debug/profiles/{id}`.
+    """
+
+    def __init__(self, app, store: ProfileStore = PROFILES):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or get_route_path(scope).startswith("/debug/profiles"):
+            await self.app(scope, receive, send)
+            return
+        flag = _flag(scope)
+        if flag is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not _authorized(flag) or not self.store.acquire():
+            PROFILED_REQUESTS.inc(outcome="rejected")
+
+            async def send_rejected(message):
+                if message["type"] == "http.response.start":
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-profile-status", b"rejected")]
+                await send(message)
+
+            await self.app(scope, receive, send_rejected)
+            return
+
+        PROFILED_REQUESTS.inc(outcome="profiled")
+        profile = Profile(scope["path"], scope["method"], metrics.request_stages.get())
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        token = metrics.request_stages.set(profile.timings)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.stop()
+            metrics.request_stages.reset(token)
+            self.store.release(profile)
+
+
+def install_profiling(app: FastAPI, store: ProfileStore = PROFILES) -> None:
+    """Add opt-in request profiling and the `/debug/profiles` endpoints to an app."""
+    app.add_middleware(ProfilingMiddleware, store=store)
+
+    def check_token(x_profile: Optional[str]) -> None:
+        if PROFILE_TOKEN and x_profile != PROFILE_TOKEN:
+            raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+    @app.get("/debug/profiles", summary="Recent request profiles", include_in_schema=False)
+    async def list_profiles(x_profile: Optional[str] = Header(None)):
+        """List stored profiles, newest first"""
+        check_token(x_profile)
+        return store.list()
+
+    @app.get("/debug/profiles/{profile_id}", summary="Request profile", include_in_schema=False)
+    async def get_profile(profile_id: str, format: str = "json", x_profile: Optional[str] = Header(None)):
+        """
+        Return a stored profile with its stage breakdown, or only the collapsed
+        stacks with `?format=collapsed` (pipe into flamegraph.pl or open in speedscope).
+        """
+        check_token(x_profile)
+        profile = store.get(profile_id)
+        if profile is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        if format == "collapsed":
+            return PlainTextResponse(profile.collapsed())
+        return profile.to_dict()
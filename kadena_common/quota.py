@@ -0,0 +1,381 @@
+"""
+Per-caller rate limits and usage accounting.
+
+Callers are identified by their `x-api-key` header when it is one of
+CALLER_API_KEYS (stored only as a short hash), and otherwise by client
+address, so made-up keys can't buy fresh buckets. Each limited route belongs to a
+bucket (e.g. "query", "code") with its own token-bucket rate, so expensive
+code generations are capped separately from chat queries. Every request to a
+limited route is accounted per caller and bucket: requests, rejections,
+model calls, prompt/completion tokens and upstream API calls.
+
+Buckets and usage live in a backend: in process memory by default, or in a
+SQLite file shared by all workers on a host with
+RATE_LIMIT_BACKEND=sqlite:<path>. Other shared stores (e.g. Redis) can be
+added by implementing `Backend`.
+"""
+import asyncio
+import collections
+import hashlib
+import hmac
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, OrderedDict, Tuple
+
+from fastapi import FastAPI, Header, HTTPException, Request
+from starlette.routing import get_route_path
+
+from kadena_common import metrics
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT", "1") not in ("0", "false", "False")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+# Behind a proxy (e.g. Render) the client address is the proxy's; set this to use X-Forwarded-For
+# instead. Only behind a proxy that overwrites the header: clients can send any value
+RATE_LIMIT_TRUST_FORWARDED_FOR = os.getenv("RATE_LIMIT_TRUST_FORWARDED_FOR", "0") not in ("0", "false", "False")
+# Comma-separated keys that get their own buckets; any other x-api-key is ignored
+CALLER_API_KEYS = {key.strip() for key in os.getenv("CALLER_API_KEYS", "").split(",") if key.strip()}
+# Required for /usage/summary, which is disabled without it
+USAGE_TOKEN = os.getenv("USAGE_TOKEN")
+
+USAGE_FIELDS = ("requests", "rejected", "model_calls", "prompt_tokens", "completion_tokens", "upstream_calls")
+
+RATE_LIMITED = metrics.counter(
+    "kadena_rate_limited_total",
+    "Requests rejected by per-caller rate limits",
+    ("bucket",),
+)
+
+
+class RateLimit:
+    """
+    Token-bucket limit for one bucket of routes: `per_minute` sustained, bursts up to `burst`.
+
+    Both can be overridden with RATE_LIMIT_<NAME>_PER_MINUTE and RATE_LIMIT_<NAME>_BURST.
+    """
+
+    def __init__(self, name: str, per_minute: float, burst: float):
+        self.name = name
+        prefix = f"RATE_LIMIT_{name.upper()}_"
+        self.per_minute = float(os.getenv(prefix + "PER_MINUTE", str(per_minute)))
+        self.burst = float(os.getenv(prefix + "BURST", str(burst)))
+
+    @property
+    def rate(self) -> float:
+        return self.per_minute / 60
+
+
+class Backend:
+    """
+    Storage for token buckets and usage counters.
+
+    `take` must be atomic per key across everything sharing the backend.
+    """
+
+    # Whether calls do I/O and should run off the event loop
+    blocking = False
+
+    def take(self, key: str, limit: RateLimit) -> float:
+        """Take one token from `key`'s bucket; returns 0 if allowed, else seconds until a token is available."""
+        raise NotImplementedError
+
+    def add_usage(self, caller: str, bucket: str, counts: Dict[str, int]) -> None:
+        raise NotImplementedError
+
+    def usage(self, caller: Optional[str] = None) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """Usage as {caller: {bucket: {field: count}}}, optionally for one caller."""
+        raise NotImplementedError
+
+
+def _refill(tokens: float, updated: float, now: float, limit: RateLimit) -> Tuple[float, float]:
+    """Refill a bucket and take a token if one is available; returns (tokens left, wait)."""
+    tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / limit.rate if limit.rate > 0 else float("inf")
+
+
+class MemoryBackend(Backend):
+    """
+    Buckets and usage in this process only; each worker enforces its own limits.
+
+    Usage is kept for the MAX_USAGE_CALLERS most recently active callers;
+    use the SQLite backend to keep every caller's.
+    """
+
+    # Idle buckets are dropped once there are this many; a dropped bucket was full anyway
+    MAX_BUCKETS = 10000
+    MAX_USAGE_CALLERS = 10000
+
+    def __init__(self):
+        # key -> (tokens, updated, seconds the bucket takes to refill completely)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        # Least recently active caller first
+        self._usage: OrderedDict[str, Dict[str, Dict[str, int]]] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, limit: RateLimit) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (limit.burst, now, 0.0))
+            tokens, wait = _refill(tokens, updated, now, limit)
+            idle = limit.burst / limit.rate if limit.rate > 0 else float("inf")
+            self._buckets[key] = (tokens, now, idle)
+            if len(self._buckets) > self.MAX_BUCKETS:
+                self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < v[2]}
+        return wait
+
+    def add_usage(self, caller: str, bucket: str, counts: Dict[str, int]) -> None:
+        with self._lock:
+            buckets = self._usage.setdefault(caller, {})
+            self._usage.move_to_end(caller)
+            totals = buckets.setdefault(bucket, dict.fromkeys(USAGE_FIELDS, 0))
+            for field, count in counts.items():
+                totals[field] += count
+            while len(self._usage) > self.MAX_USAGE_CALLERS:
+                self._usage.popitem(last=False)
+
+    def usage(self, caller: Optional[str] = None) -> Dict[str, Dict[str, Dict[str, int]]]:
+        with self._lock:
+            return {
+                c: {bucket: dict(totals) for bucket, totals in buckets.items()}
+                for c, buckets in self._usage.items() if caller is None or c == caller
+            }
+
+
+class SQLiteBackend(Backend):
+    """Buckets and usage in a SQLite file, shared by every worker process on the host."""
+
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS usage (caller TEXT, bucket TEXT, "
+                + ", ".join(f"{field} INTEGER DEFAULT 0" for field in USAGE_FIELDS)
+                + ", PRIMARY KEY (caller, bucket))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def take(self, key: str, limit: RateLimit) -> float:
+        # Wall-clock time: monotonic clocks aren't comparable across processes
+        now = time.time()
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, wait = _refill(*(row or (limit.burst, now)), now, limit)
+            db.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return wait
+
+    def add_usage(self, caller: str, bucket: str, counts: Dict[str, int]) -> None:
+        fields = [field for field in USAGE_FIELDS if counts.get(field)]
+        if not fields:
+            return
+        self._connect().execute(
+            f"INSERT INTO usage (caller, bucket, {', '.join(fields)}) VALUES (?, ?{', ?' * len(fields)}) "
+            f"ON CONFLICT (caller, bucket) DO UPDATE SET "
+            + ", ".join(f"{field} = {field} + excluded.{field}" for field in fields),
+            (caller, bucket, *(counts[field] for field in fields)),
+        )
+
+    def usage(self, caller: Optional[str] = None) -> Dict[str, Dict[str, Dict[str, int]]]:
+        query = f"SELECT caller, bucket, {', '.join(USAGE_FIELDS)} FROM usage"
+        rows = self._connect().execute(query + (" WHERE caller = ?" if caller else ""), (caller,) if caller else ())
+        result: Dict[str, Dict[str, Dict[str, int]]] = {}
+        for row in rows:
+            result.setdefault(row[0], {})[row[1]] = dict(zip(USAGE_FIELDS, row[2:]))
+        return result
+
+
+def backend_from_env(spec: str = RATE_LIMIT_BACKEND) -> Backend:
+    if spec == "memory":
+        return MemoryBackend()
+    if spec.startswith("sqlite:"):
+        return SQLiteBackend(spec[len("sqlite:"):])
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND {spec!r}; use 'memory' or 'sqlite:<path>'")
+
+
+_DEFAULT_BACKEND: Optional[Backend] = None
+
+
+def default_backend() -> Backend:
+    """The RATE_LIMIT_BACKEND of this process, shared by every app in it (e.g. under the gateway)."""
+    global _DEFAULT_BACKEND
+    if _DEFAULT_BACKEND is None:
+        _DEFAULT_BACKEND = backend_from_env()
+    return _DEFAULT_BACKEND
+
+
+class Usage:
+    """Counts for the current request, filled in by model callbacks and upstream calls."""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = dict.fromkeys(USAGE_FIELDS, 0)
+        self._lock = threading.Lock()
+
+    def add(self, field: str, count: int = 1) -> None:
+        with self._lock:
+            self.counts[field] += count
+
+
+current_usage: ContextVar[Optional[Usage]] = ContextVar("current_usage", default=None)
+
+
+def record_model_call(prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+    usage = current_usage.get()
+    if usage is not None:
+        usage.add("model_calls")
+        usage.add("prompt_tokens", prompt_tokens or 0)
+        usage.add("completion_tokens", completion_tokens or 0)
+
+
+def record_upstream_call() -> None:
+    usage = current_usage.get()
+    if usage is not None:
+        usage.add("upstream_calls")
+
+
+def _key_hash(api_key: bytes) -> str:
+    return hashlib.sha256(api_key).hexdigest()
+
+
+_CALLER_KEY_HASHES = {_key_hash(key.encode()) for key in CALLER_API_KEYS}
+
+
+def caller_id(scope: Dict[str, Any]) -> str:
+    """
+    A stable caller identity for the request: a hash of its API key if the key
+    is one of CALLER_API_KEYS, else its client address.
+    """
+    headers = dict(scope["headers"])
+    api_key = headers.get(b"x-api-key")
+    if api_key:
+        digest = _key_hash(api_key)
+        if digest in _CALLER_KEY_HASHES:
+            return "key:" + digest[:16]
+    forwarded = headers.get(b"x-forwarded-for")
+    if forwarded and RATE_LIMIT_TRUST_FORWARDED_FOR:
+        return "ip:" + forwarded.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+class QuotaMiddleware:
+    """ASGI middleware enforcing per-caller rate limits and accounting usage on limited routes."""
+
+    def __init__(self, app, limits: Dict[str, RateLimit], backend: Backend, enforce: bool = True):
+        self.app = app
+        self.limits = limits
+        self.backend = backend
+        self.enforce = enforce
+
+    async def _call(self, fn, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(get_route_path(scope)) if scope["type"] == "http" else None
+        if limit is None or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        caller = caller_id(scope)
+        wait = await self._call(self.backend.take, f"{limit.name}:{caller}", limit) if self.enforce else 0
+        if wait > 0:
+            RATE_LIMITED.inc(bucket=limit.name)
+            await self._call(self.backend.add_usage, caller, limit.name, {"rejected": 1})
+            await _too_many_requests(send, limit, wait)
+            return
+
+        usage = Usage()
+        token = current_usage.set(usage)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_usage.reset(token)
+            usage.add("requests")
+            try:
+                await self._call(self.backend.add_usage, caller, limit.name, usage.counts)
+            except Exception as e:
+                logger.warning(f"Failed to record usage for {caller}: {str(e)}")
+
+
+async def _too_many_requests(send, limit: RateLimit, wait: float) -> None:
+    body = (
+        '{"detail": "Rate limit exceeded for %s (%g per minute). Please retry later."}' % (limit.name, limit.per_minute)
+    ).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(min(wait, 3600)))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def install_quotas(app: FastAPI, limits: Dict[str, RateLimit], backend: Optional[Backend] = None) -> Backend:
+    """
+    Rate-limit and account `limits` (path -> RateLimit) and add the usage endpoints.
+
+    `GET /usage` returns the calling key's own usage; `GET /usage/summary`
+    returns every caller's, and requires the `X-Usage-Token` header to
+    match USAGE_TOKEN (without USAGE_TOKEN it is disabled). Install right after admission control, so rejected
+    callers never take a queue slot. Set RATE_LIMIT=0 to turn off limiting;
+    usage is still recorded.
+    """
+    backend = backend or default_backend()
+    app.add_middleware(QuotaMiddleware, limits=limits, backend=backend, enforce=RATE_LIMIT_ENABLED)
+
+    async def read_usage(caller: Optional[str] = None):
+        if backend.blocking:
+            return await asyncio.to_thread(backend.usage, caller)
+        return backend.usage(caller)
+
+    @app.get("/usage", summary="Usage of the calling API key")
+    async def get_usage(request: Request):
+        """Requests, rejections, model calls, tokens and upstream calls per route bucket for the caller"""
+        caller = caller_id(request.scope)
+        return {"caller": caller, "usage": (await read_usage(caller)).get(caller, {})}
+
+    @app.get("/usage/summary", summary="Usage of every caller", include_in_schema=False)
+    async def get_usage_summary(x_usage_token: Optional[str] = Header(None)):
+        """Usage per caller and route bucket, with totals per bucket"""
+        if not USAGE_TOKEN:
+            raise HTTPException(status_code=403, detail="Usage summary is disabled; set USAGE_TOKEN to enable it")
+        if not hmac.compare_digest((x_usage_token or "").encode(), USAGE_TOKEN.encode()):
+            raise HTTPException(status_code=403, detail="Invalid usage token")
+        usage = await read_usage()
+        totals: Dict[str, Dict[str, int]] = {}
+        for buckets in usage.values():
+            for bucket, counts in buckets.items():
+                bucket_totals = totals.setdefault(bucket, dict.fromkeys(USAGE_FIELDS, 0))
+                for field, count in counts.items():
+                    bucket_totals[field] += count
+        return {"totals": totals, "callers": usage}
+
+    return backend
@@ -0,0 +1,269 @@
+"""
+Circuit breakers and budgeted retries for upstream HTTP calls.
+
+Each upstream (e.g. "kadena_api") has a breaker that opens when too many of
+its recent calls failed or were slow, so callers fail fast instead of
+waiting on an upstream that is down. Retries back off exponentially with
+jitter and draw from one process-wide budget, so retries can't multiply
+load on an upstream that is already struggling.
+"""
+import collections
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+import requests
+
+from kadena_common import deadline, metrics, quota
+
+logger = logging.getLogger(__name__)
+
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "5"))
+BREAKER_SLOW_CALL_RATE = float(os.getenv("BREAKER_SLOW_CALL_RATE", "0.8"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY_SECONDS", "0.2"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "2"))
+# Retries allowed per first attempt, plus a small per-second allowance for low traffic
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", "1"))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+BREAKER_STATE = metrics.gauge(
+    "kadena_circuit_breaker_state",
+    "Circuit breaker state per upstream (0 closed, 1 half-open, 2 open)",
+    ("upstream",),
+)
+UPSTREAM_CALLS = metrics.counter(
+    "kadena_upstream_calls_total",
+    "Upstream call attempts by outcome (success, failure, slow, deadline, rejected while the circuit was open)",
+    ("upstream", "outcome"),
+)
+UPSTREAM_RETRIES = metrics.counter(
+    "kadena_upstream_retries_total",
+    "Retries by outcome (attempted, or skipped because the retry budget was exhausted)",
+    ("upstream", "outcome"),
+)
+
+
+class CircuitOpenError(Exception):
+    """The upstream's circuit is open; the call was not attempted."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} is unavailable (circuit open, retry in {retry_after:.0f}s)")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker over a sliding window of recent calls.
+
+    Opens when at least `min_calls` of the last `window` calls were recorded
+    and either the failure rate or the slow-call rate reaches its threshold.
+    After `open_seconds` one trial call is let through (half-open); its
+    outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, window: int = BREAKER_WINDOW, min_calls: int = BREAKER_MIN_CALLS,
+                 failure_rate: float = BREAKER_FAILURE_RATE, slow_call_seconds: float = BREAKER_SLOW_CALL_SECONDS,
+                 slow_call_rate: float = BREAKER_SLOW_CALL_RATE, open_seconds: float = BREAKER_OPEN_SECONDS):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self._calls: Deque[Tuple[bool, bool]] = collections.deque(maxlen=window)
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        BREAKER_STATE.set(STATE_VALUES[CLOSED], upstream=name)
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        log = logger.warning if state == OPEN else logger.info
+        log(f"Circuit for {self.name} is now {state}")
+        self.state = state
+        BREAKER_STATE.set(STATE_VALUES[state], upstream=self.name)
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state == CLOSED:
+            self._calls.clear()
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now; reserves the trial call when half-open."""
+        with self._lock:
+            if self.state == OPEN and self.retry_after() <= 0:
+                self._transition(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def release(self) -> None:
+        """Give back a reserved half-open trial without recording an outcome."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record(self, failed: bool, seconds: float) -> None:
+        slow = seconds >= self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._trial_in_flight = False
+                self._transition(OPEN if failed or slow else CLOSED)
+                return
+            self._calls.append((failed, slow))
+            if len(self._calls) < self.min_calls:
+                return
+            failures = sum(1 for f, _ in self._calls if f) / len(self._calls)
+            slow_calls = sum(1 for _, s in self._calls if s) / len(self._calls)
+            if failures >= self.failure_rate or slow_calls >= self.slow_call_rate:
+                self._transition(OPEN)
+
+
+class RetryBudget:
+    """
+    Token bucket limiting retries to a fraction of first attempts.
+
+    Every first attempt deposits `ratio` tokens, and `min_per_second` tokens
+    accrue over time so a quiet service can still retry; a retry spends one.
+    """
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, min_per_second: float = RETRY_BUDGET_MIN_PER_SECOND,
+                 capacity: float = 10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+RETRY_BUDGET = RetryBudget()
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def breaker(upstream: str) -> CircuitBreaker:
+    """The process-wide breaker for `upstream`, created on first use."""
+    with _BREAKERS_LOCK:
+        if upstream not in _BREAKERS:
+            _BREAKERS[upstream] = CircuitBreaker(upstream)
+        return _BREAKERS[upstream]
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY) -> float:
+    """Exponential backoff with full jitter for the given retry number (1-based)."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def call_upstream(upstream: str, send: Callable[[], requests.Response],
+                  max_attempts: int = RETRY_MAX_ATTEMPTS, sleep: Callable[[float], None] = time.sleep,
+                  budget: Optional[RetryBudget] = None) -> requests.Response:
+    """
+    Make an upstream HTTP call through its circuit breaker, retrying transient failures.
+
+    Connection errors, timeouts and 5xx responses count as failures and are
+    retried while the breaker, attempt limit, retry budget and request
+    deadline allow; other responses (including 4xx) are returned as-is. A
+    timeout caused by the request running out of budget isn't held against
+    the upstream.
+
+    Args:
+        upstream: Breaker name, e.g. "kadena_api"
+        send: Performs one attempt and returns the response
+
+    Returns:
+        The last response received
+
+    Raises:
+        CircuitOpenError: If the circuit is open (before any attempt, or before a retry)
+        DeadlineExceeded: If the request's budget ran out before the first attempt
+        requests.exceptions.RequestException: If the last attempt failed without a response
+    """
+    circuit = breaker(upstream)
+    budget = budget or RETRY_BUDGET
+    budget.deposit()
+
+    for attempt in range(1, max_attempts + 1):
+        deadline.timeout(0, stage=upstream)
+        if not circuit.allow():
+            UPSTREAM_CALLS.inc(upstream=upstream, outcome="rejected")
+            raise CircuitOpenError(upstream, circuit.retry_after())
+
+        quota.record_upstream_call()
+        started = time.perf_counter()
+        error: Optional[Exception] = None
+        response: Optional[requests.Response] = None
+        try:
+            response = send()
+            failed = response.status_code >= 500
+        except requests.exceptions.Timeout as e:
+            if deadline.remaining() == 0:
+                # Our budget ran out, not necessarily the upstream's patience
+                circuit.release()
+                UPSTREAM_CALLS.inc(upstream=upstream, outcome="deadline")
+                raise
+            error, failed = e, True
+        except requests.exceptions.ConnectionError as e:
+            error, failed = e, True
+        except Exception:
+            # Not retryable, but still an attempt; a half-open trial must not stay reserved
+            circuit.record(True, time.perf_counter() - started)
+            UPSTREAM_CALLS.inc(upstream=upstream, outcome="failure")
+            raise
+        seconds = time.perf_counter() - started
+        circuit.record(failed, seconds)
+        outcome = "failure" if failed else ("slow" if seconds >= circuit.slow_call_seconds else "success")
+        UPSTREAM_CALLS.inc(upstream=upstream, outcome=outcome)
+
+        if not failed:
+            return response
+        delay = backoff_delay(attempt)
+        left = deadline.remaining()
+        if attempt == max_attempts or (left is not None and left <= delay):
+            break
+        if not budget.try_spend():
+            UPSTREAM_RETRIES.inc(upstream=upstream, outcome="budget_exhausted")
+            break
+        UPSTREAM_RETRIES.inc(upstream=upstream, outcome="attempted")
+        sleep(delay)
+
+    if error is not None:
+        raise error
+    return response
@@ -0,0 +1,184 @@
+"""
+Semantic cache keyed by locally computed text embeddings.
+
+Texts are embedded as hashed word and character n-gram vectors (no model,
+no external service) and looked up by cosine similarity with one NumPy
+matrix-vector product, so rephrasings of the same question ("what is
+Pact?", "what's pact") share an entry. Word pairs weigh more than single
+words, and a hit also needs the same numbers, in the same order, and the
+same negation: "bridge from chain 0 to chain 1" must not get the answer for
+"from chain 1 to chain 0", nor "what is not a valid type" the answer for
+"what is a valid type". Entries expire after a TTL and the
+least recently used one is evicted when the cache is full.
+"""
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from kadena_common import metrics
+
+CACHE_LOOKUPS = metrics.counter(
+    "kadena_semantic_cache_lookups_total",
+    "Semantic cache lookups by result (hit, miss)",
+    ("cache", "result"),
+)
+CACHE_ENTRIES = metrics.gauge(
+    "kadena_semantic_cache_entries",
+    "Live entries per semantic cache",
+    ("cache",),
+)
+
+# Words that carry no topic; without them "what is pact" and "what is chainweb" don't look alike
+STOPWORDS = frozenset("""
+a an the is are was were be been am do does did can could would should will shall may might must
+what whats what's how who whom which when where why tell me explain describe about please of on in
+to for with and or vs versus it its this that there their i you your we us any some
+""".split())
+
+# Words that flip the meaning of a question; apostrophes are removed first ("don't" -> "dont")
+NEGATIONS = frozenset("""
+not no never none nothing nor without cannot cant dont doesnt didnt isnt arent wasnt werent wont
+wouldnt shouldnt couldnt
+""".split())
+
+_WORD = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+def _stem(word: str) -> str:
+    """Strip a plural/verb "s" so "works" matches "work"."""
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def normalize(text: str) -> List[str]:
+    """Lower-cased, lightly stemmed content words of `text`."""
+    words = _WORD.findall(text.lower().replace("'", ""))
+    return [_stem(w) for w in words if w not in STOPWORDS] or words
+
+
+def signature(text: str) -> Tuple[Tuple[str, ...], bool]:
+    """What two texts must share to be answered alike: their numbers, in order, and whether they are negated."""
+    text = text.lower().replace("'", "")
+    return tuple(_NUMBER.findall(text)), any(word in NEGATIONS for word in _WORD.findall(text))
+
+
+def _signature_id(text: str) -> int:
+    return zlib.crc32(repr(signature(text)).encode())
+
+
+def _features(words: List[str]) -> List[str]:
+    features = [f"w:{w}" for w in words]
+    features += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f" {word} "
+        features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return features
+
+
+# Per feature kind: words, word bigrams, character trigrams
+FEATURE_WEIGHTS = {"w": 1.0, "b": 2.0, "c": 0.25}
+
+
+def embed(text: str, dim: int = 1024) -> np.ndarray:
+    """
+    Unit-length hashed n-gram vector for `text`.
+
+    Word bigrams weigh double, so word order counts ("kda to zusd" is not
+    "zusd to kda"). Character trigrams weigh least; they only absorb small
+    spelling differences (plurals, typos).
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in _features(normalize(text)):
+        digest = zlib.crc32(feature.encode())
+        sign = 1.0 if digest & 0x80000000 else -1.0
+        weight = FEATURE_WEIGHTS[feature[0]]
+        vector[digest % dim] += sign * weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticCache:
+    """
+    Fixed-capacity cache looked up by embedding similarity.
+
+    Args:
+        name: Metrics label
+        capacity: Maximum entries; the least recently used entry is evicted beyond it
+        threshold: Minimum cosine similarity for a hit, between texts with the same `signature`
+        ttl: Seconds an entry stays valid
+        dim: Embedding dimension
+    """
+
+    def __init__(self, name: str, capacity: int = 1000, threshold: float = 0.8,
+                 ttl: float = 3600.0, dim: int = 1024):
+        self.name = name
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self.dim = dim
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._expires = np.zeros(capacity, dtype=np.float64)
+        self._signatures = np.zeros(capacity, dtype=np.int64)
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        # Slot -> None, least recently used first
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _best(self, vector: np.ndarray, signature_id: int, now: float):
+        similarities = self._vectors @ vector
+        similarities[(self._expires <= now) | (self._signatures != signature_id)] = -1.0
+        slot = int(np.argmax(similarities))
+        return slot, float(similarities[slot])
+
+    def get(self, text: str) -> Optional[Any]:
+        """The value stored for the most similar live text, or None below the threshold."""
+        vector, signature_id = embed(text, self.dim), _signature_id(text)
+        now = time.time()
+        with self._lock:
+            slot, similarity = self._best(vector, signature_id, now)
+            if similarity < self.threshold:
+                CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+                return None
+            self._lru.move_to_end(slot)
+            CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+            return self._entries[slot]["value"]
+
+    def put(self, text: str, value: Any) -> None:
+        """Store `value` for `text`, replacing a near-identical entry if there is one."""
+        vector, signature_id = embed(text, self.dim), _signature_id(text)
+        now = time.time()
+        with self._lock:
+            slot, similarity = self._best(vector, signature_id, now)
+            if similarity < 0.98:
+                slot = self._free_slot(now)
+            self._vectors[slot] = vector
+            self._expires[slot] = now + self.ttl
+            self._signatures[slot] = signature_id
+            self._entries[slot] = {"text": text, "value": value}
+            self._lru[slot] = None
+            self._lru.move_to_end(slot)
+            CACHE_ENTRIES.set(int((self._expires > now).sum()), cache=self.name)
+
+    def _free_slot(self, now: float) -> int:
+        if len(self._entries) < self.capacity:
+            return len(self._entries)
+        expired = np.flatnonzero(self._expires <= now)
+        if len(expired):
+            return int(expired[0])
+        slot, _ = self._lru.popitem(last=False)
+        return slot
+
+    def clear(self) -> None:
+        with self._lock:
+            self._vectors[:] = 0
+            self._expires[:] = 0
+            self._entries.clear()
+            self._lru.clear()
+            CACHE_ENTRIES.set(0, cache=self.name)
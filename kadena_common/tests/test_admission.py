@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+
+from kadena_common import admission
+from kadena_common.admission import EXPENSIVE, INTERACTIVE, AdaptiveLimit, AdmissionController, Rejected, RouteLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_limit_grows_additively_while_in_use(clock):
+    limit = AdaptiveLimit(initial=4, min_limit=1, max_limit=5)
+    for _ in range(4):
+        limit.on_sample(1.0, failed=False, in_flight=3)
+    # One per limit's worth of fast completions
+    assert limit.limit == pytest.approx(5, abs=0.1)
+    for _ in range(20):
+        limit.on_sample(1.0, failed=False, in_flight=4)
+    assert limit.limit == 5
+
+
+def test_limit_does_not_grow_while_idle(clock):
+    limit = AdaptiveLimit(initial=8, min_limit=1, max_limit=64)
+    for _ in range(20):
+        limit.on_sample(1.0, failed=False, in_flight=0)
+    assert limit.limit == 8
+
+
+def test_limit_backs_off_once_per_typical_request(clock):
+    limit = AdaptiveLimit(initial=10, min_limit=2, max_limit=64, tolerance=2.0, backoff=0.5)
+    limit.on_sample(1.0, failed=False, in_flight=5)
+    start = limit.limit
+    # Slow responses arriving together count as one signal
+    limit.on_sample(3.0, failed=False, in_flight=5)
+    limit.on_sample(3.0, failed=False, in_flight=5)
+    assert limit.limit == pytest.approx(start * 0.5)
+
+    clock[0] += 10
+    limit.on_sample(0.5, failed=True, in_flight=5)
+    assert limit.limit == pytest.approx(start * 0.25)
+    clock[0] += 10
+    limit.on_sample(0.5, failed=True, in_flight=5)
+    assert limit.limit == 2
+
+
+def test_baseline_follows_minimums_and_drifts_up(clock):
+    limit = AdaptiveLimit(initial=8, min_limit=1, max_limit=64)
+    limit.on_sample(2.0, failed=False, in_flight=0)
+    limit.on_sample(1.0, failed=False, in_flight=0)
+    assert limit.baseline == 1.0
+    limit.on_sample(1.5, failed=False, in_flight=0)
+    assert 1.0 < limit.baseline < 1.5
+    # Failures don't move the baseline
+    limit.on_sample(0.1, failed=True, in_flight=0)
+    assert limit.baseline > 1.0
+
+
+async def settle():
+    """Let woken waiters run; a grant takes a few loop iterations to reach them."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def make_limiter(limit=1, queue_size=2, queue_timeout=1.0, priority=INTERACTIVE):
+    return RouteLimiter("/test", priority, AdaptiveLimit(limit, limit, limit), queue_size, queue_timeout)
+
+
+def test_waiters_are_admitted_in_order():
+    async def run():
+        limiter = make_limiter()
+        await limiter.acquire()
+        order = []
+
+        async def wait(name):
+            await limiter.acquire()
+            order.append(name)
+
+        waiters = [asyncio.create_task(wait(name)) for name in ("a", "b")]
+        await asyncio.sleep(0)
+        assert (limiter.in_flight, limiter.queued) == (1, 2)
+        limiter.release(0.1, failed=False)
+        await settle()
+        assert order == ["a"]
+        limiter.release(0.1, failed=False)
+        await asyncio.gather(*waiters)
+        limiter.release(0.1, failed=False)
+        return order, limiter.in_flight
+
+    assert asyncio.run(run()) == (["a", "b"], 0)
+
+
+def test_rejections():
+    async def run():
+        limiter = make_limiter(queue_size=1, queue_timeout=0.05)
+        await limiter.acquire()
+        with pytest.raises(Rejected) as shed:
+            await limiter.acquire(shed=True)
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Rejected) as full:
+            await limiter.acquire()
+        with pytest.raises(Rejected) as timed_out:
+            await waiter
+        return shed.value, full.value, timed_out.value, limiter
+
+    shed, full, timed_out, limiter = asyncio.run(run())
+    assert (shed.status_code, shed.reason) == (503, "shed")
+    assert (full.status_code, full.reason) == (429, "queue_full")
+    assert (timed_out.status_code, timed_out.reason) == (503, "queue_timeout")
+    assert full.retry_after >= 1
+    assert (limiter.in_flight, limiter.queued) == (1, 0)
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        limiter = make_limiter()
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        queued = limiter.queued
+        limiter.release(0.1, failed=False)
+        return queued, limiter.in_flight
+
+    assert asyncio.run(run()) == (0, 0)
+
+
+def test_expensive_routes_shed_while_interactive_requests_wait():
+    controller = AdmissionController()
+    interactive = controller.limit("/query", INTERACTIVE)
+    expensive = controller.limit("/code", EXPENSIVE)
+    assert expensive.limit.max_limit == admission.ADMISSION_EXPENSIVE_MAX_LIMIT
+    assert not controller.should_shed(expensive)
+
+    async def run():
+        interactive.in_flight = int(interactive.limit.limit)
+        waiter = asyncio.create_task(interactive.acquire())
+        await asyncio.sleep(0)
+        shed = controller.should_shed(expensive), controller.should_shed(interactive)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return shed
+
+    assert asyncio.run(run()) == (True, False)
+    assert controller.snapshot()["/code"]["priority"] == "expensive"
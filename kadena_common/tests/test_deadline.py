@@ -0,0 +1,70 @@
+import pytest
+
+from kadena_common import deadline, models
+from kadena_common.deadline import DeadlineExceeded, can_afford, deadline_scope, remaining, timeout
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(deadline.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_no_deadline_keeps_the_default():
+    assert remaining() is None
+    assert timeout(60) == 60
+    assert can_afford("format")
+
+
+def test_timeout_is_clamped_to_the_remaining_budget(clock):
+    with deadline_scope(10):
+        assert timeout(60) == 10
+        assert timeout(5) == 5
+        clock[0] += 7.5
+        assert timeout(60) == pytest.approx(2.5)
+    assert remaining() is None
+
+
+def test_exhausted_budget_raises(clock):
+    with deadline_scope(1):
+        clock[0] += 1
+        assert remaining() == 0
+        with pytest.raises(DeadlineExceeded) as error:
+            timeout(60, stage="route")
+        assert error.value.stage == "route"
+
+
+def test_scope_defaults_and_cap(monkeypatch):
+    monkeypatch.setattr(deadline, "DEFAULT_DEADLINE", 30.0)
+    monkeypatch.setattr(deadline, "MAX_DEADLINE", 120.0)
+    with deadline_scope() as scope:
+        assert scope.seconds == 30
+    with deadline_scope(1000) as scope:
+        assert scope.seconds == 120
+
+
+def test_scopes_nest(clock):
+    with deadline_scope(10):
+        with deadline_scope(2):
+            assert timeout(60) == 2
+        assert timeout(60) == 10
+
+
+def test_optional_stages_need_enough_budget(clock):
+    with deadline_scope(10):
+        assert can_afford("format", seconds=4)
+        clock[0] += 7
+        assert not can_afford("format", seconds=4)
+
+
+def test_deadline_clients_do_not_retry(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(models, "CHAT_MODEL_FACTORY", None)
+    monkeypatch.setattr(models, "_MODELS", {})
+    client = models.chat_model("gpt-4.1", **models.DEADLINE_MODEL_OPTIONS)
+    assert client.max_retries == 0
+    assert client.client._client.max_retries == 0
+    # Clients with other options are separate
+    assert models.chat_model("gpt-4.1") is not client
+    assert models.chat_model("gpt-4.1", **models.DEADLINE_MODEL_OPTIONS) is client
@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from kadena_common.health import HealthCheck, HealthMonitor, install_health, origin
+
+
+def ok():
+    pass
+
+
+def down():
+    raise RuntimeError("HTTP 502")
+
+
+def test_checks_update_the_cached_results():
+    calls = []
+    monitor = HealthMonitor([
+        HealthCheck("api", lambda: calls.append("api")),
+        HealthCheck("analysis", down, critical=False),
+        HealthCheck("slow", lambda: time.sleep(0.2), critical=False),
+    ], timeout=0.05)
+    assert not monitor.ready and monitor.snapshot()["api"]["status"] == "unknown"
+
+    asyncio.run(monitor.check_all())
+    results = monitor.snapshot()
+    assert calls == ["api"]
+    assert results["api"]["status"] == "healthy" and results["api"]["error"] is None
+    assert results["analysis"] == {**results["analysis"], "status": "unhealthy", "error": "HTTP 502"}
+    assert results["slow"]["error"] == "timed out after 0.05s"
+    # Only critical checks decide readiness
+    assert monitor.ready
+
+
+def test_endpoints_serve_the_snapshot_without_probing():
+    probes = []
+    monitor = HealthMonitor([HealthCheck("api", lambda: probes.append(1) or down())], interval=3600)
+    app = FastAPI()
+    install_health(app, monitor)
+
+    with TestClient(app) as client:
+        # The background loop ran the first round of checks on startup
+        deadline = time.monotonic() + 2
+        while monitor.results["api"]["status"] == "unknown" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        for _ in range(3):
+            ready = client.get("/health/ready")
+        assert client.get("/health/live").json() == {"status": "ok"}
+    assert ready.status_code == 503
+    assert ready.json()["dependencies"]["api"]["error"] == "HTTP 502"
+    assert probes == [1]
+
+
+def test_origin():
+    assert origin("https://kadena-agents.onrender.com/api/quote?x=1") == "https://kadena-agents.onrender.com/"
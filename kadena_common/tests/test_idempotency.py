@@ -0,0 +1,113 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from kadena_common import quota
+from kadena_common.idempotency import IdempotencyStore, install_idempotency
+
+
+def make_app(store=None):
+    app = FastAPI()
+    app.state.calls = 0
+    app.state.release = None
+    app.state.status = 200
+
+    @app.post("/run")
+    async def run(body: dict):
+        app.state.calls += 1
+        if app.state.release is not None:
+            await app.state.release.wait()
+        if app.state.status != 200:
+            raise HTTPException(status_code=app.state.status, detail="try again")
+        return {"call": app.state.calls, **body}
+
+    @app.post("/other")
+    async def other():
+        app.state.calls += 1
+        return {"call": app.state.calls}
+
+    install_idempotency(app, ["/run"], store or IdempotencyStore())
+    return app
+
+
+def test_completed_requests_are_replayed():
+    app = make_app()
+    client = TestClient(app)
+    first = client.post("/run", json={"q": 1}, headers={"idempotency-key": "k1"})
+    again = client.post("/run", json={"q": 1}, headers={"idempotency-key": "k1"})
+    assert first.json() == again.json() == {"call": 1, "q": 1}
+    assert again.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+
+    # Other keys, no key and other paths run as usual
+    assert client.post("/run", json={"q": 1}, headers={"idempotency-key": "k2"}).json()["call"] == 2
+    assert client.post("/run", json={"q": 1}).json()["call"] == 3
+    assert client.post("/other", headers={"idempotency-key": "k1"}).json()["call"] == 4
+
+
+def test_reused_key_with_a_different_body_is_rejected():
+    client = TestClient(make_app())
+    client.post("/run", json={"q": 1}, headers={"idempotency-key": "k"})
+    response = client.post("/run", json={"q": 2}, headers={"idempotency-key": "k"})
+    assert response.status_code == 422
+
+
+def test_invalid_keys():
+    client = TestClient(make_app())
+    assert client.post("/run", json={}, headers={"idempotency-key": ""}).status_code == 400
+    assert client.post("/run", json={}, headers={"idempotency-key": "k" * 256}).status_code == 400
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_retryable_outcomes_are_not_stored(status):
+    app = make_app()
+    client = TestClient(app)
+    app.state.status = status
+    assert client.post("/run", json={}, headers={"idempotency-key": "k"}).status_code == status
+    app.state.status = 200
+    response = client.post("/run", json={}, headers={"idempotency-key": "k"})
+    assert response.status_code == 200 and response.json()["call"] == 2
+
+
+def test_keys_are_scoped_to_the_caller(monkeypatch):
+    monkeypatch.setattr(quota, "_CALLER_KEY_HASHES", {quota._key_hash(b"alice"), quota._key_hash(b"bob")})
+    client = TestClient(make_app())
+    alice = client.post("/run", json={}, headers={"idempotency-key": "k", "x-api-key": "alice"})
+    bob = client.post("/run", json={}, headers={"idempotency-key": "k", "x-api-key": "bob"})
+    assert (alice.json()["call"], bob.json()["call"]) == (1, 2)
+
+
+def test_expired_entries_run_again(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("kadena_common.idempotency.time.monotonic", lambda: now[0])
+    client = TestClient(make_app(IdempotencyStore(ttl=60)))
+    client.post("/run", json={}, headers={"idempotency-key": "k"})
+    now[0] += 61
+    assert client.post("/run", json={}, headers={"idempotency-key": "k"}).json()["call"] == 2
+
+
+def test_concurrent_retries_join_the_running_request():
+    app = make_app()
+
+    async def run():
+        app.state.release = asyncio.Event()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            def post(body):
+                return asyncio.create_task(client.post("/run", json=body, headers={"idempotency-key": "k"}))
+
+            first = post({"q": 1})
+            await asyncio.sleep(0.05)
+            joined, conflict = post({"q": 1}), post({"q": 2})
+            await asyncio.sleep(0.05)
+            app.state.release.set()
+            return await first, await joined, await conflict
+
+    first, joined, conflict = asyncio.run(run())
+    assert app.state.calls == 1
+    assert first.json() == joined.json() == {"call": 1, "q": 1}
+    assert joined.headers["idempotent-replayed"] == "true"
+    assert conflict.status_code == 409
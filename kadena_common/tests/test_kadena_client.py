@@ -0,0 +1,146 @@
+import json
+
+import pytest
+import requests
+
+from kadena_common import kadena_client, resilience
+from kadena_common.kadena_client import InvalidRequest, KadenaClient, build_request_models, validate_request
+
+ACCOUNT = "k:" + "ab" * 32
+QUOTE = {"tokenInAddress": "coin", "tokenOutAddress": "arkade.token", "amountIn": "1", "chainId": "2"}
+
+
+class FakeSession:
+    """Answers posts with the scripted (status, body) pairs and records the requests."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.posts = []
+
+    def post(self, url, **kwargs):
+        self.posts.append({"url": url, "body": kwargs["json"], "headers": kwargs["headers"]})
+        status, body = self.responses.pop(0)
+        response = requests.Response()
+        response.status_code = status
+        response._content = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+        return response
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    monkeypatch.setattr(resilience, "backoff_delay", lambda attempt: 0)
+
+    def answer(*responses):
+        fake = FakeSession(*responses)
+        monkeypatch.setattr(kadena_client, "session", lambda: fake)
+        return fake
+
+    return answer
+
+
+def test_valid_bodies_keep_extra_parameters():
+    body = validate_request("transfer", {"tokenAddress": "coin", "sender": ACCOUNT, "receiver": ACCOUNT,
+                                         "amount": "1.5", "chainId": 2, "meta": {"memo": "x"}})
+    assert body["chainId"] == "2" and body["meta"] == {"memo": "x"}
+    assert "amountOut" not in validate_request("quote", QUOTE)
+
+
+@pytest.mark.parametrize("endpoint,body,message", [
+    ("quote", {"tokenInAddress": "coin", "chainId": "2", "amountIn": "1"}, "Missing required parameters: ['tokenOutAddress']"),
+    ("quote", {**QUOTE, "amountOut": "2"}, "Cannot specify both amountIn and amountOut for quote"),
+    ("swap", {**QUOTE, "amountIn": None, "account": ACCOUNT}, "Must specify either amountIn or amountOut for swap"),
+    ("quote", {**QUOTE, "chainId": "20"}, "Invalid chainId. Must be between 0 and 19"),
+    ("quote", {**QUOTE, "chainId": "two"}, "Invalid chainId. Must be between 0 and 19"),
+    ("stake", QUOTE, "Invalid endpoint"),
+])
+def test_invalid_bodies(endpoint, body, message):
+    with pytest.raises(InvalidRequest) as raised:
+        validate_request(endpoint, body)
+    assert message in str(raised.value)
+
+
+GUARD = {"keys": ["ab" * 32], "pred": "keys-all"}
+LAUNCH = {"account": ACCOUNT, "guard": GUARD, "mintTo": ACCOUNT, "uri": "ipfs://x", "collectionId": "c", "chainId": "2"}
+
+
+def test_parameters_are_typed_by_name():
+    assert validate_request("nft/launch", LAUNCH)["guard"] == GUARD
+    assert validate_request("swap", {**QUOTE, "account": ACCOUNT, "tokenInAddress": "runonflux.flux",
+                                     "amountIn": "0.00000001"})
+    assert validate_request("quote", {**QUOTE, "amountIn": 2.5})["amountIn"] == 2.5
+
+
+@pytest.mark.parametrize("endpoint,body,message", [
+    ("swap", {**QUOTE, "account": "k:abc"}, "Invalid account: must be a k:account"),
+    ("swap", {**QUOTE, "account": "w:" + "ab" * 32}, "Invalid account: must be a k:account"),
+    ("quote", {**QUOTE, "amountIn": "-1"}, "Invalid amountIn: must be a positive number"),
+    ("quote", {**QUOTE, "amountIn": "NaN"}, "Invalid amountIn: must be a positive number"),
+    ("quote", {**QUOTE, "amountIn": "lots"}, "Invalid amountIn: 'lots' is not a number"),
+    ("quote", {**QUOTE, "tokenInAddress": "runonflux.flux", "amountIn": "0.000000001"},
+     "Invalid amountIn: runonflux.flux has at most 8 decimal places"),
+    ("nft/launch", {**LAUNCH, "guard": {"keys": [], "pred": "keys-all"}}, "Invalid guard"),
+    ("nft/launch", {**LAUNCH, "guard": {"keys": ["k"]}}, "Invalid guard"),
+])
+def test_invalid_parameters(endpoint, body, message):
+    with pytest.raises(InvalidRequest) as raised:
+        validate_request(endpoint, body)
+    assert message in str(raised.value)
+
+
+def test_every_problem_is_reported():
+    with pytest.raises(InvalidRequest) as raised:
+        validate_request("transfer", {"tokenAddress": "coin", "sender": "bob", "amount": "0", "chainId": "2"})
+    assert str(raised.value) == ("Missing required parameters: ['receiver']; Invalid sender: must be a k:account "
+                                 "(k: followed by a 64-character hex public key); Invalid amount: must be a "
+                                 "positive number")
+
+
+def test_models_follow_the_docs():
+    models = build_request_models({"stake": {
+        "endpoint": "/stake/add",
+        "required_params": ["account", "chainId"],
+        "conditional_params": [{"name": "amount", "condition": "Either amount or shares"},
+                               {"name": "shares", "condition": "Either amount or shares"}],
+        "optional_params": [{"name": "memo", "description": "Note"}],
+    }})
+    model = models["stake/add"]
+    assert model.__name__ == "StakeAddRequest"
+    assert model.model_validate({"account": ACCOUNT, "chainId": 1, "shares": 3}).chainId == "1"
+    with pytest.raises(ValueError, match="Must specify either amount or shares for stake/add"):
+        model.model_validate({"account": ACCOUNT, "chainId": 1})
+
+
+def test_invalid_bodies_are_not_sent(upstream):
+    fake = upstream()
+    assert KadenaClient().quote({**QUOTE, "chainId": "99"}) == {"error": "Invalid chainId. Must be between 0 and 19"}
+    assert fake.posts == []
+
+
+def test_transaction_posts_the_validated_body(upstream):
+    fake = upstream((200, {"amountOut": "3.2"}))
+    client = KadenaClient(base_url="https://api.example/", api_key="secret")
+    assert client.quote({**QUOTE, "chainId": 2}) == {"amountOut": "3.2"}
+    assert fake.posts == [{"url": "https://api.example/quote", "body": {**QUOTE, "chainId": "2"},
+                           "headers": {"Content-Type": "application/json", "x-api-key": "secret"}}]
+
+
+def test_upstream_errors_are_returned(upstream):
+    client = KadenaClient(base_url="https://api.example")
+    upstream((400, {"error": "Insufficient liquidity"}))
+    assert client.quote(QUOTE) == {"error": "Bad Request: Insufficient liquidity"}
+    upstream((404, "not json"))
+    assert client.quote(QUOTE)["error"].startswith("API request failed: 404")
+    # Server errors are retried before being reported
+    fake = upstream((500, {"error": "down"}), (200, {"amountOut": "1"}))
+    assert client.quote(QUOTE) == {"amountOut": "1"} and len(fake.posts) == 2
+
+
+def test_open_circuit_is_reported_as_unavailable(upstream, monkeypatch):
+    monkeypatch.setitem(resilience._BREAKERS, "analysis_api",
+                        resilience.CircuitBreaker("analysis_api", min_calls=1, failure_rate=1.0))
+    resilience._BREAKERS["analysis_api"].record(True, 0.1)
+    fake = upstream()
+    result = KadenaClient().analyze("what is kadena?", "be brief")
+    assert result["unavailable"] is True and result["error"].startswith(kadena_client.UNAVAILABLE_MESSAGE)
+    assert fake.posts == []
@@ -0,0 +1,91 @@
+import json
+import logging
+import queue
+import sys
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from kadena_common import logs, metrics
+from kadena_common.logs import (
+    DroppingQueueHandler, JsonFormatter, RequestContextFilter, SamplingFilter, install_request_logging,
+)
+
+
+def make_record(level=logging.INFO, msg="hello %s", args=("world",), **extra):
+    record = logging.LogRecord("test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_lines_carry_extra_fields():
+    entry = json.loads(JsonFormatter("svc").format(make_record(request_id="r1", stages={"route": 0.1}, empty="")))
+    assert entry["message"] == "hello world"
+    assert (entry["service"], entry["level"], entry["request_id"]) == ("svc", "INFO", "r1")
+    assert entry["stages"] == {"route": 0.1}
+    assert "empty" not in entry and "args" not in entry
+
+
+def test_sampling_keeps_a_request_together_and_always_keeps_warnings():
+    sampler = SamplingFilter(0.5)
+    for request_id in ("a", "b", "c", "d"):
+        kept = {sampler.filter(make_record(request_id=request_id)) for _ in range(5)}
+        assert len(kept) == 1
+    assert sampler.filter(make_record(logging.WARNING, request_id="x"))
+    none = SamplingFilter(0.0)
+    assert not none.filter(make_record(request_id="a"))
+    assert none.filter(make_record(request_id="a", always_log=True))
+
+
+def test_full_queue_drops_records():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    before = logs.DROPPED_RECORDS.value()
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        failed = logging.getLogger("test").makeRecord("test", logging.ERROR, __file__, 1, "failed", (), sys.exc_info())
+    handler.emit(failed)
+    handler.emit(make_record())
+    assert logs.DROPPED_RECORDS.value() == before + 1
+
+    # The traceback is rendered before the record crosses the queue
+    queued = handler.queue.get_nowait()
+    assert queued.exc_info is None and "ValueError: boom" in queued.exc_text
+    assert "Traceback" in json.loads(JsonFormatter("svc").format(queued))["exception"]
+
+
+class Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_requests_get_an_id_and_one_access_record(monkeypatch):
+    capture = Capture()
+    capture.addFilter(RequestContextFilter())
+    monkeypatch.setattr(logs.access_logger, "handlers", [capture])
+    monkeypatch.setattr(logs.access_logger, "propagate", False)
+    monkeypatch.setattr(logs.access_logger, "level", logging.INFO)
+
+    app = FastAPI()
+    install_request_logging(app)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: str):
+        with metrics.span("lookup"):
+            pass
+        return {"request_id": logs.current_request_id.get()}
+
+    client = TestClient(app)
+    given = client.get("/items/1", headers={"x-request-id": "abc"})
+    assert given.headers["x-request-id"] == "abc" and given.json() == {"request_id": "abc"}
+    generated = client.get("/items/2").headers["x-request-id"]
+    assert len(generated) == 32
+
+    first, second = capture.records
+    assert (first.request_id, first.path, first.status, first.method) == ("abc", "/items/{item_id}", 200, "GET")
+    assert set(first.stages) == {"lookup"}
+    assert second.request_id == generated and not second.always_log
@@ -0,0 +1,82 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from kadena_common import metrics
+from kadena_common.metrics import Counter, Histogram
+from kadena_common.middleware import install_metrics
+
+
+def test_counter_render_escapes_labels():
+    requests = Counter("test_requests_total", "Requests", ("path",))
+    requests.inc(path='/a "b"\n')
+    requests.inc(2, path='/a "b"\n')
+    assert requests.value(path='/a "b"\n') == 3
+    assert requests.render() == [
+        "# HELP test_requests_total Requests",
+        "# TYPE test_requests_total counter",
+        'test_requests_total{path="/a \\"b\\"\\n"} 3.0',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    latency = Histogram("test_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        latency.observe(value)
+    assert latency.render()[2:] == [
+        'test_seconds_bucket{le="0.1"} 2',
+        'test_seconds_bucket{le="1.0"} 3',
+        'test_seconds_bucket{le="+Inf"} 4',
+        "test_seconds_sum 2.65",
+        "test_seconds_count 4",
+    ]
+
+
+def test_metrics_are_registered_once():
+    first = metrics.counter("test_shared_total", "Shared")
+    assert metrics.counter("test_shared_total", "Shared") is first
+    assert "# TYPE test_shared_total counter" in metrics.render()
+
+
+def stage_count(**labels):
+    key = metrics.STAGE_DURATION._key(labels)
+    series = metrics.STAGE_DURATION._series.get(key)
+    return series[2] if series else 0
+
+
+def request_count(**labels):
+    key = metrics.REQUEST_DURATION._key(labels)
+    series = metrics.REQUEST_DURATION._series.get(key)
+    return series[2] if series else 0
+
+
+def test_spans_are_labelled_with_the_endpoint():
+    app = FastAPI()
+    install_metrics(app)
+
+    @app.get("/work")
+    def work():
+        with metrics.span("test_stage", model="m"):
+            pass
+        return {}
+
+    before = stage_count(stage="test_stage", model="m", tool="", endpoint="/work")
+    client = TestClient(app)
+    client.get("/work")
+    assert stage_count(stage="test_stage", model="m", tool="", endpoint="/work") == before + 1
+
+    # Unknown paths share one label
+    unmatched = request_count(endpoint="unmatched", method="GET", status="404")
+    client.get("/scan/1")
+    client.get("/scan/2")
+    assert request_count(endpoint="unmatched", method="GET", status="404") == unmatched + 2
+
+    body = client.get("/metrics")
+    assert body.headers["content-type"] == metrics.CONTENT_TYPE
+    assert 'kadena_http_request_duration_seconds_count{endpoint="/work",method="GET",status="200"}' in body.text
+
+
+def test_token_usage():
+    before = metrics.LLM_TOKENS.value(model="test-model", type="prompt")
+    metrics.record_token_usage("test-model", 10, None)
+    assert metrics.LLM_TOKENS.value(model="test-model", type="prompt") == before + 10
+    assert metrics.LLM_TOKENS.value(model="test-model", type="completion") == 0
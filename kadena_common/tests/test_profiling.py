@@ -0,0 +1,73 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from kadena_common import metrics
+from kadena_common.profiling import ProfileStore, install_profiling
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def make_client(min_interval=0.0):
+    app = FastAPI()
+    store = ProfileStore(max_profiles=2, min_interval=min_interval)
+    install_profiling(app, store)
+
+    @app.get("/work")
+    def work():
+        with metrics.span("test_busy"):
+            busy(0.05)
+        return {"ok": True}
+
+    return TestClient(app), store
+
+
+def test_unflagged_requests_are_not_profiled():
+    client, store = make_client()
+    response = client.get("/work")
+    assert "x-profile-id" not in response.headers and "x-profile-status" not in response.headers
+    assert store.list() == []
+
+
+def test_profiled_request_records_stages_and_stacks():
+    client, store = make_client()
+    response = client.get("/work", headers={"x-profile": "1"})
+    assert response.json() == {"ok": True}
+    profile = client.get(f"/debug/profiles/{response.headers['x-profile-id']}").json()
+
+    assert profile["endpoint"] == "/work" and profile["samples"] > 0
+    assert [stage["stage"] for stage in profile["stages"]] == ["test_busy"]
+    assert profile["stage_totals"]["test_busy"] >= 0.05
+    # The sampler followed the worker thread into the handler
+    assert "test_profiling:busy" in profile["collapsed"]
+
+    collapsed = client.get(f"/debug/profiles/{profile['id']}?format=collapsed")
+    assert collapsed.text == profile["collapsed"]
+    assert client.get("/debug/profiles").json()[0]["id"] == profile["id"]
+    assert client.get("/debug/profiles/missing").status_code == 404
+
+
+def test_profiling_is_rate_limited():
+    client, store = make_client(min_interval=60)
+    assert "x-profile-id" in client.get("/work?profile=1").headers
+    rejected = client.get("/work?profile=1")
+    assert rejected.json() == {"ok": True}
+    assert rejected.headers["x-profile-status"] == "rejected"
+
+
+def test_unrecognized_flags_are_rejected_without_using_the_profiler():
+    client, store = make_client(min_interval=60)
+    assert client.get("/work?profile=0").headers["x-profile-status"] == "rejected"
+    assert "x-profile-id" in client.get("/work?profile=1").headers
+
+
+def test_only_recent_profiles_are_kept():
+    client, store = make_client()
+    ids = [client.get("/work", headers={"x-profile": "true"}).headers["x-profile-id"] for _ in range(3)]
+    assert [entry["id"] for entry in store.list()] == ids[:0:-1]
+    assert store.get(ids[0]) is None
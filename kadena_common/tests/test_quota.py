@@ -0,0 +1,143 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from kadena_common import quota
+from kadena_common.quota import MemoryBackend, RateLimit, SQLiteBackend, caller_id, install_quotas
+
+
+def scope(headers=(), client=("10.0.0.1", 1234)):
+    return {"type": "http", "headers": [(k.encode(), v.encode()) for k, v in headers], "client": client}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(quota.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(quota.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.mark.parametrize("make_backend", [lambda tmp_path: MemoryBackend(),
+                                          lambda tmp_path: SQLiteBackend(str(tmp_path / "quota.db"))])
+def test_bucket_allows_burst_then_refills_at_rate(make_backend, tmp_path, clock):
+    backend = make_backend(tmp_path)
+    limit = RateLimit("test", per_minute=60, burst=3)
+    assert [backend.take("a", limit) for _ in range(3)] == [0, 0, 0]
+    assert backend.take("a", limit) == pytest.approx(1.0)
+    # Other callers have their own bucket
+    assert backend.take("b", limit) == 0
+
+    clock[0] += 1.0
+    assert backend.take("a", limit) == 0
+    assert backend.take("a", limit) > 0
+    # Never refills past the burst
+    clock[0] += 3600
+    assert [backend.take("a", limit) for _ in range(4)][-1] > 0
+
+
+def test_zero_rate_never_refills(clock):
+    limit = RateLimit("test", per_minute=0, burst=1)
+    backend = MemoryBackend()
+    assert backend.take("a", limit) == 0
+    assert backend.take("a", limit) == float("inf")
+
+
+def test_idle_buckets_are_dropped_after_their_own_refill_time(monkeypatch, clock):
+    monkeypatch.setattr(MemoryBackend, "MAX_BUCKETS", 2)
+    slow = RateLimit("slow", per_minute=1, burst=2)
+    fast = RateLimit("fast", per_minute=60, burst=2)
+    backend = MemoryBackend()
+    backend.take("slow:a", slow)
+    backend.take("slow:a", slow)
+    backend.take("fast:a", fast)
+    # Long enough for fast buckets to refill, not slow ones
+    clock[0] += 10
+    backend.take("fast:b", fast)
+    assert set(backend._buckets) == {"slow:a", "fast:b"}
+    assert backend.take("slow:a", slow) > 0
+
+
+def test_usage_keeps_the_most_recently_active_callers(monkeypatch):
+    monkeypatch.setattr(MemoryBackend, "MAX_USAGE_CALLERS", 2)
+    backend = MemoryBackend()
+    for caller in ("ip:a", "ip:b", "ip:a", "ip:c"):
+        backend.add_usage(caller, "query", {"requests": 1})
+    assert backend.usage() == {
+        "ip:a": {"query": {**dict.fromkeys(quota.USAGE_FIELDS, 0), "requests": 2}},
+        "ip:c": {"query": {**dict.fromkeys(quota.USAGE_FIELDS, 0), "requests": 1}},
+    }
+
+
+@pytest.mark.parametrize("make_backend", [lambda tmp_path: MemoryBackend(),
+                                          lambda tmp_path: SQLiteBackend(str(tmp_path / "quota.db"))])
+def test_usage_is_summed_per_caller_and_bucket(make_backend, tmp_path):
+    backend = make_backend(tmp_path)
+    backend.add_usage("ip:a", "query", {"requests": 1, "prompt_tokens": 10})
+    backend.add_usage("ip:a", "query", {"requests": 1, "model_calls": 2})
+    backend.add_usage("ip:b", "code", {"rejected": 1})
+    assert backend.usage("ip:a") == {"ip:a": {"query": {
+        "requests": 2, "rejected": 0, "model_calls": 2, "prompt_tokens": 10, "completion_tokens": 0,
+        "upstream_calls": 0,
+    }}}
+    assert set(backend.usage()) == {"ip:a", "ip:b"}
+
+
+def test_caller_id_uses_only_configured_keys(monkeypatch):
+    monkeypatch.setattr(quota, "_CALLER_KEY_HASHES", {quota._key_hash(b"known")})
+    assert caller_id(scope([("x-api-key", "known")])).startswith("key:")
+    assert caller_id(scope([("x-api-key", "made-up")])) == "ip:10.0.0.1"
+    assert caller_id(scope()) == "ip:10.0.0.1"
+
+
+def test_caller_id_trusts_forwarded_for_only_when_enabled(monkeypatch):
+    forwarded = scope([("x-forwarded-for", "1.2.3.4, 10.0.0.1")])
+    monkeypatch.setattr(quota, "RATE_LIMIT_TRUST_FORWARDED_FOR", False)
+    assert caller_id(forwarded) == "ip:10.0.0.1"
+    monkeypatch.setattr(quota, "RATE_LIMIT_TRUST_FORWARDED_FOR", True)
+    assert caller_id(forwarded) == "ip:1.2.3.4"
+
+
+def make_client(backend=None):
+    app = FastAPI()
+
+    @app.post("/query")
+    async def query():
+        quota.record_model_call(5, 2)
+        return {"ok": True}
+
+    install_quotas(app, {"/query": RateLimit("query", per_minute=1, burst=2)}, backend or MemoryBackend())
+    return TestClient(app)
+
+
+def test_middleware_limits_and_accounts_callers():
+    client = make_client()
+    assert [client.post("/query").status_code for _ in range(3)] == [200, 200, 429]
+    response = client.post("/query")
+    assert int(response.headers["retry-after"]) >= 1
+
+    usage = client.get("/usage").json()
+    assert usage["usage"]["query"]["requests"] == 2
+    assert usage["usage"]["query"]["rejected"] == 2
+    assert usage["usage"]["query"]["model_calls"] == 2
+    assert usage["usage"]["query"]["prompt_tokens"] == 10
+
+
+def test_made_up_keys_share_the_address_bucket(monkeypatch):
+    monkeypatch.setattr(quota, "_CALLER_KEY_HASHES", set())
+    client = make_client()
+    codes = [client.post("/query", headers={"x-api-key": f"key-{i}"}).status_code for i in range(3)]
+    assert codes == [200, 200, 429]
+
+
+def test_usage_summary_requires_a_configured_token(monkeypatch):
+    client = make_client()
+    client.post("/query")
+    monkeypatch.setattr(quota, "USAGE_TOKEN", None)
+    assert client.get("/usage/summary").status_code == 403
+    assert client.get("/usage/summary", headers={"x-usage-token": ""}).status_code == 403
+
+    monkeypatch.setattr(quota, "USAGE_TOKEN", "secret")
+    assert client.get("/usage/summary", headers={"x-usage-token": "wrong"}).status_code == 403
+    summary = client.get("/usage/summary", headers={"x-usage-token": "secret"}).json()
+    assert summary["totals"]["query"]["requests"] == 1
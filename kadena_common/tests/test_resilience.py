@@ -0,0 +1,169 @@
+import pytest
+import requests
+
+from kadena_common import resilience
+from kadena_common.deadline import deadline_scope
+from kadena_common.resilience import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, RetryBudget, call_upstream,
+)
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture(autouse=True)
+def breakers(monkeypatch):
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    monkeypatch.setattr(resilience, "backoff_delay", lambda attempt: 0.01 * attempt)
+
+
+def test_breaker_opens_on_failure_rate(clock):
+    circuit = CircuitBreaker("test", window=10, min_calls=4, failure_rate=0.5)
+    for failed in (True, True, True):
+        circuit.record(failed, 0.1)
+    # Too few calls to judge
+    assert circuit.state == CLOSED
+    circuit.record(False, 0.1)
+    assert circuit.state == OPEN
+    assert not circuit.allow()
+    assert circuit.retry_after() == pytest.approx(circuit.open_seconds)
+
+
+def test_breaker_opens_on_slow_calls(clock):
+    circuit = CircuitBreaker("test", window=4, min_calls=4, slow_call_seconds=1, slow_call_rate=0.75)
+    for seconds in (0.1, 2, 2, 2):
+        circuit.record(False, seconds)
+    assert circuit.state == OPEN
+
+
+def test_breaker_window_forgets_old_calls(clock):
+    circuit = CircuitBreaker("test", window=4, min_calls=4, failure_rate=0.5)
+    for failed in (True, False, False, False, False, True):
+        circuit.record(failed, 0.1)
+    assert circuit.state == CLOSED
+
+
+def test_half_open_lets_one_trial_through(clock):
+    circuit = CircuitBreaker("test", window=4, min_calls=1, failure_rate=1.0, open_seconds=30)
+    circuit.record(True, 0.1)
+    assert circuit.state == OPEN
+
+    clock[0] += 30
+    assert circuit.allow()
+    assert circuit.state == HALF_OPEN
+    assert not circuit.allow()
+    # A failed trial re-opens for another full period
+    circuit.record(True, 0.1)
+    assert circuit.state == OPEN and not circuit.allow()
+
+    clock[0] += 30
+    assert circuit.allow()
+    circuit.release()
+    assert circuit.allow()
+    circuit.record(False, 0.1)
+    assert circuit.state == CLOSED
+    # Closing starts a fresh window
+    circuit.record(True, 0.1)
+    assert circuit.state == OPEN
+
+
+def test_retry_budget(clock):
+    budget = RetryBudget(ratio=0.5, min_per_second=0.1, capacity=2)
+    assert [budget.try_spend() for _ in range(3)] == [True, True, False]
+    budget.deposit()
+    assert not budget.try_spend()
+    budget.deposit()
+    assert budget.try_spend()
+    clock[0] += 10
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    # Never fills past capacity
+    clock[0] += 3600
+    assert [budget.try_spend() for _ in range(3)] == [True, True, False]
+
+
+def flaky(*outcomes):
+    """send() returning or raising each outcome in turn."""
+    calls = []
+
+    def send():
+        outcome = outcomes[len(calls)]
+        calls.append(outcome)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return Response(outcome)
+
+    return send, calls
+
+
+def test_retries_transient_failures():
+    sleeps = []
+    send, calls = flaky(503, requests.exceptions.ConnectionError(), 200)
+    response = call_upstream("up", send, max_attempts=3, sleep=sleeps.append, budget=RetryBudget())
+    assert response.status_code == 200
+    assert len(calls) == 3
+    assert sleeps == [0.01, 0.02]
+
+
+def test_client_errors_are_not_retried():
+    send, calls = flaky(404)
+    assert call_upstream("up", send, sleep=lambda s: None, budget=RetryBudget()).status_code == 404
+    assert len(calls) == 1
+
+
+def test_last_failure_is_returned_or_raised():
+    send, calls = flaky(502, 502)
+    assert call_upstream("up", send, max_attempts=2, sleep=lambda s: None, budget=RetryBudget()).status_code == 502
+    send, calls = flaky(503, requests.exceptions.Timeout())
+    with pytest.raises(requests.exceptions.Timeout):
+        call_upstream("up2", send, max_attempts=2, sleep=lambda s: None, budget=RetryBudget())
+
+
+def test_retries_stop_when_the_budget_is_spent(clock):
+    budget = RetryBudget(ratio=0, min_per_second=0, capacity=1)
+    send, calls = flaky(503, 503, 503)
+    call_upstream("up", send, max_attempts=3, sleep=lambda s: None, budget=budget)
+    assert len(calls) == 2
+    send, calls = flaky(503, 503, 503)
+    call_upstream("up2", send, max_attempts=3, sleep=lambda s: None, budget=budget)
+    assert len(calls) == 1
+
+
+def test_retries_stop_at_the_deadline():
+    # Less budget left than the first backoff (0.01s)
+    send, calls = flaky(503, 503)
+    with deadline_scope(0.005):
+        response = call_upstream("up", send, max_attempts=2, sleep=lambda s: None, budget=RetryBudget())
+    assert response.status_code == 503
+    assert len(calls) == 1
+
+
+def test_open_circuit_fails_fast(clock):
+    resilience._BREAKERS["up"] = CircuitBreaker("up", min_calls=2, failure_rate=1.0)
+    send, calls = flaky(500, 500, 200)
+    with pytest.raises(CircuitOpenError) as raised:
+        call_upstream("up", send, max_attempts=3, sleep=lambda s: None, budget=RetryBudget())
+    # The second failure opened the circuit, so the third attempt wasn't made
+    assert len(calls) == 2
+    assert raised.value.upstream == "up" and raised.value.retry_after > 0
+
+
+def test_unexpected_errors_release_the_half_open_trial(clock):
+    circuit = resilience._BREAKERS["up"] = CircuitBreaker("up", min_calls=1, failure_rate=1.0, open_seconds=30)
+    circuit.record(True, 0.1)
+    clock[0] += 30
+    send, calls = flaky(ValueError("bad body"))
+    with pytest.raises(ValueError):
+        call_upstream("up", send, budget=RetryBudget())
+    assert circuit.state == OPEN
+    clock[0] += 30
+    assert circuit.allow()
@@ -0,0 +1,79 @@
+import pytest
+
+from kadena_common import semantic_cache
+from kadena_common.semantic_cache import SemanticCache, embed, signature
+
+
+@pytest.fixture
+def cache():
+    return SemanticCache("test", capacity=4, threshold=0.8, ttl=60)
+
+
+@pytest.mark.parametrize("stored,asked", [
+    ("what is Pact?", "Can you explain what Pact is"),
+    ("how does chainweb consensus work", "How does the Chainweb consensus work?"),
+    ("what are gas fees on kadena", "what's the gas fee on Kadena"),
+])
+def test_rephrasings_hit(cache, stored, asked):
+    cache.put(stored, "answer")
+    assert cache.get(asked) == "answer"
+
+
+@pytest.mark.parametrize("stored,asked", [
+    ("how do I bridge KDA from chain 0 to chain 1", "how do I bridge KDA from chain 1 to chain 0"),
+    ("what is a valid pact type", "what is not a valid pact type"),
+    ("can a module be upgraded", "can't a module be upgraded"),
+    ("how do I convert KDA to zUSD", "how do I convert zUSD to KDA"),
+    ("what is marmalade", "what is marmalade v2"),
+])
+def test_near_misses_miss(cache, stored, asked):
+    cache.put(stored, "answer")
+    assert cache.get(asked) is None
+    assert cache.get(stored) == "answer"
+
+
+def test_word_order_lowers_similarity():
+    same = embed("how do I convert KDA to zUSD") @ embed("convert KDA to zUSD")
+    reversed_ = embed("how do I convert KDA to zUSD") @ embed("how do I convert zUSD to KDA")
+    assert same > 0.99
+    assert reversed_ < 0.8
+
+
+def test_signature():
+    assert signature("bridge from chain 0 to chain 1") == (("0", "1"), False)
+    assert signature("what isn't a valid type") == ((), True)
+    assert signature("Send 1.5 KDA") == (("1.5",), False)
+
+
+def test_entries_expire(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: now[0])
+    cache.put("what is Pact?", "answer")
+    now[0] += 59
+    assert cache.get("what is Pact?") == "answer"
+    now[0] += 2
+    assert cache.get("what is Pact?") is None
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    topics = ["pact", "chainweb", "marmalade", "kadena gas"]
+    for topic in topics:
+        cache.put(f"what is {topic}", topic)
+    cache.get("what is pact")
+    cache.put("what is a keyset", "keyset")
+    assert cache.get("what is chainweb") is None
+    assert cache.get("what is pact") == "pact"
+    assert cache.get("what is a keyset") == "keyset"
+
+
+def test_near_identical_put_replaces_entry(cache):
+    cache.put("what is Pact?", "old")
+    cache.put("What is pact", "new")
+    assert cache.get("what is pact") == "new"
+    assert len(cache._entries) == 1
+
+
+def test_clear(cache):
+    cache.put("what is Pact?", "answer")
+    cache.clear()
+    assert cache.get("what is Pact?") is None
@@ -0,0 +1,101 @@
+import json
+
+import pytest
+import requests
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from kadena_common import traffic
+from kadena_common.traffic import Cassette, ReplayMissError, TrafficAdapter, TrafficChatModel, redact
+
+KEY = "ab" * 32
+ACCOUNT = "k:" + KEY
+
+
+@pytest.fixture
+def cassette_file(tmp_path, monkeypatch):
+    """Fresh cassette path; switch modes with `use(mode)`."""
+    path = str(tmp_path / "traffic.jsonl")
+    monkeypatch.setattr(traffic, "LATENCY_SCALE", 0)
+
+    def use(mode):
+        monkeypatch.setattr(traffic, "MODE", mode)
+        monkeypatch.setattr(traffic, "_CASSETTE", Cassette(path))
+        return path
+
+    return use
+
+
+def test_redact_replaces_accounts_with_stable_pseudonyms():
+    redacted = redact(f"send from {ACCOUNT} to w:{KEY.upper()}")
+    sender = redacted.split()[2]
+    assert KEY not in redacted.lower()
+    assert sender.startswith("k:" + traffic.PSEUDONYM_MARKER) and len(sender) == len(ACCOUNT)
+    assert redact(f"again {ACCOUNT}") == f"again {sender}"
+    # Already redacted text is left alone, other text untouched
+    assert redact(redacted) == redacted
+    assert redact("coin k:short free.token") == "coin k:short free.token"
+
+
+def test_redact_gives_a_key_and_its_account_the_same_pseudonym():
+    # As the chat app appends it to each query
+    details = "User Details: " + json.dumps({
+        "accountName": ACCOUNT,
+        "publicKey": KEY,
+        "guard": {"keys": [KEY], "pred": "keys-all"},
+        "chainId": "2",
+        "balances": [{"token": "coin", "balance": 1.5}],
+    })
+    redacted = json.loads(redact(details)[len("User Details: "):])
+    assert KEY not in redact(details)
+    pseudonym = redacted["publicKey"]
+    assert pseudonym.startswith(traffic.PSEUDONYM_MARKER) and len(pseudonym) == len(KEY)
+    assert redacted["accountName"] == "k:" + pseudonym
+    assert redacted["guard"]["keys"] == [pseudonym]
+    assert redacted["chainId"] == "2" and redacted["balances"] == [{"token": "coin", "balance": 1.5}]
+
+
+def test_recorded_exchanges_replay_in_order(cassette_file):
+    path = cassette_file("record")
+    request = {"path": "/balance", "body": {"account": ACCOUNT}}
+    for balance in (1, 2):
+        traffic.cassette().record("http", traffic._redacted(request), {"body": {"account": ACCOUNT, "b": balance}}, 0.5)
+    stored = open(path).read()
+    assert KEY not in stored
+    assert json.loads(stored.splitlines()[0])["latency"] == 0.5
+
+    cassette_file("replay")
+    replays = [traffic.cassette().replay("http", traffic._redacted(request))["body"]["b"] for _ in range(3)]
+    assert replays == [1, 2, 1]
+    with pytest.raises(ReplayMissError):
+        traffic.cassette().replay("http", {"path": "/other"})
+
+
+def test_chat_model_record_and_replay(cassette_file):
+    cassette_file("record")
+    inner = FakeMessagesListChatModel(responses=[AIMessage(content=f"Your account is {ACCOUNT}")])
+    messages = [HumanMessage(content=f"Who am I? {ACCOUNT}")]
+    recorded = TrafficChatModel(model="gpt-test", inner=inner).invoke(messages)
+    assert recorded.content == f"Your account is {ACCOUNT}"
+
+    cassette_file("replay")
+    replayed = TrafficChatModel(model="gpt-test").invoke(messages)
+    assert replayed.content == redact(f"Your account is {ACCOUNT}")
+    with pytest.raises(ReplayMissError):
+        TrafficChatModel(model="other-model").invoke(messages)
+
+
+def test_http_replay_matches_on_path_and_body(cassette_file):
+    cassette_file("record")
+    traffic.cassette().record("http", traffic._redacted({
+        "method": "POST", "path": "/quote", "body": {"account": ACCOUNT, "amountIn": "1"},
+    }), {"status": 200, "headers": {"content-type": "application/json"}, "body": '{"amountOut": "2"}'}, 0.1)
+
+    cassette_file("replay")
+    session = requests.Session()
+    session.mount("https://", TrafficAdapter())
+    # Any host replays the recording
+    response = session.post("https://staging.example/quote", json={"account": ACCOUNT, "amountIn": "1"})
+    assert response.status_code == 200 and response.json() == {"amountOut": "2"}
+    with pytest.raises(requests.ConnectionError):
+        session.post("https://staging.example/quote", json={"account": ACCOUNT, "amountIn": "5"})
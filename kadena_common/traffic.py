@@ -0,0 +1,241 @@
+"""
+Record and replay of upstream traffic (OpenAI calls and HTTP calls to the Kadena APIs).
+
+Set KADENA_TRAFFIC_MODE=record to append every upstream exchange to the
+KADENA_TRAFFIC_FILE cassette (JSON lines), and KADENA_TRAFFIC_MODE=replay to
+answer upstream calls from it instead, sleeping for the recorded latency
+multiplied by KADENA_REPLAY_LATENCY_SCALE (0 replays instantly).
+
+API keys are never written, and k: accounts and bare public keys are
+replaced by stable pseudonyms before anything is stored or matched.
+"""
+import collections
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Deque, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+MODE = os.getenv("KADENA_TRAFFIC_MODE", "").lower()
+CASSETTE_PATH = os.getenv("KADENA_TRAFFIC_FILE", "traffic.jsonl")
+LATENCY_SCALE = float(os.getenv("KADENA_REPLAY_LATENCY_SCALE", "1.0"))
+# Mixed into account pseudonyms so they can't be matched against known accounts
+REDACTION_SALT = os.getenv("KADENA_TRAFFIC_SALT", "")
+
+ENABLED = MODE in ("record", "replay")
+
+# k:/w: accounts and the bare public keys they are made of (e.g. publicKey and guard.keys in User Details)
+ACCOUNT_PATTERN = re.compile(r"\b(?:([kw]):)?([0-9a-fA-F]{64})\b")
+# Pseudonyms start with this marker so redacting already-redacted text leaves it unchanged
+PSEUDONYM_MARKER = "00000000"
+# Response headers worth replaying; the rest (dates, request ids, cookies) are dropped
+KEPT_RESPONSE_HEADERS = {"content-type"}
+
+
+class ReplayMissError(Exception):
+    """No recorded exchange matches an upstream call made during replay."""
+
+
+def redact(text: str) -> str:
+    """
+    Replace k:/w: accounts and bare public keys with stable pseudonyms of the same shape.
+
+    The pseudonym depends only on the key, so `k:<key>` and `<key>` map to
+    `k:<pseudonym>` and `<pseudonym>`.
+    """
+    def pseudonym(match: "re.Match") -> str:
+        key = match.group(2)
+        if key.startswith(PSEUDONYM_MARKER):
+            return match.group(0)
+        digest = hashlib.sha256((REDACTION_SALT + key.lower()).encode()).hexdigest()
+        prefix = f"{match.group(1)}:" if match.group(1) else ""
+        return f"{prefix}{PSEUDONYM_MARKER}{digest[len(PSEUDONYM_MARKER):]}"
+    return ACCOUNT_PATTERN.sub(pseudonym, text)
+
+
+def _key(kind: str, request: Dict[str, Any]) -> str:
+    return hashlib.sha256((kind + json.dumps(request, sort_keys=True, default=str)).encode()).hexdigest()
+
+
+class Cassette:
+    """
+    Recorded exchanges, keyed by a hash of the redacted request.
+
+    Repeated identical requests are replayed in recorded order, cycling when
+    replay makes more calls than were recorded.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Deque[Dict[str, Any]]] = collections.defaultdict(collections.deque)
+        if MODE == "replay" and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]].append(entry)
+
+    def record(self, kind: str, request: Dict[str, Any], response: Dict[str, Any], latency: float) -> None:
+        """Append an exchange; `request` must already be redacted, `response` is redacted here."""
+        entry = {
+            "kind": kind,
+            "key": _key(kind, request),
+            "request": request,
+            "response": _redacted(response),
+            "latency": round(latency, 6),
+            "recorded_at": time.time(),
+        }
+        line = json.dumps(entry, default=str)
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+    def replay(self, kind: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        key = _key(kind, request)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise ReplayMissError(f"No recorded {kind} exchange for request {key[:12]}")
+            entry = entries.popleft()
+            entries.append(entry)
+        if LATENCY_SCALE > 0:
+            time.sleep(entry["latency"] * LATENCY_SCALE)
+        return entry["response"]
+
+
+_CASSETTE: Optional[Cassette] = None
+_CASSETTE_LOCK = threading.Lock()
+
+
+def cassette() -> Cassette:
+    global _CASSETTE
+    with _CASSETTE_LOCK:
+        if _CASSETTE is None:
+            _CASSETTE = Cassette(CASSETTE_PATH)
+            logger.info(f"Traffic {MODE} mode using {CASSETTE_PATH}")
+        return _CASSETTE
+
+
+def _redacted(value: Any) -> Any:
+    """Round-trip through redacted JSON so requests match their recorded form."""
+    return json.loads(redact(json.dumps(value, sort_keys=True, default=str)))
+
+
+class TrafficChatModel(BaseChatModel):
+    """
+    Chat model wrapper that records or replays the wrapped model's calls.
+
+    The request is identified by model name, messages and call options (bound
+    functions/tools), all after redaction.
+    """
+    model: str
+    inner: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "traffic-" + (self.inner._llm_type if self.inner is not None else "replay")
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        request = _redacted({
+            "model": self.model,
+            "messages": [message_to_dict(m) for m in messages],
+            "stop": stop,
+            # The timeout depends on the request's remaining budget, not on what was asked
+            "options": {k: v for k, v in kwargs.items() if k != "timeout"},
+        })
+        if MODE == "replay":
+            response = cassette().replay("llm", request)
+            generations = [ChatGeneration(message=m) for m in messages_from_dict(response["messages"])]
+            return ChatResult(generations=generations, llm_output=response.get("llm_output"))
+
+        started = time.perf_counter()
+        result = self.inner._generate(messages, stop=stop, **kwargs)
+        cassette().record("llm", request, {
+            "messages": [message_to_dict(g.message) for g in result.generations],
+            "llm_output": result.llm_output,
+        }, time.perf_counter() - started)
+        return result
+
+    def _combine_llm_outputs(self, llm_outputs: List[Optional[dict]]) -> dict:
+        if self.inner is not None:
+            return self.inner._combine_llm_outputs(llm_outputs)
+        combined: Dict[str, Any] = {}
+        for output in llm_outputs:
+            for key, value in ((output or {}).get("token_usage") or {}).items():
+                combined.setdefault("token_usage", {})
+                combined["token_usage"][key] = combined["token_usage"].get(key, 0) + value
+            if output and "model_name" in output:
+                combined["model_name"] = output["model_name"]
+        return combined
+
+
+class TrafficAdapter(HTTPAdapter):
+    """
+    requests transport adapter that records or replays HTTP exchanges.
+
+    Requests are matched on method, path and redacted body, not host, so a
+    recording made against production replays against any base URL.
+    """
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        url = urlsplit(request.url)
+        body = request.body.decode() if isinstance(request.body, bytes) else (request.body or "")
+        try:
+            body = json.loads(body) if body else None
+        except ValueError:
+            pass
+        recorded_request = _redacted({
+            "method": request.method,
+            "path": url.path + ("?" + url.query if url.query else ""),
+            "body": body,
+        })
+
+        if MODE == "replay":
+            try:
+                recorded = cassette().replay("http", recorded_request)
+            except ReplayMissError as e:
+                raise requests.ConnectionError(str(e), request=request)
+            response = requests.Response()
+            response.status_code = recorded["status"]
+            response.headers = CaseInsensitiveDict(recorded["headers"])
+            response._content = recorded["body"].encode()
+            response.encoding = "utf-8"
+            response.url = request.url
+            response.request = request
+            response.reason = "Replayed"
+            return response
+
+        started = time.perf_counter()
+        response = super().send(request, **kwargs)
+        headers = {k: v for k, v in response.headers.items() if k.lower() in KEPT_RESPONSE_HEADERS}
+        cassette().record("http", recorded_request, {
+            "status": response.status_code,
+            "headers": headers,
+            "body": response.text,
+        }, time.perf_counter() - started)
+        return response
+
+
+def mount(session: requests.Session) -> requests.Session:
+    """Route a session's HTTP(S) traffic through the recorder when traffic mode is on."""
+    if ENABLED:
+        adapter = TrafficAdapter()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+    return session
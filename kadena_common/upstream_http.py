@@ -0,0 +1,27 @@
+import os
+import threading
+from typing import Optional
+
+import requests
+
+from kadena_common import traffic
+
+# Timeout for upstream API calls (connect and read)
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT_SECONDS", "15"))
+
+_SESSION: Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+
+
+def new_session() -> requests.Session:
+    """A requests session for upstream APIs, routed through the traffic recorder when it is enabled."""
+    return traffic.mount(requests.Session())
+
+
+def session() -> requests.Session:
+    """The process-wide upstream session, so connections to the Kadena APIs are reused across requests."""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = new_session()
+        return _SESSION
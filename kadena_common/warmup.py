@@ -0,0 +1,89 @@
+"""
+Startup warmup.
+
+Services import their request-path modules at module level, so the process
+pays for LangChain's imports before it serves anything. What remains lazy is
+built here, while the server starts and before it accepts connections: the
+shared model clients, and whatever else the first request would otherwise
+build (e.g. tool definitions, whose first conversion inspects every loaded
+module). Each step's duration is logged and exported as
+kadena_startup_seconds{step}; `benchmarks/startup.py` tracks import, startup
+and first-request times.
+
+A step that fails (e.g. a model client without OPENAI_API_KEY) is logged and
+skipped, so routes that don't need it still serve; the first request that
+does rebuilds it and gets the error. Set WARMUP=0 to skip warmup.
+"""
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from fastapi import FastAPI
+
+from kadena_common import metrics
+from kadena_common.models import chat_model
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("WARMUP", "1") not in ("0", "false", "False")
+
+STARTUP_SECONDS = metrics.gauge(
+    "kadena_startup_seconds",
+    "Seconds spent in each startup warmup step",
+    ("step",),
+)
+
+
+def warm_up(models: Iterable[str] = (), hooks: Iterable[Callable[[], object]] = (),
+            model_options: Optional[Dict[str, Any]] = None) -> Dict[str, float]:
+    """
+    Create shared model clients and run warmup hooks.
+
+    Args:
+        models: Model names to create clients for (see `chat_model`)
+        hooks: Callables building anything else the first request would
+        model_options: Client options the service passes to `chat_model`
+
+    Returns:
+        Seconds spent per step ("models", "hooks")
+    """
+    timings = {}
+    started = time.perf_counter()
+    for model in dict.fromkeys(models):
+        try:
+            chat_model(model, **(model_options or {}))
+        except Exception as e:
+            logger.warning(f"Could not create the {model} client at startup: {str(e)}")
+    timings["models"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for hook in hooks:
+        try:
+            hook()
+        except Exception as e:
+            logger.warning(f"Warmup hook {getattr(hook, '__name__', hook)} failed: {str(e)}")
+    timings["hooks"] = time.perf_counter() - started
+    return timings
+
+
+def install_warmup(app: FastAPI, models: Iterable[str] = (), hooks: Iterable[Callable[[], object]] = (),
+                   model_options: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Run `warm_up` when the app starts.
+
+    Startup handlers finish before uvicorn accepts connections, so requests
+    and readiness probes only arrive once the service is warm.
+    """
+    models, hooks = list(models), list(hooks)
+
+    def warmup() -> None:
+        if not WARMUP_ENABLED:
+            return
+        timings = warm_up(models, hooks, model_options)
+        for step, seconds in timings.items():
+            STARTUP_SECONDS.set(seconds, step=step)
+        steps = ", ".join(f"{step} {seconds:.2f}s" for step, seconds in timings.items())
+        logger.info(f"Warmup finished in {sum(timings.values()):.2f}s ({steps})")
+
+    app.add_event_handler("startup", warmup)